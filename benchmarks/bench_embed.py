@@ -0,0 +1,79 @@
+"""Microbenchmark of the embed creation, in embeds per second.
+
+Compares the former `create_embed_from_feed`, which read the configuration and rebuilt
+every part of the embed for each feed, with the cached `EmbedRenderer`.
+
+Usage: python -m benchmarks.bench_embed [feeds] [distinct media]
+"""
+
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import discord
+
+from pigloo.config import config
+from pigloo.embed import EmbedRenderer
+from pigloo.feed import Anime, Feed, FeedStatus, Service, User
+
+
+def legacy_create_embed_from_feed(feed: Feed) -> discord.Embed:
+    description = f"[{feed.media.name}]({feed.media.url}) - {feed.media.format}\n"
+    description += f"```{feed.status.label} | {feed.media.build_progress_str(feed.progress)}```"
+    embed = discord.Embed(colour=0xEED000, description=description, timestamp=feed.datetime)
+    embed.set_thumbnail(url=feed.media.image)
+    author_name = f"{feed.user.name}'s {feed.service.name}"
+    author_url = f"{config.get('ANILIST', 'profile_url')}{feed.user.name}"
+    embed.set_author(name=author_name, url=author_url, icon_url=config.get("ANILIST", "icon_url"))
+    embed.set_footer(text=config.get("BOT", "name"), icon_url=config.get("ANILIST", "icon_url"))
+    return embed
+
+
+def make_feeds(count: int, distinct: int) -> list[Feed]:
+    service = Service(id=uuid.uuid4(), name="AniList")
+    users = [User(id=uuid.uuid4(), name=f"user{i}", service=service) for i in range(distinct)]
+    medias = [
+        Anime(
+            id=uuid.uuid4(),
+            name=f"Anime {i}",
+            service=service,
+            max_progress=12,
+            url=f"https://anilist.co/anime/{i}",
+            image=f"https://img.anili.st/media/anime/{i}.jpg",
+            format="TV",
+        )
+        for i in range(distinct)
+    ]
+    return [
+        Feed(
+            id=uuid.uuid4(),
+            user=users[i % distinct],
+            service=service,
+            media=medias[i % distinct],
+            progress=i % 12,
+            datetime=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            status=FeedStatus(label="Watching"),
+        )
+        for i in range(count)
+    ]
+
+
+def measure(render, feeds: list[Feed]) -> float:
+    start = time.perf_counter()
+    for feed in feeds:
+        render(feed)
+    return len(feeds) / (time.perf_counter() - start)
+
+
+def main(count: int = 20000, distinct: int = 200) -> None:
+    feeds = make_feeds(count, distinct)
+    legacy = measure(legacy_create_embed_from_feed, feeds)
+    cached = measure(EmbedRenderer().render, feeds)
+    print(f"{count} feeds over {distinct} media/users")
+    print(f"create_embed_from_feed (legacy): {legacy:>10.0f} embeds/s")
+    print(f"EmbedRenderer:                   {cached:>10.0f} embeds/s ({cached / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
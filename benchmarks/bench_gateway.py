@@ -0,0 +1,101 @@
+"""Memory and time taken by the gateway caches of discord.py, with each gateway profile.
+
+Every profile runs in its own process, which receives the GUILD_CREATE events of `guilds`
+guilds of `members` members each, then `messages` MESSAGE_CREATE events, as the gateway
+would send them at startup. The peak RSS of the process is reported after the events.
+
+Usage: python -m benchmarks.bench_gateway [guilds] [members] [messages]
+"""
+
+import multiprocessing
+import sys
+import time
+
+import discord
+
+from pigloo.config import config
+from pigloo.gateway import PROFILES, gateway_options, peak_rss
+
+
+def make_guild(guild_id: int, members: int) -> dict:
+    return {
+        "id": str(guild_id),
+        "name": f"Guild {guild_id}",
+        "owner_id": "1",
+        "member_count": members,
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "104324673", "position": 0}],
+        "channels": [{"id": str(guild_id + 1), "type": 0, "name": "feeds", "position": 0}],
+        "members": [
+            {
+                "user": {
+                    "id": str(guild_id * 100_000 + index),
+                    "username": f"member{index}",
+                    "discriminator": "0",
+                    "avatar": None,
+                },
+                "roles": [],
+                "flags": 0,
+                "joined_at": "2024-01-01T00:00:00+00:00",
+            }
+            for index in range(members)
+        ],
+    }
+
+
+def make_message(channel_id: int, index: int) -> dict:
+    return {
+        "id": str(10**15 + index),
+        "channel_id": str(channel_id),
+        "author": {"id": "2", "username": "someone", "discriminator": "0", "avatar": None},
+        "content": f"Message {index}",
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+
+def run_profile(profile: str, guilds: int, members: int, messages: int, results: multiprocessing.Queue) -> None:
+    config.read_dict({"GATEWAY": {"max_messages": "0", "prefix_commands": "true"}})
+    client = discord.Client(**gateway_options(profile))
+    state = client._connection
+    baseline = peak_rss()
+
+    start = time.perf_counter()
+    for index in range(guilds):
+        state._add_guild_from_data(make_guild((index + 1) * 10**6, members))
+    for index in range(messages):
+        state.parse_message_create(make_message(10**6 + 1, index))
+    elapsed = time.perf_counter() - start
+
+    cached_members = sum(len(guild.members) for guild in client.guilds)
+    results.put((profile, elapsed, peak_rss() - baseline, cached_members, len(client.cached_messages)))
+
+
+def main(guilds: int, members: int, messages: int) -> None:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    print(f"{guilds} guilds of {members} members, {messages} messages")
+    for profile in PROFILES:
+        process = context.Process(target=run_profile, args=(profile, guilds, members, messages, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"{profile:>5}: failed")
+            continue
+
+        profile, elapsed, rss, cached_members, cached_messages = results.get()
+        print(
+            f"{profile:>5}: {elapsed:.3f}s, +{rss / 1024 / 1024:.1f} MiB peak RSS, "
+            f"{cached_members} members and {cached_messages} messages cached"
+        )
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args) if args else main(100, 1000, 5000)
@@ -0,0 +1,98 @@
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+import pytest
+
+from tests.conftest import bot  # The dpytest bot of the test suite
+
+RESULTS = pytest.StashKey[dict]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption("--bench-json", default="benchmark-results.json", help="file the results are written to")
+    group.addoption("--bench-baseline", help="results of a previous run: benchmarks that got worse fail")
+    group.addoption("--bench-tolerance", type=float, default=0.2, help="relative change tolerated from the baseline")
+
+
+def pytest_configure(config):
+    config.stash[RESULTS] = {}
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pytest_sessionfinish(session, exitstatus):
+    results = session.config.stash.get(RESULTS, {})
+    if not results:
+        return
+
+    report = {
+        "commit": _commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(session.config.getoption("--bench-json"), "w") as file:
+        json.dump(report, file, indent=2)
+
+
+class Bench:
+    """Measures and records benchmark results, comparing them with a baseline when one is given."""
+
+    def __init__(self, results: dict, baseline: dict, tolerance: float) -> None:
+        self.results = results
+        self.baseline = baseline
+        self.tolerance = tolerance
+
+    def record(self, name: str, value: float, unit: str, higher_is_better: bool = True) -> None:
+        self.results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+        previous = self.baseline.get(name)
+        if previous is None:
+            return
+
+        change = value / previous["value"] - 1 if previous["value"] else 0.0
+        if (change < -self.tolerance) if higher_is_better else (change > self.tolerance):
+            pytest.fail(f"{name} regressed: {value:.6g} {unit} against {previous['value']:.6g} {unit} ({change:+.0%})")
+
+    def measure(self, name: str, fn: Callable[[], object], number: int = 1000, repeat: int = 5) -> float:
+        """Records the best throughput of `fn`, in calls per second, over `repeat` runs of `number` calls."""
+        best = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            best = max(best, number / (time.perf_counter() - start))
+        self.record(name, best, "ops/s")
+        return best
+
+    async def measure_async(
+        self, name: str, fn: Callable[[], Awaitable[object]], number: int = 100, repeat: int = 3
+    ) -> float:
+        """Same as `measure`, for a coroutine function."""
+        best = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                await fn()
+            best = max(best, number / (time.perf_counter() - start))
+        self.record(name, best, "ops/s")
+        return best
+
+
+@pytest.fixture
+def bench(request) -> Bench:
+    baseline = {}
+    path = request.config.getoption("--bench-baseline")
+    if path:
+        with open(path) as file:
+            baseline = json.load(file)["results"]
+    return Bench(request.config.stash[RESULTS], baseline, request.config.getoption("--bench-tolerance"))
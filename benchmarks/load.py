@@ -0,0 +1,182 @@
+"""End-to-end load harness of the feed pipeline, from a poll cycle to the messages posted in Discord.
+
+`users` tracked users, spread over `channels` channels of a dpytest guild, each post one
+activity. A single poll cycle of a synthetic provider hands them to the bot, which stores
+them in the outbox, renders them and sends them through the batcher and the dispatcher, as
+in production. The latency of each feed is measured from the end of the provider's fetch
+to the send of its message.
+
+Usage: python -m benchmarks.load [--users N] [--channels M] [--channel-rate R] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Mapping, Optional, Sequence
+
+import discord
+import discord.ext.test as dpytest
+from discord.client import _LoopSentinel
+from loguru import logger
+
+from pigloo.config import config
+from pigloo.cursors import Cursor
+from pigloo.feed import Anime, Feed, FeedStatus, Service, TrackedUser, stable_uuid
+from pigloo.poller import FeedPoller
+from pigloo.providers.base import UserActivities
+
+SERVICE = Service(id=stable_uuid("AniList", "service", 0), name="AniList")
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class SyntheticProvider:
+    """Provider answering every poll with one new activity per user, on one of `media` media."""
+
+    name = "AniList"
+
+    def __init__(self, media: int = 500) -> None:
+        self.media = [
+            Anime(
+                id=stable_uuid("AniList", "media", index),
+                name=f"Anime {index}",
+                service=SERVICE,
+                max_progress=12,
+                url=f"https://anilist.co/anime/{index}",
+                image=f"https://img.anili.st/media/anime/{index}.jpg",
+                format="TV",
+            )
+            for index in range(media)
+        ]
+        # Time at which the feed of each id was fetched, read by the harness
+        self.fetched_at: dict[str, float] = {}
+
+    def cost(self, users: int) -> int:
+        return 1
+
+    async def fetch_user(self, name: str) -> Optional[TrackedUser]:
+        return None
+
+    async def fetch_activities(
+        self, users: Sequence[TrackedUser], cursors: Mapping[TrackedUser, Optional[Cursor]]
+    ) -> dict[TrackedUser, UserActivities]:
+        activities = {}
+        for index, user in enumerate(users):
+            previous = cursors.get(user)
+            last_id = previous.last_id + 1 if previous is not None else 1
+            feed = Feed(
+                id=stable_uuid("AniList", "activity", f"{user.id}:{last_id}"),
+                user={"id": user.uuid, "name": user.name, "service": SERVICE},
+                service=SERVICE,
+                media=self.media[index % len(self.media)],
+                progress=last_id % 12,
+                datetime=START + timedelta(seconds=last_id),
+                status=FeedStatus(label="Watching"),
+            )
+            activities[user] = UserActivities([feed], Cursor(last_id=last_id, last_timestamp=feed.datetime))
+        now = time.perf_counter()
+        for user_activities in activities.values():
+            self.fetched_at[str(user_activities.feeds[0].id)] = now
+        return activities
+
+
+def percentile(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+async def run_load(
+    users: int = 10_000, channels: int = 100, batch_window: float = 0.05, channel_rate: Optional[int] = None
+) -> dict:
+    """Runs one poll cycle of `users` users across `channels` channels and returns the measures.
+
+    `channel_rate` overrides the messages allowed per channel by the dispatcher's rate limit.
+    """
+    dispatch = {"batch_window": str(batch_window)}
+    if channel_rate is not None:
+        dispatch["channel_rate"] = str(channel_rate)
+    config.read_dict({"STORAGE": {"database": ":memory:"}, "DISPATCH": dispatch})
+    from pigloo.bot import PiglooBot
+
+    # dpytest needs the members intent to create the bot's member
+    intents = discord.Intents.default()
+    intents.members = True
+    bot = PiglooBot(intents=intents)
+    if isinstance(bot.loop, _LoopSentinel):
+        await bot._async_setup_hook()
+    await asyncio.gather(bot.outbox.load(), bot.subscriptions.load(), bot.cursors.load())
+    dpytest.configure(bot, text_channels=channels)
+    guild = bot.guilds[0]
+    text_channels = guild.text_channels
+
+    tracked = [TrackedUser(service="AniList", id=str(index), name=f"user{index}") for index in range(users)]
+    for index, user in enumerate(tracked):
+        await bot.subscriptions.add(text_channels[index % len(text_channels)].id, guild.id, user)
+    provider = SyntheticProvider()
+    # Seeds the cursors, as the first poll of a user returns no feed
+    await bot.cursors.update({user: Cursor(last_id=0, last_timestamp=START) for user in tracked})
+
+    latencies = []
+    mark_sent = bot.batcher.on_sent
+
+    def on_sent(keys: list[str]) -> None:
+        now = time.perf_counter()
+        for key in keys:
+            latencies.append(now - provider.fetched_at[key.split(":", 1)[0]])
+        mark_sent(keys)
+
+    bot.batcher.on_sent = on_sent
+    poller = FeedPoller(
+        {provider.name: provider}, bot.cursors, users=bot.subscriptions.users, sink=bot.publish_feeds, interval=60
+    )
+
+    start = time.perf_counter()
+    await poller.poll_once()
+    await bot.batcher.flush()
+    await bot.dispatcher.drain()
+    elapsed = time.perf_counter() - start
+
+    stats = bot.dispatcher.stats()
+    await bot.outbox.close()
+    await bot.database.close()
+    await dpytest.empty_queue()
+    return {
+        "users": users,
+        "channels": channels,
+        "feeds": len(latencies),
+        "messages": stats.sent,
+        "failed": stats.failed,
+        "seconds": elapsed,
+        "messages_per_second": stats.sent / elapsed,
+        "feeds_per_second": len(latencies) / elapsed,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies, default=0.0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--batch-window", type=float, default=0.05)
+    parser.add_argument("--channel-rate", type=int, help="messages allowed per channel every channel_period seconds")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    results = asyncio.run(run_load(args.users, args.channels, args.batch_window, args.channel_rate))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
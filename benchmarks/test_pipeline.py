@@ -0,0 +1,66 @@
+"""Benchmarks of the feed pipeline.
+
+Run with `python -m pytest benchmarks`, which writes the results to `benchmark-results.json`.
+Passing the results of a previous run with `--bench-baseline` fails the benchmarks that got
+more than `--bench-tolerance` (20% by default) worse.
+"""
+
+import itertools
+
+import discord
+import pytest
+from loguru import logger
+
+from benchmarks.bench_embed import make_feeds
+from benchmarks.load import run_load
+from pigloo.bot import PiglooBot
+from pigloo.embed import create_embed_from_feed, send_embed
+from pigloo.feed import Feed
+
+
+@pytest.fixture
+def quiet():
+    # Logging every sent message would dominate the measures
+    logger.disable("pigloo")
+
+    yield
+
+    logger.enable("pigloo")
+
+
+def test_feed_construction(bench):
+    feed = make_feeds(1, 1)[0]
+    fields = feed.model_dump()
+
+    bench.measure("feed.construction", lambda: Feed(**fields), number=5000)
+
+
+def test_validate_status(bench):
+    feed = make_feeds(1, 1)[0]
+
+    bench.measure("feed.validate_status", feed.validate_status, number=50000)
+
+
+def test_create_embed_from_feed(bench):
+    feeds = itertools.cycle(make_feeds(2000, 200))
+
+    bench.measure("embed.create_embed_from_feed", lambda: create_embed_from_feed(next(feeds)), number=5000)
+
+
+@pytest.mark.asyncio
+async def test_send_embed_throughput(bot: PiglooBot, bench, quiet):
+    channel = bot.guilds[0].channels[0]
+    embed = create_embed_from_feed(make_feeds(1, 1)[0])
+
+    await bench.measure_async("embed.send_embed", lambda: send_embed(embed, channel), number=200)
+
+
+@pytest.mark.asyncio
+async def test_load(bench, quiet):
+    results = await run_load(users=2000, channels=20, channel_rate=1000)
+
+    assert results["feeds"] == 2000
+    bench.record("load.feeds_per_second", results["feeds_per_second"], "feeds/s")
+    bench.record("load.messages_per_second", results["messages_per_second"], "messages/s")
+    for percentile in ("p50", "p95", "p99"):
+        bench.record(f"load.latency_{percentile}", results[f"latency_{percentile}"], "s", higher_is_better=False)
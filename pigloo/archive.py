@@ -0,0 +1,283 @@
+import asyncio
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional, Sequence
+
+from loguru import logger
+
+from pigloo.debounce import Debouncer
+from pigloo.feed import Feed
+from pigloo.storage import Database
+
+
+class Activity(NamedTuple):
+    """An archived feed, as shown by the history commands."""
+
+    id: str
+    datetime: datetime
+    user_name: str
+    service: str
+    media_name: str
+    media_url: str
+    status: str
+    progress: Optional[str]
+
+
+class ActivityStats(NamedTuple):
+    updates: int
+    media: int
+    statuses: list[tuple[str, int]]
+    top_media: list[tuple[str, str, int]]
+
+
+# Position of the last activity of a page: its date and id
+HistoryCursor = tuple[int, str]
+
+# Cursor placed before every activity: ids are never empty
+_NEWEST: HistoryCursor = (2**62, "")
+# Columns of an `Activity`, read from the covering indexes only
+_ACTIVITY_COLUMNS = "id, datetime, user_name, service, media_name, media_url, status, progress"
+# Users given as a single JSON array, whatever their number
+_USERS = "SELECT value FROM json_each(?)"
+
+
+def _create_table(connection: sqlite3.Connection) -> None:
+    # The primary key clusters the activities of a user by date, and the media index carries
+    # every column shown, so that a page of history is a single index range scan.
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS activity (
+            user_id TEXT NOT NULL,
+            datetime INTEGER NOT NULL,
+            id TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            service TEXT NOT NULL,
+            media_id TEXT NOT NULL,
+            media_name TEXT NOT NULL,
+            media_url TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress TEXT,
+            PRIMARY KEY (user_id, datetime, id)
+        ) WITHOUT ROWID
+        """
+    )
+    connection.execute(
+        """
+        CREATE INDEX IF NOT EXISTS activity_media ON activity (
+            media_id, datetime, id, user_id, user_name, service, media_name, media_url, status, progress
+        )
+        """
+    )
+    # Media are searched by the words of their name through a full-text index, kept in sync by triggers
+    connection.execute("CREATE TABLE IF NOT EXISTS media_names (media_id TEXT PRIMARY KEY, name TEXT NOT NULL)")
+    connection.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS media_search USING fts5(
+            name, content='media_names', content_rowid='rowid'
+        )
+        """
+    )
+    connection.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS media_names_insert AFTER INSERT ON media_names BEGIN
+            INSERT INTO media_search (rowid, name) VALUES (new.rowid, new.name);
+        END
+        """
+    )
+    connection.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS media_names_update AFTER UPDATE ON media_names BEGIN
+            INSERT INTO media_search (media_search, rowid, name) VALUES ('delete', old.rowid, old.name);
+            INSERT INTO media_search (rowid, name) VALUES (new.rowid, new.name);
+        END
+        """
+    )
+
+
+def _insert(connection: sqlite3.Connection, rows: list[tuple]) -> None:
+    connection.executemany("INSERT OR IGNORE INTO activity VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    # Renamed media are found by their latest name
+    connection.executemany(
+        """
+        INSERT INTO media_names VALUES (?, ?)
+        ON CONFLICT (media_id) DO UPDATE SET name = excluded.name WHERE name != excluded.name
+        """,
+        {row[5]: row[6] for row in rows}.items(),
+    )
+
+
+def _page(
+    connection: sqlite3.Connection,
+    column: str,
+    value: str,
+    users: Optional[Sequence[str]],
+    before: HistoryCursor,
+    limit: int,
+) -> list[tuple]:
+    condition = ""
+    parameters = []
+    if users is not None:
+        condition = f"AND user_id IN ({_USERS})"
+        parameters = [json.dumps(users)]
+    return connection.execute(
+        f"""
+        SELECT {_ACTIVITY_COLUMNS} FROM activity
+        WHERE {column} = ? {condition} AND (datetime, id) < (?, ?)
+        ORDER BY datetime DESC, id DESC
+        LIMIT ?
+        """,
+        [value, *parameters, *before, limit],
+    ).fetchall()
+
+
+def _search_query(name: str) -> str:
+    # Each word is quoted, so that none is read as an operator, and the last one is a prefix
+    words = ['"' + word.replace('"', '""') + '"' for word in name.split()]
+    return " ".join(words) + "*"
+
+
+def _find_media(connection: sqlite3.Connection, users: Sequence[str], name: str) -> Optional[str]:
+    row = connection.execute(
+        f"""
+        SELECT activity.media_id FROM media_search
+        JOIN media_names ON media_names.rowid = media_search.rowid
+        JOIN activity ON activity.media_id = media_names.media_id
+        WHERE media_search MATCH ? AND activity.user_id IN ({_USERS})
+        ORDER BY activity.datetime DESC
+        LIMIT 1
+        """,
+        (_search_query(name), json.dumps(users)),
+    ).fetchone()
+    return row[0] if row is not None else None
+
+
+def _stats(connection: sqlite3.Connection, user_id: str, since: int, top: int) -> ActivityStats:
+    updates, media = connection.execute(
+        "SELECT count(*), count(DISTINCT media_id) FROM activity WHERE user_id = ? AND datetime >= ?",
+        (user_id, since),
+    ).fetchone()
+    statuses = connection.execute(
+        """
+        SELECT status, count(*) FROM activity WHERE user_id = ? AND datetime >= ?
+        GROUP BY status ORDER BY count(*) DESC, status
+        """,
+        (user_id, since),
+    ).fetchall()
+    top_media = connection.execute(
+        """
+        SELECT media_name, media_url, count(*) FROM activity WHERE user_id = ? AND datetime >= ?
+        GROUP BY media_id ORDER BY count(*) DESC, max(datetime) DESC
+        LIMIT ?
+        """,
+        (user_id, since, top),
+    ).fetchall()
+    return ActivityStats(updates, media, statuses, top_media)
+
+
+def _activity(row: tuple) -> Activity:
+    id, timestamp, *columns = row
+    return Activity(id, datetime.fromtimestamp(timestamp, timezone.utc), *columns)
+
+
+def _row(feed: Feed) -> tuple:
+    progress = None
+    if feed.progress is not None:
+        progress = feed.media.build_progress_str(feed.progress, feed.progress_from)
+    return (
+        str(feed.user.id),
+        int(feed.datetime.timestamp()),
+        str(feed.id),
+        feed.user.name,
+        feed.service.name,
+        str(feed.media.id),
+        feed.media.name,
+        str(feed.media.url),
+        feed.status.label,
+        progress,
+    )
+
+
+class ActivityArchive:
+    """Every feed processed by the bot, stored in its SQLite database to answer the history commands.
+
+    Feeds are inserted in batches of up to `batch_size`, at most `flush_interval` seconds after
+    they are added, on the database thread. Pages of history are read with keyset pagination:
+    the next page starts after the `HistoryCursor` of the last activity shown, so that reading
+    it costs the same whatever the number of activities before.
+    """
+
+    def __init__(self, database: Database, *, flush_interval: float = 5.0, batch_size: int = 1000) -> None:
+        self.database = database
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._rows: list[tuple] = []
+        self._flush = Debouncer(self.flush, flush_interval, name="pigloo-archive")
+        self._flushes: set[asyncio.Task] = set()
+
+    async def load(self) -> None:
+        await self.database.run(_create_table)
+
+    def add(self, feeds: Iterable[Feed]) -> None:
+        """Archives feeds, inserted along with the others added within `flush_interval`."""
+        self._rows.extend(_row(feed) for feed in feeds)
+        if len(self._rows) >= self.batch_size:
+            rows, self._rows = self._rows, []
+            task = asyncio.create_task(self._write(rows), name="pigloo-archive-batch")
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        elif self._rows:
+            self._flush.schedule()
+
+    async def flush(self) -> None:
+        """Inserts the feeds added since the last insertion."""
+        if not self._rows:
+            return
+
+        rows, self._rows = self._rows, []
+        await self._write(rows)
+
+    async def _write(self, rows: list[tuple]) -> None:
+        try:
+            await self.database.run(_insert, rows)
+        except Exception as e:
+            logger.error(f"Cannot archive {len(rows)} feeds: {e}")
+
+    async def user_history(
+        self, user_id: str, before: Optional[HistoryCursor] = None, limit: int = 10
+    ) -> list[Activity]:
+        """Returns the activities of a user, newest first, starting after `before`."""
+        await self.flush()
+        rows = await self.database.run(_page, "user_id", user_id, None, before or _NEWEST, limit)
+        return [_activity(row) for row in rows]
+
+    async def media_history(
+        self, media_id: str, users: Sequence[str], before: Optional[HistoryCursor] = None, limit: int = 10
+    ) -> list[Activity]:
+        """Returns the activities of the given users on a media, newest first, starting after `before`."""
+        await self.flush()
+        rows = await self.database.run(_page, "media_id", media_id, users, before or _NEWEST, limit)
+        return [_activity(row) for row in rows]
+
+    async def find_media(self, users: Sequence[str], name: str) -> Optional[str]:
+        """Returns the id of the media named like `name` that the given users updated last."""
+        if not users or not name.split():
+            return None
+        await self.flush()
+        return await self.database.run(_find_media, users, name)
+
+    async def stats(self, user_id: str, since: datetime, top: int = 5) -> ActivityStats:
+        """Counts the activities of a user since a date, by status, along with the media updated most."""
+        await self.flush()
+        return await self.database.run(_stats, user_id, int(since.timestamp()), top)
+
+    async def close(self) -> None:
+        """Inserts the pending feeds right away."""
+        self._flush.cancel()
+        await asyncio.gather(*self._flushes)
+        await self.flush()
+
+
+def cursor_after(activity: Activity) -> HistoryCursor:
+    """Cursor of the page following an activity."""
+    return int(activity.datetime.timestamp()), activity.id
@@ -1,43 +1,305 @@
 import asyncio
-import os
 import signal
+import time
 import traceback
 from contextlib import suppress
+from datetime import timedelta
+from functools import partial
+
+# Imported first so that the startup profile includes the imports below
+from pigloo.startup import IMPORTED_AT, StartupProfile, discover_cogs
 
 import discord
-from discord.ext.commands import Bot
+from discord.ext.commands import AutoShardedBot, Bot
 from loguru import logger
 
+from pigloo.archive import ActivityArchive
+from pigloo.coalesce import FeedCoalescer, coalesce_feeds
 from pigloo.config import config
+from pigloo.cursors import CursorStore
+from pigloo.dedup import FeedDeduplicator, RotatingBloomFilter
+from pigloo.digest import DigestBuffer
+from pigloo.dispatcher import Dispatcher
+from pigloo.embed import EmbedBatcher, EmbedRenderer, send_embeds
+from pigloo.feed import Feed
+from pigloo.gateway import gateway_options, peak_rss
+from pigloo.httpcache import create_http_cache
+from pigloo.metrics import GATEWAY_LATENCY, PENDING_FEEDS, QUEUED_REQUESTS, TRACKED_USERS, MetricsServer
+from pigloo.outbox import Outbox, OutboxEntry
+from pigloo.permissions import PermissionCache
+from pigloo.sharding import ShardPartition
+from pigloo.storage import Database
+from pigloo.subscriptions import SubscriptionStore
 
 
-class PiglooBot(Bot):
-    def __init__(self, *, intents: discord.Intents = None):
-        if intents is None:
-            intents = discord.Intents.default()
-            intents.members = True
-            intents.message_content = True
+# Sharded mode is opt-in: a single gateway connection is enough for most bots
+SHARDING = ShardPartition.from_config()
 
-        super().__init__(command_prefix=config.get("BOT", "prefix"), intents=intents)
+
+class PiglooBot(AutoShardedBot if SHARDING is not None else Bot):
+    def __init__(self, *, intents: discord.Intents = None):
+        self.gateway_profile = config.get("GATEWAY", "profile", fallback="full")
+        options = gateway_options(self.gateway_profile)
+        if intents is not None:
+            options["intents"] = intents
+        if SHARDING is not None:
+            options.update(SHARDING.client_options())
+        super().__init__(command_prefix=config.get("BOT", "prefix"), **options)
+        self.database = Database(config.get("STORAGE", "database", fallback="pigloo.db"))
+        self.cursors = CursorStore(self.database, SHARDING)
+        self.subscriptions = SubscriptionStore(self.database, SHARDING)
+        self.http_cache = create_http_cache(self.database)
+        self.outbox = Outbox(
+            self.database,
+            SHARDING,
+            commit_interval=config.getfloat("OUTBOX", "commit_interval", fallback=1.0),
+            retention=config.getfloat("OUTBOX", "retention_days", fallback=7.0) * 24 * 3600,
+        )
+        self.drain_timeout = config.getfloat("OUTBOX", "drain_timeout", fallback=10.0)
+        self._undelivered: list[OutboxEntry] = []
+        self.archive = None
+        if config.getboolean("ARCHIVE", "enabled", fallback=True):
+            self.archive = ActivityArchive(
+                self.database,
+                flush_interval=config.getfloat("ARCHIVE", "flush_interval", fallback=5.0),
+                batch_size=config.getint("ARCHIVE", "batch_size", fallback=1000),
+            )
+        self.dedup = None
+        if config.getboolean("DEDUP", "enabled", fallback=True):
+            self.dedup = FeedDeduplicator(
+                RotatingBloomFilter(
+                    capacity=config.getint("DEDUP", "capacity", fallback=100000),
+                    error_rate=config.getfloat("DEDUP", "error_rate", fallback=1e-6),
+                    window=config.getfloat("DEDUP", "window_hours", fallback=48.0) * 3600,
+                ),
+                recent=config.getint("DEDUP", "recent_size", fallback=4096),
+                snapshot=config.get("DEDUP", "snapshot", fallback="") or None,
+                snapshot_interval=config.getfloat("DEDUP", "snapshot_interval", fallback=300.0),
+            )
+        self.coalesce_max_gap = timedelta(seconds=config.getfloat("DISPATCH", "coalesce_max_gap", fallback=3600.0))
+        self.coalescer = FeedCoalescer(
+            hold=config.getfloat("DISPATCH", "coalesce_hold", fallback=300.0),
+            max_gap=self.coalesce_max_gap,
+            deliver=self.deliver,
+            supersede=self.outbox.mark_sent,
+        )
+        self.permissions = PermissionCache()
+        self.renderer = EmbedRenderer(cache_size=config.getint("BOT", "embed_cache_size", fallback=1024))
+        self.dispatcher = Dispatcher(
+            concurrency=config.getint("DISPATCH", "concurrency", fallback=8),
+            bucket_capacity=config.getint("DISPATCH", "channel_rate", fallback=5),
+            bucket_period=config.getfloat("DISPATCH", "channel_period", fallback=5.0),
+        )
+        self.batcher = EmbedBatcher(
+            window=config.getfloat("DISPATCH", "batch_window", fallback=2.0),
+            send=partial(send_embeds, dispatcher=self.dispatcher),
+            on_sent=self.outbox.mark_sent,
+        )
+        self.digests = DigestBuffer(
+            interval=config.getfloat("DIGEST", "interval", fallback=3600.0),
+            send=partial(send_embeds, dispatcher=self.dispatcher),
+            on_sent=self.outbox.mark_sent,
+            footer=config.get("BOT", "name"),
+        )
+        QUEUED_REQUESTS.set_function(self.dispatcher.queue_depth)
+        PENDING_FEEDS.set_function(lambda: self.outbox.pending)
+        TRACKED_USERS.set_function(lambda: len(self.subscriptions.users()))
+        GATEWAY_LATENCY.set_function(lambda: self.latency)
+        self.metrics = None
+        if config.getboolean("METRICS", "enabled", fallback=False):
+            self.metrics = MetricsServer(
+                host=config.get("METRICS", "host", fallback="127.0.0.1"),
+                port=config.getint("METRICS", "port", fallback=9108),
+            )
+        self.session = None
+        self.providers = {}
+        self.poller = None
+        self.workers = None
+        self.startup = StartupProfile(config.getboolean("BOT", "startup_profile", fallback=False))
+        self.startup.mark("imports and bot creation")
         self.add_commands()
 
     async def setup_hook(self):
-        # Loading cogs
-        for filename in os.listdir("./pigloo/cogs"):
-            if filename.endswith(".py"):
-                logger.info(f"Loading cogs pigloo.cogs.{filename[:-3]}")
-                await self.load_extension(f"pigloo.cogs.{filename[:-3]}")
+        # Providers, HTTP and polling modules are only needed once the bot is logged in
+        from pigloo.http import create_session
+        from pigloo.ingest import create_providers
+
+        cogs = discover_cogs()
+        logger.info(f"Loading cogs {', '.join(cogs)}")
+        self._undelivered, *_ = await asyncio.gather(
+            self.outbox.load(),
+            self.cursors.load(),
+            *((self.dedup.load(),) if self.dedup is not None else ()),
+            *((self.archive.load(),) if self.archive is not None else ()),
+            self.subscriptions.load(),
+            self.http_cache.load(warm=config.getint("HTTP_CACHE", "warm_entries", fallback=1024)),
+            # Cogs do not depend on each other
+            *(self.load_extension(cog) for cog in cogs),
+        )
+        self.startup.mark("stores and cogs loaded")
+
+        if self.metrics is not None:
+            await self.metrics.start()
+        self.session = create_session()
+        workers = config.getint("WORKERS", "count", fallback=0)
+        if workers > 0:
+            from pigloo.ingest import WorkerPool
+
+            # Only the commands use the providers of this process: the workers have their own budget
+            self.providers = create_providers(self.session, self.http_cache)
+            self.workers = WorkerPool(
+                workers, self.publish_feeds, max_queued=config.getint("WORKERS", "max_queued", fallback=1000)
+            )
+        else:
+            from pigloo.identity import IdentityMap
+            from pigloo.ingest import create_scheduler
+            from pigloo.poller import FeedPoller
+
+            scheduler = create_scheduler()
+            self.providers = create_providers(
+                self.session, self.http_cache, scheduler.budget if scheduler is not None else None
+            )
+            self.poller = FeedPoller(
+                self.providers,
+                self.cursors,
+                users=self.subscriptions.users,
+                sink=self.publish_feeds,
+                interval=config.getfloat("POLLER", "interval", fallback=60.0),
+                identities=IdentityMap(config.getint("POLLER", "identity_map_size", fallback=10000)),
+                scheduler=scheduler,
+            )
+        self.startup.mark("providers created")
 
     async def start(self):
         logger.success("Starting Pigloo...")
         await super().start(config.get("DISCORD", "Token"))
 
     async def close(self):
+        if self.is_closed():
+            return
+
         logger.success("Stopping Pigloo...")
+        if self.poller is not None:
+            await self.poller.stop()
+        if self.workers is not None:
+            await self.workers.stop()
+        try:
+            await asyncio.wait_for(self._drain(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Feeds not sent within {self.drain_timeout}s are left in the outbox until the restart")
+        self.digests.stop()
+        await self.outbox.close()
+        if self.dedup is not None:
+            await self.dedup.close()
+        if self.archive is not None:
+            await self.archive.close()
+        if self.metrics is not None:
+            await self.metrics.stop()
+        if self.session is not None:
+            await self.session.close()
+        stats = self.http_cache.stats()
+        logger.info(f"HTTP cache hit rate: {stats.hit_rate:.0%}, {stats.bytes_saved} bytes saved")
+        await self.http_cache.flush()
+        await self.database.close()
         await super().close()
 
+    async def _drain(self) -> None:
+        self.coalescer.flush()
+        await self.batcher.flush()
+        await self.dispatcher.drain()
+
     async def on_ready(self):
         logger.info(f"Logged in as {self.user} ({self.user.id})")
+        self.startup.mark("connected to the gateway")
+        self.startup.log()
+        # Feeds left undelivered by the previous run, now that channels are in the cache
+        if self._undelivered:
+            entries, self._undelivered = self._undelivered, []
+            self.deliver(entries)
+        logger.info(
+            f"Ready {time.perf_counter() - IMPORTED_AT:.2f}s after startup with the {self.gateway_profile} gateway "
+            f"profile, peak RSS {peak_rss() / 1024 / 1024:.1f} MiB"
+        )
+        if self.workers is not None:
+            self.workers.start()
+        else:
+            self.poller.start()
+
+    async def publish_feeds(self, feeds: list[Feed]) -> None:
+        """Stores every feed in the outbox of each channel subscribed to its user, then sends them."""
+        # Providers return some activities again across overlapping polls and retries
+        seen = []
+        if self.dedup is not None:
+            feeds, seen = self.dedup.filter(feeds)
+        if self.archive is not None:
+            self.archive.add(feeds)
+        deliveries = []
+        for feed in coalesce_feeds(feeds, self.coalesce_max_gap):
+            for channel_id in self.subscriptions.channels_for(feed):
+                # Channels of guilds handled by another process, or deleted, are not in the cache
+                channel = self.get_channel(channel_id)
+                if channel is not None and self.permissions.can_send(channel):
+                    guild = getattr(channel, "guild", None)
+                    deliveries.append((feed, channel_id, guild.id if guild is not None else None))
+
+        # Feeds already stored, when polled again, are not sent twice
+        entries = await self.outbox.add(deliveries)
+        # Only once stored, as feeds that failed to be are polled again
+        if self.dedup is not None:
+            self.dedup.remember(seen)
+        self.coalescer.add(entries)
+
+    def deliver(self, entries: list[OutboxEntry]) -> None:
+        """Queues outbox entries for sending, giving up on those whose channel cannot be used anymore."""
+        embeds = {}
+        dropped = []
+        for entry in entries:
+            channel = self.get_channel(entry.channel_id)
+            if channel is None or not self.permissions.can_send(channel):
+                dropped.append(entry.key)
+                continue
+            if self.subscriptions.is_digest(channel.id):
+                self.digests.add(entry.feed, channel, key=entry.key)
+                continue
+
+            # The embed of a feed is shared by every channel it is sent to
+            if entry.feed.id not in embeds:
+                embeds[entry.feed.id] = self.renderer.render(entry.feed)
+            if embeds[entry.feed.id] is None:
+                dropped.append(entry.key)
+                continue
+
+            self.batcher.add(embeds[entry.feed.id], channel, key=entry.key)
+        if dropped:
+            logger.warning(f"Dropping {len(dropped)} feeds of the outbox that cannot be sent")
+            self.outbox.mark_sent(dropped)
+
+    # The permissions of the bot in a channel change along with the guild, the channel, its
+    # category, the roles, and the bot's member (roles or timeout)
+    async def on_guild_update(self, before, after):
+        self.permissions.invalidate_guild(after.id)
+
+    async def on_guild_remove(self, guild):
+        self.permissions.forget_guild(guild.id)
+
+    async def on_guild_channel_update(self, before, after):
+        if isinstance(after, discord.CategoryChannel):
+            self.permissions.invalidate_guild(after.guild.id)
+        else:
+            self.permissions.invalidate_channel(after.id)
+
+    async def on_guild_channel_delete(self, channel):
+        self.permissions.forget_channel(channel.id)
+
+    async def on_guild_role_update(self, before, after):
+        self.permissions.invalidate_guild(after.guild.id)
+
+    async def on_guild_role_delete(self, role):
+        self.permissions.invalidate_guild(role.guild.id)
+
+    async def on_member_update(self, before, after):
+        if after.id == self.user.id:
+            self.permissions.invalidate_guild(after.guild.id)
 
     async def on_error(self, event, *args, **kwargs):
         logger.error(f"Event {event}. {traceback.format_exc()}")
@@ -58,6 +320,9 @@ bot = PiglooBot()
 async def exit_app(signame):
     logger.info(f"Received signal {signame.name}. Shutting down...")
 
+    # Stop the bot, letting it send the feeds it holds within the drain timeout
+    await bot.close()
+
     # Cancel all tasks except the current one
     tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
     for task in tasks:
@@ -67,9 +332,6 @@ async def exit_app(signame):
         with suppress(asyncio.CancelledError):
             await task
 
-    # Stop the bot
-    await bot.close()
-
     asyncio.get_event_loop().stop()
 
 
@@ -0,0 +1,101 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Bounded mapping evicting its least recently used entries.
+
+    Keeps hit and miss counters so that callers can report how effective the cache is.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def get(self, key: K) -> Optional[V]:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_or_create(self, key: K, factory: Callable[[], V]) -> V:
+        """Returns the cached value for `key`, creating and caching it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def pop(self, key: K) -> Optional[V]:
+        return self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TTLCache(LRUCache[K, V]):
+    """LRU cache whose entries expire `ttl` seconds after being stored.
+
+    Expired entries are dropped when they are looked up, and count as misses.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic) -> None:
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.clock = clock
+        self._expiries: dict[K, float] = {}
+
+    def get(self, key: K) -> Optional[V]:
+        expiry = self._expiries.get(key)
+        if expiry is not None and expiry <= self.clock():
+            self.pop(key)
+        return super().get(key)
+
+    def put(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+
+        if key not in self._entries and len(self._entries) >= self.maxsize:
+            # Evict the least recently used entry here so that its expiry goes with it
+            self.pop(next(iter(self._entries)))
+        super().put(key, value)
+        self._expiries[key] = self.clock() + self.ttl
+
+    def pop(self, key: K) -> Optional[V]:
+        self._expiries.pop(key, None)
+        return super().pop(key)
+
+    def clear(self) -> None:
+        self._expiries.clear()
+        super().clear()
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import timedelta
+from typing import Callable, Optional
+
+from pigloo.feed import Feed
+from pigloo.outbox import OutboxEntry
+
+
+def _can_merge(previous: Feed, feed: Feed, max_gap: timedelta) -> bool:
+    return (
+        previous.media.id == feed.media.id
+        and previous.status == feed.status
+        and previous.progress is not None
+        and feed.progress is not None
+        and previous.progress <= feed.progress
+        and feed.datetime - previous.datetime <= max_gap
+    )
+
+
+def _merge(previous: Feed, feed: Feed) -> Feed:
+    start = previous.progress_from if previous.progress_from is not None else previous.progress
+    return feed.model_copy(update={"progress_from": start})
+
+
+def coalesce_feeds(feeds: list[Feed], max_gap: timedelta) -> list[Feed]:
+    """Merges the consecutive progress updates of a user into a single feed.
+
+    Feeds must be sorted oldest first. An update is merged into the previous feed of the
+    same user when it is about the same media with the same status, less than `max_gap`
+    after it. The merged feed keeps the id and date of the latest update and the first
+    progress of the range, e.g. episodes 3 to 7.
+
+    Only the given feeds are merged: `FeedCoalescer` merges those polled separately.
+    """
+    merged: list[Optional[Feed]] = []
+    last_by_user: dict[object, int] = {}
+    for feed in feeds:
+        index = last_by_user.get(feed.user.id)
+        previous = merged[index] if index is not None else None
+        if previous is not None and _can_merge(previous, feed, max_gap):
+            feed = _merge(previous, feed)
+            merged[index] = None
+
+        last_by_user[feed.user.id] = len(merged)
+        merged.append(feed)
+
+    return [feed for feed in merged if feed is not None]
+
+
+class _Held:
+    def __init__(self, handle: asyncio.TimerHandle) -> None:
+        self.handle = handle
+        self.entries: list[OutboxEntry] = []
+        self.superseded: list[str] = []
+
+
+class FeedCoalescer:
+    """Holds the outbox entries of each user in a channel for `hold` seconds, to merge updates polled separately.
+
+    The first entry of a user in a channel starts the hold. Entries added during it are merged
+    into the last one held when `coalesce_feeds` would merge them, and every entry held is
+    released in order at its end. Released entries go to `deliver`, and the keys of those
+    merged into another to `supersede`: entries are already stored, so that a crash during
+    the hold posts them unmerged after the restart instead of losing them.
+    """
+
+    def __init__(
+        self,
+        hold: float,
+        max_gap: timedelta,
+        deliver: Callable[[list[OutboxEntry]], None],
+        supersede: Callable[[list[str]], None],
+    ) -> None:
+        self.hold = hold
+        self.max_gap = max_gap
+        self.deliver = deliver
+        self.supersede = supersede
+        self.merged = 0
+        self._held: dict[tuple[int, object], _Held] = {}
+
+    def add(self, entries: list[OutboxEntry]) -> None:
+        """Holds entries, delivering them right away when holding is disabled."""
+        if self.hold <= 0:
+            self.deliver(entries)
+            return
+
+        for entry in entries:
+            group = entry.channel_id, entry.feed.user.id
+            held = self._held.get(group)
+            if held is None:
+                handle = asyncio.get_running_loop().call_later(self.hold, self._release, group)
+                held = self._held[group] = _Held(handle)
+
+            previous = held.entries[-1] if held.entries else None
+            if previous is not None and _can_merge(previous.feed, entry.feed, self.max_gap):
+                held.entries[-1] = entry._replace(feed=_merge(previous.feed, entry.feed))
+                held.superseded.append(previous.key)
+                self.merged += 1
+            else:
+                held.entries.append(entry)
+
+    def _release(self, group: tuple[int, object]) -> None:
+        held = self._held.pop(group)
+        held.handle.cancel()
+        if held.superseded:
+            self.supersede(held.superseded)
+        self.deliver(held.entries)
+
+    def flush(self) -> None:
+        """Releases every entry held right away."""
+        for group in list(self._held):
+            self._release(group)
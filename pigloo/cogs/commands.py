@@ -1,19 +1,205 @@
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Awaitable, Callable, Literal, Optional
+
+import discord
 from discord import Interaction, app_commands
 from discord.ext import commands
 from loguru import logger
 
+from pigloo.archive import Activity, ActivityStats, HistoryCursor, cursor_after
+from pigloo.config import config
+
+ServiceName = Literal["AniList", "MyAnimeList"]
+HISTORY_COLOUR = discord.Colour.blurple()
+
+
+def _activity_line(activity: Activity, with_user: bool) -> str:
+    subject = f"**{activity.user_name}**" if with_user else f"[{activity.media_name}]({activity.media_url})"
+    line = f"<t:{int(activity.datetime.timestamp())}:R> {subject} - {activity.status}"
+    return f"{line} {activity.progress}" if activity.progress else line
+
+
+def history_embed(title: str, activities: list[Activity], with_user: bool = False) -> discord.Embed:
+    description = "\n".join(_activity_line(activity, with_user) for activity in activities)
+    return discord.Embed(colour=HISTORY_COLOUR, title=title, description=description or "No more updates.")
+
+
+def stats_embed(title: str, stats: ActivityStats) -> discord.Embed:
+    embed = discord.Embed(colour=HISTORY_COLOUR, title=title)
+    embed.description = f"{stats.updates} updates on {stats.media} media"
+    if stats.statuses:
+        embed.add_field(name="Statuses", value="\n".join(f"{status}: {count}" for status, count in stats.statuses))
+    if stats.top_media:
+        lines = (f"[{name}]({url}): {count} updates" for name, url, count in stats.top_media)
+        embed.add_field(name="Most updated", value="\n".join(lines), inline=False)
+    return embed
+
+
+class HistoryView(discord.ui.View):
+    """Pages through a history, each page starting after the last activity of the previous one."""
+
+    def __init__(
+        self,
+        fetch: Callable[[Optional[HistoryCursor], int], Awaitable[list[Activity]]],
+        title: str,
+        page_size: int,
+        with_user: bool = False,
+    ) -> None:
+        super().__init__(timeout=600)
+        self.fetch = fetch
+        self.title = title
+        self.page_size = page_size
+        self.with_user = with_user
+        self.cursor: Optional[HistoryCursor] = None
+
+    async def next_page(self) -> discord.Embed:
+        """Reads the next page, one activity more telling whether another page follows."""
+        activities = await self.fetch(self.cursor, self.page_size + 1)
+        page = activities[: self.page_size]
+        if page:
+            self.cursor = cursor_after(page[-1])
+        self.older.disabled = len(activities) <= self.page_size
+        return history_embed(self.title, page, self.with_user)
+
+    @discord.ui.button(label="Older", style=discord.ButtonStyle.secondary)
+    async def older(self, inter: Interaction, button: discord.ui.Button) -> None:
+        embed = await self.next_page()
+        await inter.response.edit_message(embed=embed, view=self)
+
 
 class PiglooCog(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
 
+    async def _reply(
+        self, inter: Interaction, content: Optional[str] = None, *, ephemeral: bool = False, **kwargs
+    ) -> None:
+        """Answers an interaction right away, with a followup message once it was deferred.
+
+        Interaction responses do not count against the rate limit of the channel's messages,
+        so they are not queued behind its feeds, which could outlast Discord's 3s deadline.
+        """
+        if inter.response.is_done():
+            await inter.followup.send(content, ephemeral=ephemeral, **kwargs)
+        else:
+            await inter.response.send_message(content, ephemeral=ephemeral, **kwargs)
+
     @app_commands.command()
-    async def register(self, inter: Interaction):
-        await inter.response.send_message(f"Registering {inter.channel_id}!")
+    @app_commands.describe(
+        username="Name of the account to follow",
+        service="Service the account is on",
+        digest="Post a periodic summary of the updates of this channel instead of a message per update",
+    )
+    async def register(
+        self, inter: Interaction, username: str, service: ServiceName = "AniList", digest: Optional[bool] = None
+    ):
+        """Posts the list updates of a user in this channel."""
+        # Looking the user up can take longer than the 3s Discord gives to answer. The followups
+        # of a deferred response keep its visibility, so every answer is only shown to the caller.
+        await inter.response.defer(ephemeral=True, thinking=True)
+        provider = self.bot.providers.get(service)
+        user = await provider.fetch_user(username) if provider else None
+        if user is None:
+            await self._reply(inter, f"Cannot find {service} user '{username}'.")
+            return
+
+        mode_changed = digest is not None and digest != self.bot.subscriptions.is_digest(inter.channel_id)
+        if mode_changed:
+            await self.bot.subscriptions.set_digest(inter.channel_id, inter.guild_id, digest)
+            logger.info(f"Channel {inter.channel_id} {'enabled' if digest else 'disabled'} the digest mode")
+
+        if not await self.bot.subscriptions.add(inter.channel_id, inter.guild_id, user):
+            message = f"{user.name} is already registered in this channel."
+            if mode_changed:
+                mode = "a periodic digest" if digest else "a message per update"
+                message += f" This channel now gets {mode} of its updates."
+            await self._reply(inter, message)
+            return
+
+        logger.info(f"Channel {inter.channel_id} registered {service} user {user.name} ({user.id})")
+        mode = " as a periodic digest" if self.bot.subscriptions.is_digest(inter.channel_id) else ""
+        await self._reply(inter, f"Registering {user.name}'s {service} in {inter.channel_id}{mode}!")
+
+    @app_commands.command()
+    @app_commands.describe(username="Name of the account to stop following", service="Service the account is on")
+    async def unregister(self, inter: Interaction, username: str, service: ServiceName = "AniList"):
+        """Stops posting the list updates of a user in this channel."""
+        user = self.bot.subscriptions.find(inter.channel_id, service, username)
+        if user is None or not await self.bot.subscriptions.remove(inter.channel_id, user):
+            await self._reply(inter, f"{username} is not registered in this channel.", ephemeral=True)
+            return
+
+        logger.info(f"Channel {inter.channel_id} unregistered {service} user {user.name} ({user.id})")
+        await self._reply(inter, f"Unregistering {user.name}'s {service} from {inter.channel_id}!")
 
     @app_commands.command()
-    async def unregister(self, inter: Interaction):
-        await inter.response.send_message(f"Unregistering {inter.channel_id}!")
+    @app_commands.describe(
+        username="Name of an account followed in this channel",
+        service="Service the account is on",
+        media="Words of the name of a media, to show the updates of every account followed in this channel on it",
+    )
+    async def history(
+        self, inter: Interaction, username: str, service: ServiceName = "AniList", media: Optional[str] = None
+    ):
+        """Shows the latest list updates of a user followed in this channel."""
+        archive = self.bot.archive
+        if archive is None:
+            await self._reply(inter, "The history of updates is disabled.", ephemeral=True)
+            return
+
+        user = self.bot.subscriptions.find(inter.channel_id, service, username)
+        if user is None:
+            await self._reply(inter, f"{username} is not registered in this channel.", ephemeral=True)
+            return
+
+        page_size = config.getint("ARCHIVE", "page_size", fallback=10)
+        if media is None:
+            fetch = partial(archive.user_history, str(user.uuid))
+            view = HistoryView(fetch, f"{user.name}'s {service} history", page_size)
+        else:
+            users = [
+                str(subscription.user.uuid) for subscription in self.bot.subscriptions.subscriptions(inter.channel_id)
+            ]
+            media_id = await archive.find_media(users, media)
+            if media_id is None:
+                await self._reply(inter, f"No update on '{media}' in this channel.", ephemeral=True)
+                return
+
+            async def fetch(before: Optional[HistoryCursor], limit: int) -> list[Activity]:
+                return await archive.media_history(media_id, users, before, limit)
+
+            latest = await archive.media_history(media_id, users, limit=1)
+            view = HistoryView(fetch, f"{latest[0].media_name} history", page_size, with_user=True)
+
+        await self._reply(inter, embed=await view.next_page(), view=view)
+
+    @app_commands.command()
+    @app_commands.describe(
+        username="Name of an account followed in this channel",
+        service="Service the account is on",
+        days="Number of days to count the updates of",
+    )
+    async def stats(
+        self,
+        inter: Interaction,
+        username: str,
+        service: ServiceName = "AniList",
+        days: app_commands.Range[int, 1, 3650] = 7,
+    ):
+        """Sums up the recent list updates of a user followed in this channel."""
+        if self.bot.archive is None:
+            await self._reply(inter, "The history of updates is disabled.", ephemeral=True)
+            return
+
+        user = self.bot.subscriptions.find(inter.channel_id, service, username)
+        if user is None:
+            await self._reply(inter, f"{username} is not registered in this channel.", ephemeral=True)
+            return
+
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        stats = await self.bot.archive.stats(str(user.uuid), since)
+        await self._reply(inter, embed=stats_embed(f"{user.name}'s {service} over {days} days", stats))
 
 
 async def setup(bot: commands.Bot) -> None:
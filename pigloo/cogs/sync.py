@@ -1,3 +1,5 @@
+import asyncio
+import time
 from typing import Literal, Optional
 
 import discord
@@ -5,32 +7,50 @@ from discord import Interaction, app_commands
 from discord.ext import commands
 from loguru import logger
 
+from pigloo.commandsync import GLOBAL_SCOPE, CommandHashStore, tree_hash
+from pigloo.config import config
+
 
 class SyncCog(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
+        self.hashes = CommandHashStore(bot.database)
+        self.concurrency = config.getint("BOT", "sync_concurrency", fallback=4)
+
+    async def cog_load(self) -> None:
+        await self.hashes.load()
 
     async def _sync_guild(
-        self, ctx: commands.Context, guild: Optional[discord.Object] = None
-    ) -> list[app_commands.AppCommand]:
-        return await ctx.bot.tree.sync(guild=guild)
+        self, ctx: commands.Context, guild: Optional[discord.Object] = None, *, force: bool = True
+    ) -> Optional[list[app_commands.AppCommand]]:
+        """Syncs a scope of the command tree, or returns None when it did not change since its last sync."""
+        scope = guild.id if guild is not None else GLOBAL_SCOPE
+        digest = tree_hash(ctx.bot.tree, guild)
+        if not force and not self.hashes.changed(scope, digest):
+            return None
+
+        synced_commands = await ctx.bot.tree.sync(guild=guild)
+        await self.hashes.update({scope: digest})
+        return synced_commands
 
     async def _copy_global_to_guild(self, ctx: commands.Context) -> list[app_commands.AppCommand]:
         ctx.bot.tree.copy_global_to(guild=ctx.guild)
-        return await ctx.bot.tree.sync(guild=ctx.guild)
+        return await self._sync_guild(ctx, ctx.guild)
 
     async def _clear_guild_commands(self, ctx: commands.Context) -> list[app_commands.AppCommand]:
         ctx.bot.tree.clear_commands(guild=ctx.guild)
         return await self._sync_guild(ctx, ctx.guild)
 
-    async def _sync_no_guilds(self, ctx: commands.Context, option: Optional[Literal["~", "*", "^"]] = None) -> None:
+    async def _sync_no_guilds(
+        self, ctx: commands.Context, option: Optional[Literal["~", "*", "^", "!"]] = None
+    ) -> None:
         """Synchronizes commands when no specific guilds are provided.
 
         Handles command synchronization based on the provided `option` argument,
         which determines whether to sync to the current guild or globally.
         """
         if option == "~":
-            synced_commands = await self._sync_guild(ctx, ctx.guild)
+            synced_commands = await self._sync_guild(ctx, ctx.guild, force=False)
             sync_scope = "to the current guild"
         elif option == "*":
             synced_commands = await self._copy_global_to_guild(ctx)
@@ -39,23 +59,39 @@ class SyncCog(commands.Cog):
             synced_commands = await self._clear_guild_commands(ctx)
             sync_scope = "to the current guild"
         else:
-            synced_commands = await self._sync_guild(ctx)
+            synced_commands = await self._sync_guild(ctx, force=option == "!")
             sync_scope = "globally"
 
+        if synced_commands is None:
+            logger.info(f"Commands unchanged, skipped syncing {sync_scope}.")
+            await ctx.send(f"Commands unchanged, skipped syncing {sync_scope}.")
+            return
+
         logger.info(f"Synced {len(synced_commands)} commands {sync_scope}.")
         await ctx.send(f"Synced {len(synced_commands)} commands {sync_scope}.")
 
-    async def _sync_multiple_guilds(self, ctx: commands.Context, guilds: list[discord.Object]) -> None:
-        synced_guild_count = 0
-        for guild in guilds:
-            try:
-                await self._sync_guild(ctx, guild)
-                synced_guild_count += 1
-            except discord.HTTPException as e:
-                logger.error(f"Failed to sync commands to guild {guild.id}: {e}")
-
-        logger.info(f"Synced commands to {synced_guild_count}/{len(guilds)} guilds.")
-        await ctx.send(f"Synced the tree to {synced_guild_count}/{len(guilds)}.")
+    async def _sync_multiple_guilds(self, ctx: commands.Context, guilds: list[discord.Object], force: bool) -> None:
+        """Syncs the guilds whose tree changed, `concurrency` at a time, and reports how long each one took."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sync(guild: discord.Object) -> str:
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    synced_commands = await self._sync_guild(ctx, guild, force=force)
+                except discord.HTTPException as e:
+                    logger.error(f"Failed to sync commands to guild {guild.id}: {e}")
+                    return "failed"
+
+                if synced_commands is None:
+                    return "unchanged"
+                return f"synced in {time.perf_counter() - start:.2f}s"
+
+        results = await asyncio.gather(*(sync(guild) for guild in guilds))
+        synced_guild_count = sum(result.startswith("synced") for result in results)
+        report = "\n".join(f"- {guild.id}: {result}" for guild, result in zip(guilds, results))
+        logger.info(f"Synced commands to {synced_guild_count}/{len(guilds)} guilds.\n{report}")
+        await ctx.send(f"Synced the tree to {synced_guild_count}/{len(guilds)}.\n{report}"[:2000])
 
     @commands.command()
     @commands.guild_only()
@@ -64,12 +100,14 @@ class SyncCog(commands.Cog):
         self,
         ctx: commands.Context,
         guilds: commands.Greedy[discord.Object],
-        option: Optional[Literal["~", "*", "^"]] = None,
+        option: Optional[Literal["~", "*", "^", "!"]] = None,
     ) -> None:
         """Synchronizes the bot's application commands with Discord.
 
         This command allows syncing commands globally, to specific guilds,
         copying global commands to a guild, or clearing guild commands.
+        Scopes whose commands did not change since their last sync are skipped,
+        unless the `!` option is given.
 
         Example usage:
         - `!sync` - Syncs commands globally.
@@ -78,11 +116,12 @@ class SyncCog(commands.Cog):
         - `!sync ^` - Clears commands in the current guild.
         - `!sync <guild_id>` - Syncs commands to the specified guild.
         - `!sync <guild_id1> <guild_id2>` - Syncs commands to multiple specified guilds.
+        - `!sync !` or `!sync <guild_id> !` - Syncs even if the commands did not change.
         """
         if not guilds:
             await self._sync_no_guilds(ctx, option)
         else:
-            await self._sync_multiple_guilds(ctx, guilds)
+            await self._sync_multiple_guilds(ctx, guilds, force=option == "!")
 
 
 async def setup(bot: commands.Bot) -> None:
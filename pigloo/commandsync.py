@@ -0,0 +1,66 @@
+import hashlib
+import json
+import sqlite3
+from typing import Optional
+
+import discord
+from discord import app_commands
+
+from pigloo.storage import Database
+
+# Scope key of the global commands, guild ids being positive
+GLOBAL_SCOPE = 0
+
+
+def tree_hash(tree: app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """Hashes the payload that syncing a scope of the command tree would upload to Discord."""
+    payload = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def _create_table(connection: sqlite3.Connection) -> list[tuple]:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS command_hashes (
+            scope INTEGER PRIMARY KEY,
+            hash TEXT NOT NULL
+        )
+        """
+    )
+    return connection.execute("SELECT scope, hash FROM command_hashes").fetchall()
+
+
+def _upsert(connection: sqlite3.Connection, rows: list[tuple]) -> None:
+    connection.executemany(
+        """
+        INSERT INTO command_hashes (scope, hash) VALUES (?, ?)
+        ON CONFLICT (scope) DO UPDATE SET hash = excluded.hash
+        """,
+        rows,
+    )
+
+
+class CommandHashStore:
+    """Remembers the hash of the command tree last synced to each scope (globally or per guild).
+
+    Scopes whose tree did not change since their last sync can then be skipped.
+    """
+
+    def __init__(self, database: Database) -> None:
+        self.database = database
+        self._hashes: dict[int, str] = {}
+
+    async def load(self) -> None:
+        self._hashes = dict(await self.database.run(_create_table))
+
+    def changed(self, scope: int, digest: str) -> bool:
+        return self._hashes.get(scope) != digest
+
+    async def update(self, hashes: dict[int, str]) -> None:
+        changed = {scope: digest for scope, digest in hashes.items() if self.changed(scope, digest)}
+        if not changed:
+            return
+
+        await self.database.run(_upsert, list(changed.items()))
+        self._hashes.update(changed)
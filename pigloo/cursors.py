@@ -0,0 +1,94 @@
+import sqlite3
+from datetime import datetime, timezone
+from typing import Optional
+
+from pydantic import AwareDatetime, BaseModel, ConfigDict
+
+from pigloo.feed import TrackedUser
+from pigloo.sharding import ShardPartition
+from pigloo.storage import Database
+
+
+class Cursor(BaseModel):
+    """Position of the newest activity already processed for a tracked user."""
+
+    model_config = ConfigDict(frozen=True)
+
+    last_id: int
+    last_timestamp: AwareDatetime
+
+
+def _create_table(connection: sqlite3.Connection, scope: str) -> list[tuple]:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cursors (
+            scope TEXT NOT NULL,
+            service TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            last_id INTEGER NOT NULL,
+            last_timestamp INTEGER NOT NULL,
+            PRIMARY KEY (scope, service, user_id)
+        ) WITHOUT ROWID
+        """
+    )
+    # Cursors of the unsharded bot cover every guild, so they are valid for any set of shards
+    return connection.execute(
+        """
+        SELECT service, user_id, last_id, last_timestamp FROM cursors
+        WHERE scope IN (?, '')
+        ORDER BY scope = ?
+        """,
+        (scope, scope),
+    ).fetchall()
+
+
+def _upsert(connection: sqlite3.Connection, rows: list[tuple]) -> None:
+    connection.executemany(
+        """
+        INSERT INTO cursors (scope, service, user_id, last_id, last_timestamp) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (scope, service, user_id)
+        DO UPDATE SET last_id = excluded.last_id, last_timestamp = excluded.last_timestamp
+        """,
+        rows,
+    )
+
+
+class CursorStore:
+    """Persists, for every tracked user, the newest activity already processed.
+
+    Cursors are loaded in memory at startup and written back in a single transaction per
+    poll cycle, so that a restarted bot resumes where it stopped instead of re-scanning history.
+    Processes running part of the shards each poll users for their own guilds, so they keep
+    their own cursors, scoped by their shards.
+    """
+
+    def __init__(self, database: Database, partition: Optional[ShardPartition] = None) -> None:
+        self.database = database
+        self.scope = partition.scope if partition is not None else ""
+        self._cursors: dict[tuple[str, str], Cursor] = {}
+
+    async def load(self) -> None:
+        rows = await self.database.run(_create_table, self.scope)
+        self._cursors = {
+            (service, user_id): Cursor(
+                last_id=last_id, last_timestamp=datetime.fromtimestamp(last_timestamp, tz=timezone.utc)
+            )
+            for service, user_id, last_id, last_timestamp in rows
+        }
+
+    def get(self, user: TrackedUser) -> Optional[Cursor]:
+        return self._cursors.get((user.service, user.id))
+
+    async def update(self, cursors: dict[TrackedUser, Cursor]) -> None:
+        """Saves the given cursors, skipping those that did not move."""
+        changed = {user: cursor for user, cursor in cursors.items() if self.get(user) != cursor}
+        if not changed:
+            return
+
+        rows = [
+            (self.scope, user.service, user.id, cursor.last_id, int(cursor.last_timestamp.timestamp()))
+            for user, cursor in changed.items()
+        ]
+        await self.database.run(_upsert, rows)
+        for user, cursor in changed.items():
+            self._cursors[(user.service, user.id)] = cursor
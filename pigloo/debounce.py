@@ -0,0 +1,36 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+
+class Debouncer:
+    """Runs a coroutine function once, `delay` seconds after the first of a series of calls to `schedule`.
+
+    The run itself is shielded, so that cancelling the debouncer never interrupts it midway.
+    """
+
+    def __init__(self, fn: Callable[[], Awaitable[None]], delay: float, name: str) -> None:
+        self.fn = fn
+        self.delay = delay
+        self.name = name
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def scheduled(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def schedule(self) -> None:
+        """Runs the function after `delay` seconds, unless a run is already scheduled."""
+        if not self.scheduled:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def _run(self) -> None:
+        await asyncio.sleep(self.delay)
+        await asyncio.shield(self.fn())
+
+    def cancel(self) -> bool:
+        """Cancels the scheduled run, returning whether there was one."""
+        scheduled = self.scheduled
+        if scheduled:
+            self._task.cancel()
+        self._task = None
+        return scheduled
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import math
+import os
+import struct
+import time
+from typing import Callable, Iterable, Optional
+
+from loguru import logger
+
+from pigloo.cache import LRUCache
+from pigloo.debounce import Debouncer
+from pigloo.feed import Feed
+from pigloo.metrics import FEEDS_DUPLICATED
+
+# Header of a snapshot: magic, version, bits, hashes, capacity, generations
+_HEADER = struct.Struct("<4sBQIQB")
+# Header of a generation in a snapshot: creation date, items
+_GENERATION = struct.Struct("<dQ")
+_MAGIC = b"PGBF"
+_VERSION = 1
+
+
+def _hash(key: bytes) -> tuple[int, int]:
+    digest = hashlib.blake2b(key, digest_size=16).digest()
+    # Odd so that the probes of a key never all land on the same bit
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class BloomFilter:
+    """Fixed-size set of hashed keys, answering membership with false positives but no false negatives.
+
+    Each key sets `hashes` bits, derived by double hashing from a single digest.
+    """
+
+    def __init__(self, bits: int, hashes: int, created_at: float = 0.0) -> None:
+        self.bits = bits
+        self.hashes = hashes
+        self.created_at = created_at
+        self.items = 0
+        self._array = bytearray((bits + 7) // 8)
+
+    @classmethod
+    def sized(cls, capacity: int, error_rate: float, created_at: float = 0.0) -> "BloomFilter":
+        """Filter holding `capacity` keys with a false positive rate of `error_rate`."""
+        bits = max(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        hashes = max(round(bits / capacity * math.log(2)), 1)
+        return cls(bits, hashes, created_at)
+
+    def _positions(self, hashed: tuple[int, int]) -> Iterable[int]:
+        first, step = hashed
+        return ((first + index * step) % self.bits for index in range(self.hashes))
+
+    def add(self, hashed: tuple[int, int]) -> None:
+        for position in self._positions(hashed):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.items += 1
+
+    def __contains__(self, hashed: tuple[int, int]) -> bool:
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(hashed))
+
+
+class RotatingBloomFilter:
+    """Bloom filter forgetting keys after a while, so that it never fills up.
+
+    Keys are added to the newest of `generations` filters and looked up in all of them. A new
+    generation replaces the oldest one every `window` seconds, or as soon as the newest holds
+    `capacity` keys, so that keys are remembered for at least `window` seconds unless more than
+    `capacity` arrive meanwhile. Memory stays that of `generations` filters.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        window: float,
+        generations: int = 2,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self.clock = clock
+        template = BloomFilter.sized(capacity, error_rate)
+        self.bits = template.bits
+        self.hashes = template.hashes
+        self.generations = [BloomFilter(self.bits, self.hashes, clock()) for _ in range(generations)]
+
+    def _rotate(self) -> None:
+        newest = self.generations[0]
+        if newest.items >= self.capacity or self.clock() - newest.created_at >= self.window:
+            self.generations.pop()
+            self.generations.insert(0, BloomFilter(self.bits, self.hashes, self.clock()))
+
+    def add(self, hashed: tuple[int, int]) -> None:
+        self._rotate()
+        self.generations[0].add(hashed)
+
+    def __contains__(self, hashed: tuple[int, int]) -> bool:
+        return any(hashed in generation for generation in self.generations)
+
+    def save(self, path: str) -> None:
+        """Writes the filter to a file, replaced atomically.
+
+        Safe to call from another thread: keys added meanwhile may or may not be saved.
+        """
+        # Copied at once, as a rotation could happen while saving
+        generations = list(self.generations)
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, _VERSION, self.bits, self.hashes, self.capacity, len(generations)))
+            for generation in generations:
+                file.write(_GENERATION.pack(generation.created_at, generation.items))
+                file.write(generation._array)
+        os.replace(temporary, path)
+
+    def load(self, path: str) -> bool:
+        """Restores the generations saved to a file, unless it is missing or was saved with other settings."""
+        try:
+            with open(path, "rb") as file:
+                magic, version, bits, hashes, capacity, generations = _HEADER.unpack(file.read(_HEADER.size))
+                if (magic, version, bits, hashes, capacity) != (
+                    _MAGIC,
+                    _VERSION,
+                    self.bits,
+                    self.hashes,
+                    self.capacity,
+                ):
+                    logger.warning(f"Ignoring the deduplication snapshot {path}, saved with other settings")
+                    return False
+
+                loaded = []
+                for _ in range(generations):
+                    created_at, items = _GENERATION.unpack(file.read(_GENERATION.size))
+                    generation = BloomFilter(bits, hashes, created_at)
+                    generation.items = items
+                    if file.readinto(generation._array) != len(generation._array):
+                        raise EOFError("truncated file")
+                    loaded.append(generation)
+        except FileNotFoundError:
+            return False
+        except (OSError, EOFError, struct.error) as e:
+            logger.error(f"Cannot read the deduplication snapshot {path}: {e}")
+            return False
+
+        # Keeps the configured number of generations, dropping the oldest saved ones
+        count = len(self.generations)
+        self.generations = (loaded + self.generations)[:count]
+        return True
+
+
+def feed_keys(feed: Feed) -> tuple[bytes, bytes]:
+    """Keys of a feed: its id, and a fingerprint of what it says to catch the same update under another id."""
+    fingerprint = f"{feed.service.id}|{feed.user.id}|{feed.media.id}|{feed.progress}|{feed.status.label}"
+    return b"id:" + feed.id.bytes, b"fp:" + fingerprint.encode()
+
+
+class FeedDeduplicator:
+    """Drops the feeds already seen, by id or by fingerprint, in constant time and memory.
+
+    The most recent keys are kept exactly in an LRU cache, in front of a rotating Bloom filter
+    remembering older ones within its window: a new feed is wrongly dropped with the error
+    rate of the filter at most. The filter is saved to `snapshot` at most `snapshot_interval`
+    seconds after it changes, and on close.
+    """
+
+    def __init__(
+        self,
+        bloom: RotatingBloomFilter,
+        recent: int = 4096,
+        snapshot: Optional[str] = None,
+        snapshot_interval: float = 300.0,
+    ) -> None:
+        self.bloom = bloom
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+        self.duplicates = 0
+        self._recent: LRUCache[tuple[int, int], bool] = LRUCache(recent)
+        self._save = Debouncer(self.save, snapshot_interval, name="pigloo-dedup")
+        # Saves write to the same temporary file
+        self._saving = asyncio.Lock()
+
+    async def load(self) -> None:
+        """Restores the filter saved by the previous run."""
+        if self.snapshot is not None and await asyncio.to_thread(self.bloom.load, self.snapshot):
+            logger.info(f"Restored the deduplication filter from {self.snapshot}")
+
+    def _seen(self, hashed: tuple[int, int]) -> bool:
+        return hashed in self._recent or hashed in self.bloom
+
+    def filter(self, feeds: list[Feed]) -> tuple[list[Feed], list[tuple[int, int]]]:
+        """Returns the feeds not seen before, along with their keys.
+
+        Nothing is remembered until the keys are given to `remember`, once the feeds are
+        stored: feeds polled again after a failure to store them are not dropped.
+        """
+        fresh = []
+        keys = []
+        batch = set()
+        for feed in feeds:
+            hashed = [_hash(key) for key in feed_keys(feed)]
+            if any(key in batch or self._seen(key) for key in hashed):
+                continue
+
+            batch.update(hashed)
+            keys.extend(hashed)
+            fresh.append(feed)
+
+        duplicates = len(feeds) - len(fresh)
+        if duplicates:
+            self.duplicates += duplicates
+            FEEDS_DUPLICATED.inc(duplicates)
+            logger.debug(f"Dropped {duplicates} feeds already seen")
+        return fresh, keys
+
+    def remember(self, keys: list[tuple[int, int]]) -> None:
+        """Records the keys of stored feeds, so that the feeds are dropped when seen again."""
+        for hashed in keys:
+            self._recent.put(hashed, True)
+            self.bloom.add(hashed)
+        if keys and self.snapshot is not None:
+            self._save.schedule()
+
+    async def save(self) -> None:
+        """Writes the filter to its snapshot."""
+        if self.snapshot is None:
+            return
+
+        try:
+            async with self._saving:
+                await asyncio.to_thread(self.bloom.save, self.snapshot)
+        except OSError as e:
+            logger.error(f"Cannot save the deduplication filter to {self.snapshot}: {e}")
+
+    async def close(self) -> None:
+        """Saves the filter right away if it changed since the last snapshot."""
+        if self._save.cancel():
+            await self.save()
@@ -0,0 +1,176 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+import discord
+from loguru import logger
+
+from pigloo.feed import Feed
+
+# Limits of Discord on embeds, in characters unless stated otherwise
+MAX_FIELDS = 25
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+MAX_EMBED_CHARACTERS = 6000
+# Shared by every embed of a message
+MAX_MESSAGE_CHARACTERS = 6000
+MAX_EMBEDS_PER_MESSAGE = 10
+
+DIGEST_COLOUR = 0xEED000
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _media_line(updates: list[Feed]) -> str:
+    """Summarizes the updates of a user on a media, oldest first, with the latest status."""
+    latest = updates[-1]
+    line = f"[{latest.media.name}]({latest.media.url}) - {latest.status.label}"
+    progresses = [
+        progress for feed in updates for progress in (feed.progress_from, feed.progress) if progress is not None
+    ]
+    if latest.progress is not None and progresses:
+        line += f" {latest.media.build_progress_str(latest.progress, min(progresses))}"
+    if len(updates) > 1:
+        line += f" ({len(updates)} updates)"
+    return _truncate(line, MAX_FIELD_VALUE)
+
+
+def digest_fields(feeds: list[Feed]) -> list[tuple[str, str]]:
+    """Groups feeds by user, then by media, into `(name, value)` embed fields within Discord's limits.
+
+    A user whose lines do not fit in one field gets several, the next ones being marked as continued.
+    """
+    updates: dict[tuple, dict] = {}
+    for feed in sorted(feeds, key=lambda feed: feed.datetime):
+        user = updates.setdefault((feed.service.id, feed.user.id), {"feed": feed, "media": {}})
+        user["media"].setdefault(feed.media.id, []).append(feed)
+
+    continued = " (continued)"
+    fields = []
+    for user in updates.values():
+        base = _truncate(f"{user['feed'].user.name}'s {user['feed'].service.name}", MAX_FIELD_NAME - len(continued))
+        name = base
+        value = ""
+        for line in (_media_line(media_updates) for media_updates in user["media"].values()):
+            if value and len(value) + 1 + len(line) > MAX_FIELD_VALUE:
+                fields.append((name, value))
+                name = base + continued
+                value = ""
+            value = f"{value}\n{line}" if value else line
+        fields.append((name, value))
+    return fields
+
+
+def build_digest(feeds: list[Feed], title: str, footer: Optional[str] = None) -> list[discord.Embed]:
+    """Creates the summary embeds of feeds, starting a new embed whenever one is full."""
+    embeds = []
+    embed = None
+    latest = max(feed.datetime for feed in feeds)
+    for name, value in digest_fields(feeds):
+        if (
+            embed is None
+            or len(embed.fields) >= MAX_FIELDS
+            or len(embed) + len(name) + len(value) > MAX_EMBED_CHARACTERS
+        ):
+            embed = discord.Embed(colour=DIGEST_COLOUR, title=title if not embeds else f"{title} (continued)")
+            embed.timestamp = latest
+            if footer is not None:
+                embed.set_footer(text=footer)
+            embeds.append(embed)
+        embed.add_field(name=name, value=value, inline=False)
+    return embeds
+
+
+def pack_messages(embeds: list[discord.Embed]) -> list[list[discord.Embed]]:
+    """Groups embeds into as few messages as the limits on embeds and characters per message allow."""
+    messages = []
+    characters = 0
+    for embed in embeds:
+        if (
+            not messages
+            or len(messages[-1]) >= MAX_EMBEDS_PER_MESSAGE
+            or characters + len(embed) > MAX_MESSAGE_CHARACTERS
+        ):
+            messages.append([])
+            characters = 0
+        messages[-1].append(embed)
+        characters += len(embed)
+    return messages
+
+
+class DigestBuffer:
+    """Buffers the feeds of digest channels and posts them as one summary every `interval` seconds.
+
+    The interval of a channel starts with its first buffered feed. Keys given along with the
+    feeds are handed to `on_sent` once the summary that includes them is sent.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        send: Callable[[list[discord.Embed], discord.abc.Messageable], Awaitable[Optional[list[bool]]]],
+        on_sent: Optional[Callable[[list[str]], None]] = None,
+        footer: Optional[str] = None,
+    ) -> None:
+        self.interval = interval
+        self.send = send
+        self.on_sent = on_sent
+        self.footer = footer
+        self._feeds: dict[int, list[tuple[Feed, Optional[str]]]] = {}
+        self._channels: dict[int, discord.abc.Messageable] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return sum(len(feeds) for feeds in self._feeds.values())
+
+    def add(self, feed: Feed, channel: discord.abc.Messageable, key: Optional[str] = None) -> None:
+        self._feeds.setdefault(channel.id, []).append((feed, key))
+        self._channels[channel.id] = channel
+        if channel.id not in self._tasks:
+            self._tasks[channel.id] = asyncio.create_task(self._run(channel.id), name=f"pigloo-digest-{channel.id}")
+
+    async def _run(self, channel_id: int) -> None:
+        try:
+            await asyncio.sleep(self.interval)
+        finally:
+            del self._tasks[channel_id]
+        await self._flush(channel_id)
+
+    async def _flush(self, channel_id: int) -> None:
+        buffered = self._feeds.pop(channel_id, [])
+        channel = self._channels.pop(channel_id, None)
+        if not buffered:
+            return
+
+        feeds = [feed for feed, _ in buffered]
+        keys = [key for _, key in buffered if key is not None]
+        embeds = build_digest(feeds, f"{len(feeds)} updates", self.footer)
+        sent = True
+        for message in pack_messages(embeds):
+            try:
+                result = await self.send(message, channel)
+            except Exception as e:
+                logger.error(f"Impossible to send the digest of channel '{channel_id}': {e}")
+                result = [False]
+            sent = sent and (result is None or all(result))
+        # The feeds of a digest not entirely sent stay in the outbox, to be sent again after a restart
+        if not sent:
+            return
+
+        logger.info(f"Digest of {len(feeds)} feeds sent in {len(embeds)} embeds to channel {channel_id}")
+        if self.on_sent is not None and keys:
+            self.on_sent(keys)
+
+    async def flush(self) -> None:
+        """Posts every buffered digest right away."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*(self._flush(channel_id) for channel_id in list(self._feeds)))
+
+    def stop(self) -> None:
+        """Stops the digest timers. Buffered feeds are left to the outbox, which sends them after a restart."""
+        for task in self._tasks.values():
+            task.cancel()
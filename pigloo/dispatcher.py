@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, NamedTuple, Optional, TypeVar
+
+import discord
+from loguru import logger
+
+from pigloo.metrics import RATE_LIMITS
+
+T = TypeVar("T")
+
+
+def message_route(channel_id: int) -> str:
+    """Name of the Discord rate-limit route used to post messages in a channel."""
+    return f"POST /channels/{channel_id}/messages"
+
+
+class TokenBucket:
+    """Client-side model of a rate-limit bucket: `capacity` requests per `period` seconds.
+
+    Buckets are static and come from the configuration. discord.py reads Discord's
+    `X-RateLimit-*` headers and retries 429 responses itself, without exposing the limits it
+    learns, so the dispatcher only smooths the sends within the configured rate.
+    """
+
+    def __init__(self, capacity: int, period: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.capacity = capacity
+        self.period = period
+        self.clock = clock
+        self.tokens = float(capacity)
+        self._updated_at = clock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.capacity / self.period)
+        self._updated_at = now
+
+    def delay(self, tokens: float = 1) -> float:
+        """Seconds to wait before `tokens` requests can be made."""
+        self._refill(self.clock())
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) * self.period / self.capacity
+
+    def consume(self, tokens: float = 1) -> None:
+        self._refill(self.clock())
+        self.tokens -= tokens
+
+
+class Job(NamedTuple):
+    enqueued_at: float
+    send: Callable[[], Awaitable[Any]]
+    route: Optional[str]
+    future: asyncio.Future
+
+
+class DispatcherStats(NamedTuple):
+    queued: int
+    in_flight: int
+    sent: int
+    failed: int
+    average_wait: float
+    max_wait: float
+
+
+class Dispatcher:
+    """Schedules every outbound Discord request.
+
+    Each channel has its own queue drained in order by its own task, so a slow or
+    rate-limited channel only delays itself. Requests wait for their route's token bucket,
+    then for a slot under the global concurrency cap. Interaction replies are not queued:
+    they must be sent within Discord's deadline, and do not count against channel limits.
+    """
+
+    def __init__(self, concurrency: int, bucket_capacity: int = 5, bucket_period: float = 5.0) -> None:
+        self.bucket_capacity = bucket_capacity
+        self.bucket_period = bucket_period
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._queues: dict[int, deque[Job]] = defaultdict(deque)
+        self._workers: dict[int, asyncio.Task] = {}
+        self._wakeups: dict[int, asyncio.Event] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._in_flight = 0
+        self._sent = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def bucket(self, route: str) -> TokenBucket:
+        if route not in self._buckets:
+            self._buckets[route] = TokenBucket(self.bucket_capacity, self.bucket_period)
+        return self._buckets[route]
+
+    def submit(
+        self,
+        channel_id: int,
+        send: Callable[[], Awaitable[T]],
+        *,
+        route: Optional[str] = None,
+    ) -> "asyncio.Future[T]":
+        """Queues a request for a channel and returns a future resolved with its result."""
+        future = asyncio.get_running_loop().create_future()
+        job = Job(time.monotonic(), send, route, future)
+        future.add_done_callback(lambda _: self._wake(channel_id))
+        self._queues[channel_id].append(job)
+        if channel_id not in self._workers:
+            self._wakeups[channel_id] = asyncio.Event()
+            self._workers[channel_id] = asyncio.create_task(
+                self._drain(channel_id), name=f"pigloo-dispatch-{channel_id}"
+            )
+        return future
+
+    def _wake(self, channel_id: int) -> None:
+        # Called when a queued request is cancelled, so that the worker drops it right away
+        wakeup = self._wakeups.get(channel_id)
+        if wakeup is not None:
+            wakeup.set()
+
+    def queue_depth(self, channel_id: Optional[int] = None) -> int:
+        if channel_id is not None:
+            return len(self._queues.get(channel_id, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> DispatcherStats:
+        done = self._sent + self._failed
+        return DispatcherStats(
+            queued=self.queue_depth(),
+            in_flight=self._in_flight,
+            sent=self._sent,
+            failed=self._failed,
+            average_wait=self._total_wait / done if done else 0.0,
+            max_wait=self._max_wait,
+        )
+
+    async def _drain(self, channel_id: int) -> None:
+        queue = self._queues[channel_id]
+        wakeup = self._wakeups[channel_id]
+        try:
+            while queue:
+                job = queue[0]
+                if job.future.cancelled():
+                    queue.popleft()
+                    continue
+
+                bucket = self.bucket(job.route) if job.route else None
+                delay = bucket.delay() if bucket is not None else 0.0
+                if delay > 0:
+                    # Woken up if the request is cancelled while it waits
+                    wakeup.clear()
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(wakeup.wait(), timeout=delay)
+                    continue
+
+                queue.popleft()
+                async with self._semaphore:
+                    if bucket is not None:
+                        bucket.consume()
+                    wait = time.monotonic() - job.enqueued_at
+                    self._total_wait += wait
+                    self._max_wait = max(self._max_wait, wait)
+                    await self._run(job)
+        finally:
+            del self._workers[channel_id]
+            del self._wakeups[channel_id]
+            if not queue:
+                del self._queues[channel_id]
+
+    async def _run(self, job: Job) -> None:
+        self._in_flight += 1
+        try:
+            result = await job.send()
+        except Exception as e:
+            self._failed += 1
+            # Raised once discord.py gave up retrying
+            if isinstance(e, discord.HTTPException) and e.status == 429:
+                logger.warning(f"Rate limited on {job.route}")
+                RATE_LIMITS.labels("discord").inc()
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self._sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+
+    async def drain(self) -> None:
+        """Waits until every queued request has been sent."""
+        while self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
@@ -1,10 +1,80 @@
-from typing import Optional
+import asyncio
+from collections import defaultdict
+from functools import partial
+from typing import Awaitable, Callable, Optional
+from uuid import UUID
 
 import discord
 from loguru import logger
 
+from pigloo.cache import LRUCache
 from pigloo.config import config
-from pigloo.feed import Feed
+from pigloo.dispatcher import Dispatcher, message_route
+from pigloo.feed import Feed, Media, Service, User
+from pigloo.metrics import EMBED_RENDER_SECONDS, MESSAGES_FAILED, MESSAGES_SENT, SEND_SECONDS
+
+MAX_EMBEDS_PER_MESSAGE = 10
+
+# Configuration section holding the profile and icon URLs of each service
+SERVICE_SECTIONS = {"AniList": "ANILIST", "MyAnimeList": "MYANIMELIST"}
+
+
+class EmbedRenderer:
+    """Creates Discord embeds from feeds.
+
+    The configuration is read once, and the parts of an embed that only depend on the media
+    (link line and thumbnail) or on the user (author block) are kept in LRU caches keyed by
+    their ids, so that only the status and progress line is built for each feed.
+    """
+
+    def __init__(self, cache_size: int = 1024) -> None:
+        self.profile_url = config.get("ANILIST", "profile_url")
+        self.icon_url = config.get("ANILIST", "icon_url")
+        self.footer = config.get("BOT", "name")
+        self.services = {
+            service: (config.get(section, "profile_url"), config.get(section, "icon_url"))
+            for service, section in SERVICE_SECTIONS.items()
+            if config.has_option(section, "profile_url") and config.has_option(section, "icon_url")
+        }
+        self._media: LRUCache[UUID, tuple[str, str]] = LRUCache(cache_size)
+        self._authors: LRUCache[tuple[UUID, UUID], dict[str, str]] = LRUCache(cache_size)
+
+    def _media_fragment(self, media: Media) -> tuple[str, str]:
+        return f"[{media.name}]({media.url}) - {media.format}\n", str(media.image)
+
+    def _author_fragment(self, user: User, service: Service) -> dict[str, str]:
+        profile_url, icon_url = self.services.get(service.name, (self.profile_url, self.icon_url))
+        return {
+            "name": f"{user.name}'s {service.name}",
+            "url": f"{profile_url}{user.name}",
+            "icon_url": icon_url,
+        }
+
+    def render(self, feed: Feed) -> Optional[discord.Embed]:
+        with EMBED_RENDER_SECONDS.time():
+            return self._render(feed)
+
+    def _render(self, feed: Feed) -> Optional[discord.Embed]:
+        try:
+            header, thumbnail = self._media.get_or_create(feed.media.id, partial(self._media_fragment, feed.media))
+            author = self._authors.get_or_create(
+                (feed.user.id, feed.service.id), partial(self._author_fragment, feed.user, feed.service)
+            )
+
+            progress = feed.media.build_progress_str(feed.progress, feed.progress_from)
+            description = f"{header}```{feed.status.label} | {progress}```"
+            embed = discord.Embed(colour=feed.status.color, description=description, timestamp=feed.datetime)
+            embed.set_thumbnail(url=thumbnail)
+            embed.set_author(**author)
+            embed.set_footer(text=self.footer, icon_url=author["icon_url"])
+
+            return embed
+        except Exception as e:
+            logger.error(f"Error when generating the embed: {str(e)}")
+            return
+
+
+_renderer: Optional[EmbedRenderer] = None
 
 
 def create_embed_from_feed(feed: Feed) -> Optional[discord.Embed]:
@@ -13,35 +83,145 @@ def create_embed_from_feed(feed: Feed) -> Optional[discord.Embed]:
     Constructs an embed message containing information from the feed, such as
     media details, user, service, and progress.
     """
+    global _renderer
+    if _renderer is None:
+        _renderer = EmbedRenderer()
+    return _renderer.render(feed)
+
+
+async def _send(channel: discord.abc.Messageable, dispatcher: Optional[Dispatcher], **kwargs) -> discord.Message:
     try:
-        description = f"[{feed.media.name}]({feed.media.url}) - {feed.media.format}\n"
-        description += f"```{feed.status.label} | {feed.media.build_progress_str(feed.progress)}```"
-        embed = discord.Embed(colour=0xEED000, description=description, timestamp=feed.datetime)
-        embed.set_thumbnail(url=feed.media.image)
-        author_name = f"{feed.user.name}'s {feed.service.name}"
-        author_url = f"{config.get('ANILIST', 'profile_url')}{feed.user.name}"
-        embed.set_author(name=author_name, url=author_url, icon_url=config.get("ANILIST", "icon_url"))
-        embed.set_footer(
-            text=config.get("BOT", "name"), icon_url=config.get("ANILIST", "icon_url")
-        )  # TODO Use correct icon url
-
-        return embed
-    except Exception as e:
-        logger.error(f"Error when generating the embed: {str(e)}")
-        return
+        with SEND_SECONDS.time():
+            if dispatcher is None:
+                message = await channel.send(**kwargs)
+            else:
+                send = partial(channel.send, **kwargs)
+                message = await dispatcher.submit(channel.id, send, route=message_route(channel.id))
+    except Exception:
+        MESSAGES_FAILED.inc()
+        raise
+    MESSAGES_SENT.inc()
+    return message
 
 
-async def send_embed(embed: discord.Embed, channel: discord.channel) -> None:
+async def send_embed(embed: discord.Embed, channel: discord.channel, dispatcher: Optional[Dispatcher] = None) -> None:
     """
     Sends an embed message to a specified Discord channel.
+
+    When a dispatcher is given, the message is queued behind the channel's rate limit.
     """
     if channel is None:
         logger.error("Channel is None, cannot send embed.")
         return
 
     try:
-        await channel.send(embed=embed)
+        await _send(channel, dispatcher, embed=embed)
         logger.info(f"Message sent in channel: {channel.id}")
     except Exception as e:
         logger.error(f"Impossible to send a message on '{channel.id}': {e}")
         return
+
+
+async def send_embeds(
+    embeds: list[discord.Embed], channel: discord.abc.Messageable, dispatcher: Optional[Dispatcher] = None
+) -> list[bool]:
+    """
+    Sends embeds to a specified Discord channel, grouping up to ten of them per message.
+
+    Each message is sent on its own: a failure only loses the embeds of that message.
+    When a dispatcher is given, the messages are queued behind the channel's rate limit.
+    Returns whether each embed was sent.
+    """
+    if channel is None:
+        logger.error("Channel is None, cannot send embeds.")
+        return [False] * len(embeds)
+
+    sent = []
+    for start in range(0, len(embeds), MAX_EMBEDS_PER_MESSAGE):
+        batch = embeds[start : start + MAX_EMBEDS_PER_MESSAGE]
+        try:
+            await _send(channel, dispatcher, embeds=batch)
+            logger.info(f"Message with {len(batch)} embeds sent in channel: {channel.id}")
+            sent.extend([True] * len(batch))
+        except Exception as e:
+            logger.error(f"Impossible to send {len(batch)} embeds on '{channel.id}': {e}")
+            sent.extend([False] * len(batch))
+    return sent
+
+
+class EmbedBatcher:
+    """Coalesces the embeds headed to the same channel into multi-embed messages.
+
+    Embeds are buffered per channel for up to `window` seconds, or until a message is full,
+    then flushed in order by a single task per channel. Embeds can be added with a key,
+    given to `on_sent` once `send` reports that they were sent.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        send: Callable[[list[discord.Embed], discord.abc.Messageable], Awaitable[Optional[list[bool]]]] = send_embeds,
+        on_sent: Optional[Callable[[list[str]], None]] = None,
+    ) -> None:
+        self.window = window
+        self.send = send
+        self.on_sent = on_sent
+        self._buffers: dict[int, list[discord.Embed]] = defaultdict(list)
+        self._keys: dict[int, list[Optional[str]]] = defaultdict(list)
+        self._channels: dict[int, discord.abc.Messageable] = {}
+        self._full: dict[int, asyncio.Event] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def add(self, embed: discord.Embed, channel: discord.abc.Messageable, key: Optional[str] = None) -> None:
+        if channel is None:
+            logger.error("Channel is None, cannot send embed.")
+            return
+
+        buffer = self._buffers[channel.id]
+        buffer.append(embed)
+        self._keys[channel.id].append(key)
+        self._channels[channel.id] = channel
+        if channel.id not in self._tasks:
+            self._full[channel.id] = asyncio.Event()
+            self._tasks[channel.id] = asyncio.create_task(self._run(channel.id), name=f"pigloo-batch-{channel.id}")
+        if len(buffer) >= MAX_EMBEDS_PER_MESSAGE:
+            self._full[channel.id].set()
+
+    async def _run(self, channel_id: int) -> None:
+        try:
+            while self._buffers.get(channel_id):
+                full = self._full[channel_id]
+                try:
+                    await asyncio.wait_for(full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+                full.clear()
+                await self._flush(channel_id)
+        finally:
+            del self._tasks[channel_id]
+            del self._full[channel_id]
+
+    async def _flush(self, channel_id: int) -> None:
+        embeds = self._buffers.pop(channel_id, [])
+        keys = self._keys.pop(channel_id, [])
+        channel = self._channels.pop(channel_id, None)
+        if not embeds:
+            return
+
+        try:
+            sent = await self.send(embeds, channel)
+        except Exception as e:
+            logger.error(f"Impossible to send {len(embeds)} embeds on '{channel_id}': {e}")
+            return
+
+        if self.on_sent is not None and sent is not None:
+            sent_keys = [key for key, was_sent in zip(keys, sent) if was_sent and key is not None]
+            if sent_keys:
+                self.on_sent(sent_keys)
+
+    async def flush(self) -> None:
+        """Sends every buffered embed right away and waits for the pending messages."""
+        tasks = list(self._tasks.values())
+        for event in self._full.values():
+            event.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
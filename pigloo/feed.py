@@ -1,20 +1,68 @@
+import hashlib
+import uuid
+from typing import Annotated, Any, Literal, Optional, Union
+
 import discord
-from pydantic import UUID4, AwareDatetime, BaseModel, HttpUrl, model_validator
+from pydantic import (
+    UUID4,
+    AwareDatetime,
+    BaseModel,
+    ConfigDict,
+    Discriminator,
+    HttpUrl,
+    Tag,
+    TypeAdapter,
+    model_validator,
+)
 from typing_extensions import Self
 
+from pigloo.metrics import VALIDATION_SECONDS
+
+
+def stable_uuid(service: str, kind: str, native_id: int | str) -> uuid.UUID:
+    """Derives a deterministic UUID4 from a provider's native identifier.
+
+    Providers identify users, media and activities with their own integer or string ids,
+    so the same entity always maps to the same UUID across polls and restarts.
+    """
+    digest = hashlib.blake2b(f"{service}:{kind}:{native_id}".encode(), digest_size=16).digest()
+    return uuid.UUID(bytes=digest, version=4)
+
 
 class Service(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: UUID4
     name: str
 
 
 class User(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: UUID4
     name: str
     service: Service
 
 
+class TrackedUser(BaseModel):
+    """A provider account followed by the bot, identified by the provider's native id."""
+
+    model_config = ConfigDict(frozen=True)
+
+    service: str
+    id: str
+    name: str
+
+    @property
+    def uuid(self) -> uuid.UUID:
+        """UUID given to this account's `User` in the feeds."""
+        return stable_uuid(self.service, "user", self.id)
+
+
 class Media(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    kind: Literal["media"] = "media"
     id: UUID4
     name: str
     service: Service
@@ -23,32 +71,46 @@ class Media(BaseModel):
     image: HttpUrl
     format: str  # e.g. "TV", "Movie", etc.
 
-    def build_progress_str(self, progress: int) -> str:  # FIXME: progress can be None
-        return f"{progress} of {self.max_progress}"
+    @staticmethod
+    def build_progress_range(progress: int, start: Optional[int] = None) -> str:
+        """Formats a single progress, or a range of them when several updates were merged."""
+        if start is None or start == progress:
+            return f"{progress}"
+        return f"{start}–{progress}"
+
+    def build_progress_str(self, progress: int, start: Optional[int] = None) -> str:  # FIXME: progress can be None
+        return f"{self.build_progress_range(progress, start)} of {self.max_progress}"
 
 
 class Anime(Media):
+    kind: Literal["anime"] = "anime"
+
     def __init__(self, **data):
         super().__init__(**data)
 
-    def build_progress_str(self, progress: int) -> str:
-        return f"{progress} of {self.max_progress} episodes"
+    def build_progress_str(self, progress: int, start: Optional[int] = None) -> str:
+        return f"{self.build_progress_range(progress, start)} of {self.max_progress} episodes"
 
 
 class Manga(Media):
+    kind: Literal["manga"] = "manga"
+
     def __init__(self, **data):
         super().__init__(**data)
 
-    def build_progress_str(self, progress: int) -> str:
-        return f"{progress} of {self.max_progress} chapters"
+    def build_progress_str(self, progress: int, start: Optional[int] = None) -> str:
+        return f"{self.build_progress_range(progress, start)} of {self.max_progress} chapters"
 
 
 class FeedStatus(BaseModel):
     """Represents the status of a user's activity related to media.
 
     Provides a base structure for specific status types with a color and label.
+    Statuses are immutable so that feeds can share the same instances.
     """
 
+    model_config = ConfigDict(frozen=True)
+
     color: int = discord.Colour.default().value
     label: str
 
@@ -98,12 +160,65 @@ class RereadingStatus(FeedStatus):
     label: str = "Rereading"
 
 
+def _build_status_keywords() -> dict[str, tuple[FeedStatus, FeedStatus]]:
+    keywords = {}
+    for words, statuses in (
+        (("READ", "READING", "WATCHED", "WATCHING"), (WatchingStatus(), ReadingStatus())),
+        (("PLANS", "PLAN", "PLAN_TO_WATCH", "PLAN_TO_READ"), (PlanToWatchStatus(), PlanToReadStatus())),
+        (("COMPLETED",), (CompletedStatus(),) * 2),
+        (("DROPPED",), (DroppedStatus(),) * 2),
+        (("PAUSED", "ON-HOLD", "ON_HOLD"), (PausedStatus(),) * 2),
+        (("REWATCHED", "REWATCHING", "RE-WATCHING", "RE-WATCHED"), (RewatchingStatus(),) * 2),
+        (("REREAD", "REREADING", "RE-READING", "RE-READ"), (RereadingStatus(),) * 2),
+    ):
+        for word in words:
+            keywords[word] = statuses
+    return keywords
+
+
+# Shared (anime, manga) statuses for the first word of a provider's label
+STATUS_KEYWORDS = _build_status_keywords()
+
+MAX_KNOWN_LABELS = 1024
+_statuses_by_label = {status.label: statuses for statuses in STATUS_KEYWORDS.values() for status in statuses}
+
+
+def status_for(label: str, media: Media) -> FeedStatus:
+    """Returns the shared status matching a provider's label for the given media.
+
+    Labels are only parsed the first time they are seen, then looked up.
+    """
+    statuses = _statuses_by_label.get(label)
+    if statuses is None:
+        words = label.split(maxsplit=1)
+        statuses = STATUS_KEYWORDS.get(words[0].upper()) if words else None
+        if statuses is None:
+            raise ValueError(f"Cannot convert '{label}' to a FeedStatus")
+        if len(_statuses_by_label) < MAX_KNOWN_LABELS:
+            _statuses_by_label[label] = statuses
+
+    return statuses[0] if isinstance(media, Anime) else statuses[1]
+
+
+def _media_kind(media: Any) -> str:
+    if isinstance(media, dict):
+        return media.get("kind", "media")
+    return getattr(media, "kind", "media")
+
+
+AnyMedia = Annotated[
+    Union[Annotated[Anime, Tag("anime")], Annotated[Manga, Tag("manga")], Annotated[Media, Tag("media")]],
+    Discriminator(_media_kind),
+]
+
+
 class Feed(BaseModel):
     id: UUID4
     user: User
     service: Service
-    media: Media
+    media: AnyMedia
     progress: int | None
+    progress_from: int | None = None  # First progress of the range when several updates were merged
     datetime: AwareDatetime
     status: FeedStatus
 
@@ -114,23 +229,18 @@ class Feed(BaseModel):
         if label is None:
             raise ValueError("Label cannot be None")
 
-        first_word = label.split()[0].upper()
-
-        if first_word in ("READ", "READING", "WATCHED", "WATCHING"):
-            self.status = WatchingStatus() if isinstance(self.media, Anime) else ReadingStatus()
-        elif first_word in ("PLANS", "PLAN", "PLAN_TO_WATCH", "PLAN_TO_READ"):
-            self.status = PlanToWatchStatus() if isinstance(self.media, Anime) else PlanToReadStatus()
-        elif first_word == "COMPLETED":
-            self.status = CompletedStatus()
-        elif first_word == "DROPPED":
-            self.status = DroppedStatus()
-        elif first_word in ("PAUSED", "ON-HOLD", "ON_HOLD"):
-            self.status = PausedStatus()
-        elif first_word in ("REWATCHED", "REWATCHING", "RE-WATCHING", "RE-WATCHED"):  # TODO This doesn't exist for MAL
-            self.status = RewatchingStatus()
-        elif first_word in ("REREAD", "REREADING", "RE-READING", "RE-READ"):  # TODO This doesn't exist for MAL
-            self.status = RereadingStatus()
-        else:
-            raise ValueError(f"Cannot convert '{label}' to a FeedStatus")
-
+        self.status = status_for(label, self.media)
         return self
+
+
+FEEDS_ADAPTER = TypeAdapter(list[Feed])
+FEEDS_VALIDATION = VALIDATION_SECONDS.labels("feeds")
+
+
+def parse_feeds(data: bytes | str) -> list[Feed]:
+    """Validates a JSON array of feeds in a single pass.
+
+    The media of each feed is rebuilt as an `Anime`, `Manga` or `Media` from its `kind`.
+    """
+    with FEEDS_VALIDATION.time():
+        return FEEDS_ADAPTER.validate_json(data)
@@ -0,0 +1,49 @@
+import resource
+import sys
+from typing import Any
+
+import discord
+
+from pigloo.config import config
+
+PROFILES = ("full", "lean")
+
+
+def gateway_options(profile: str = "full") -> dict[str, Any]:
+    """Intents and cache options given to the bot's client for a gateway profile.
+
+    The full profile receives members and keeps discord.py's default caches. The lean profile
+    only asks for what Pigloo uses: guilds and their channels, to publish feeds and answer
+    application commands, and guild messages when prefix commands (`!sync`, `!ping`) are
+    enabled. Members are neither requested, chunked nor cached, and the message cache holds
+    at most [GATEWAY] `max_messages` messages.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown gateway profile {profile!r}, expected one of {', '.join(PROFILES)}")
+
+    if profile == "full":
+        intents = discord.Intents.default()
+        intents.members = True
+        intents.message_content = True
+        return {"intents": intents}
+
+    prefix_commands = config.getboolean("GATEWAY", "prefix_commands", fallback=True)
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = prefix_commands
+    intents.message_content = prefix_commands
+    max_messages = config.getint("GATEWAY", "max_messages", fallback=0)
+    return {
+        "intents": intents,
+        "chunk_guilds_at_startup": False,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        # None disables the message cache of discord.py
+        "max_messages": max_messages if max_messages > 0 else None,
+    }
+
+
+def peak_rss() -> int:
+    """Peak resident memory of this process, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kibibytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
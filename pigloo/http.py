@@ -0,0 +1,20 @@
+import aiohttp
+
+from pigloo.config import config
+
+USER_AGENT = "Pigloo (https://github.com/LucasVilleneuve/Pigloo)"
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Creates the HTTP session shared by every provider for the bot's lifetime.
+
+    A single connection pool keeps the TLS connections to the providers alive between
+    poll cycles instead of reconnecting for every request.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=config.getint("HTTP", "pool_size", fallback=20),
+        ttl_dns_cache=config.getint("HTTP", "dns_cache_ttl", fallback=300),
+        keepalive_timeout=config.getfloat("HTTP", "keepalive_timeout", fallback=60.0),
+    )
+    timeout = aiohttp.ClientTimeout(total=config.getfloat("HTTP", "timeout", fallback=30.0))
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers={"User-Agent": USER_AGENT})
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any, Callable, Iterable, Mapping, NamedTuple, Optional
+
+import aiohttp
+from loguru import logger
+
+from pigloo.cache import LRUCache
+from pigloo.config import config
+from pigloo.storage import Database
+
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    expires_at: float
+
+
+class FetchResult(NamedTuple):
+    """Outcome of a cached request.
+
+    `status` is 304 whenever the body comes from the cache, be it still fresh or revalidated
+    by the server, so that callers can tell that it did not change since it was stored.
+    """
+
+    status: int
+    body: Optional[bytes]
+    headers: Mapping[str, str]
+
+
+class HttpCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    revalidated: int
+    bytes_saved: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _create_table(connection: sqlite3.Connection) -> int:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS http_cache (
+            key TEXT PRIMARY KEY,
+            endpoint TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        """
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS http_cache_accessed_at ON http_cache (accessed_at)")
+    return connection.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+
+
+def _select_hot(connection: sqlite3.Connection, limit: int) -> list[tuple]:
+    return connection.execute(
+        "SELECT key, body, etag, last_modified, expires_at FROM http_cache ORDER BY accessed_at DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+
+
+def _select(connection: sqlite3.Connection, keys: list[str]) -> list[tuple]:
+    placeholders = ", ".join("?" * len(keys))
+    return connection.execute(
+        f"SELECT key, body, etag, last_modified, expires_at FROM http_cache WHERE key IN ({placeholders})", keys
+    ).fetchall()
+
+
+class HttpCache:
+    """Persistent cache of provider HTTP responses, stored in the bot's SQLite database.
+
+    Entries are addressed by a digest of the request (or any key given by the caller) and
+    expire after the TTL of their endpoint. Expired entries with an ETag or a Last-Modified
+    date are revalidated with `If-None-Match` or `If-Modified-Since` instead of being
+    downloaded again. The database is bounded to
+    `max_size` bytes by evicting the least recently used entries, and the `warm` most
+    recently used ones are loaded in memory at startup.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        *,
+        max_size: int = 64 * 1024 * 1024,
+        ttls: Optional[Mapping[str, float]] = None,
+        default_ttl: float = 3600,
+        memory_size: int = 1024,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.database = database
+        self.max_size = max_size
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes_saved = 0
+        self._memory: LRUCache[str, CacheEntry] = LRUCache(memory_size)
+        self._accesses: dict[str, float] = {}
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """Derives the key of a request, or of any resource, from its identifying parts."""
+        digest = hashlib.blake2b(json.dumps(parts, sort_keys=True, default=str).encode(), digest_size=20)
+        return digest.hexdigest()
+
+    async def load(self, warm: int = 0) -> int:
+        """Creates the table if needed and preloads the `warm` most recently used entries.
+
+        Returns the number of preloaded entries.
+        """
+        self.size = await self.database.run(_create_table)
+        if warm <= 0:
+            return 0
+
+        rows = await self.database.run(_select_hot, warm)
+        for key, *columns in reversed(rows):
+            self._memory.put(key, CacheEntry(*columns))
+        logger.info(f"Preloaded {len(rows)} HTTP cache entries ({self.size} bytes stored)")
+        return len(rows)
+
+    async def get_many(self, keys: Iterable[str]) -> dict[str, CacheEntry]:
+        """Returns the stored entries of the given keys, fresh or not."""
+        entries = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            entry = self._memory.get(key)
+            if entry is None:
+                missing.append(key)
+            else:
+                entries[key] = entry
+        if missing:
+            for key, *columns in await self.database.run(_select, missing):
+                entries[key] = CacheEntry(*columns)
+                self._memory.put(key, entries[key])
+        return entries
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return entry.expires_at > self.clock()
+
+    def record_hit(self, key: str, entry: CacheEntry) -> None:
+        self.hits += 1
+        self.bytes_saved += len(entry.body)
+        self._accesses[key] = self.clock()
+
+    def record_miss(self) -> None:
+        self.misses += 1
+
+    def _store(self, connection: sqlite3.Connection, rows: list[tuple], accesses: list[tuple]) -> list[str]:
+        """Upserts entries and access times, then evicts the least recently used entries over `max_size`.
+
+        Runs on the database thread, which is the only one updating `size`.
+        """
+        for key, *_ in rows:
+            previous = connection.execute("SELECT size FROM http_cache WHERE key = ?", (key,)).fetchone()
+            self.size -= previous[0] if previous else 0
+        connection.executemany(
+            """
+            INSERT INTO http_cache (key, endpoint, etag, last_modified, body, size, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                endpoint = excluded.endpoint, etag = excluded.etag, last_modified = excluded.last_modified,
+                body = excluded.body, size = excluded.size, expires_at = excluded.expires_at,
+                accessed_at = excluded.accessed_at
+            """,
+            rows,
+        )
+        self.size += sum(row[5] for row in rows)
+        connection.executemany("UPDATE http_cache SET accessed_at = ? WHERE key = ?", accesses)
+
+        evicted = []
+        if self.size > self.max_size:
+            for key, entry_size in connection.execute("SELECT key, size FROM http_cache ORDER BY accessed_at"):
+                evicted.append(key)
+                self.size -= entry_size
+                if self.size <= self.max_size:
+                    break
+            connection.executemany("DELETE FROM http_cache WHERE key = ?", [(key,) for key in evicted])
+        return evicted
+
+    async def put_many(self, endpoint: str, entries: Mapping[str, tuple[bytes, Optional[str], Optional[str]]]) -> None:
+        """Stores `(body, etag, last_modified)` responses of an endpoint, along with the pending access times."""
+        now = self.clock()
+        expires_at = now + self.ttls.get(endpoint, self.default_ttl)
+        rows = [
+            (key, endpoint, etag, last_modified, body, len(body), expires_at, now)
+            for key, (body, etag, last_modified) in entries.items()
+        ]
+        accesses = [(accessed_at, key) for key, accessed_at in self._accesses.items() if key not in entries]
+        self._accesses.clear()
+        evicted = await self.database.run(self._store, rows, accesses)
+        for key, (body, etag, last_modified) in entries.items():
+            self._memory.put(key, CacheEntry(body, etag, last_modified, expires_at))
+        for key in evicted:
+            self._memory.pop(key)
+
+    async def put(
+        self, endpoint: str, key: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> None:
+        await self.put_many(endpoint, {key: (body, etag, last_modified)})
+
+    async def flush(self) -> None:
+        """Saves the access times of the entries read since the last write."""
+        if self._accesses:
+            await self.put_many("", {})
+
+    async def fetch(
+        self,
+        session: aiohttp.ClientSession,
+        method: str,
+        url: str,
+        *,
+        endpoint: str,
+        key: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        **kwargs: Any,
+    ) -> FetchResult:
+        """Sends a request unless a fresh response is cached, revalidating stale ones with their validators.
+
+        Network errors are left to the caller.
+        """
+        key = key or self.key(method, url, kwargs.get("params"), kwargs.get("json"))
+        entry = (await self.get_many([key])).get(key)
+        if entry is not None and self.is_fresh(entry):
+            self.record_hit(key, entry)
+            return FetchResult(304, entry.body, {})
+
+        headers = dict(headers or {})
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        async with session.request(method, url, headers=headers, **kwargs) as response:
+            if response.status == 304 and entry is not None:
+                self.revalidated += 1
+                self.record_hit(key, entry)
+                await self.put(endpoint, key, entry.body, entry.etag, entry.last_modified)
+                return FetchResult(304, entry.body, response.headers)
+
+            self.record_miss()
+            if response.status != 200:
+                return FetchResult(response.status, None, response.headers)
+
+            body = await response.read()
+            await self.put(endpoint, key, body, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return FetchResult(response.status, body, response.headers)
+
+    def stats(self) -> HttpCacheStats:
+        return HttpCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            revalidated=self.revalidated,
+            bytes_saved=self.bytes_saved,
+            size=self.size,
+        )
+
+
+def create_http_cache(database: Database) -> HttpCache:
+    """Creates the HTTP cache shared by every provider, configured by the [HTTP_CACHE] section.
+
+    Options named `ttl.<endpoint>` set how many seconds the responses of an endpoint stay fresh.
+    """
+    section = "HTTP_CACHE"
+    ttls = {}
+    if config.has_section(section):
+        ttls = {
+            option.removeprefix("ttl."): config.getfloat(section, option)
+            for option in config.options(section)
+            if option.startswith("ttl.")
+        }
+    warm = config.getint(section, "warm_entries", fallback=1024)
+    return HttpCache(
+        database,
+        max_size=int(config.getfloat(section, "max_size", fallback=64) * 1024 * 1024),
+        ttls=ttls,
+        default_ttl=config.getfloat(section, "default_ttl", fallback=3600),
+        memory_size=max(warm, 1),
+    )
@@ -0,0 +1,53 @@
+from typing import NamedTuple, TypeVar, Union
+
+from pigloo.cache import LRUCache
+from pigloo.feed import Feed, Media, Service, User
+
+Entity = TypeVar("Entity", Service, User, Media)
+
+
+class IdentityStats(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+
+
+class IdentityMap:
+    """Resolves identical services, users and media to a single shared instance.
+
+    Feeds built from provider responses each carry their own copies of the entities they
+    refer to. Interning them keeps one frozen instance per id, so that thousands of feeds
+    about the same show or user share its data. The map is bounded and forgets the least
+    recently seen entities first.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self._entities: LRUCache[tuple[type, object], Union[Service, User, Media]] = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def intern(self, entity: Entity) -> Entity:
+        """Returns the shared instance equal to `entity`, registering it if there is none."""
+        key = (type(entity), entity.id)
+        shared = self._entities.get(key)
+        if shared is not None and shared == entity:
+            self.hits += 1
+            return shared
+
+        # First sighting, or the entity changed (e.g. a renamed user): the new version wins
+        self.misses += 1
+        self._entities.put(key, entity)
+        return entity
+
+    def intern_feed(self, feed: Feed) -> Feed:
+        """Replaces the entities of a feed with their shared instances."""
+        feed.service = self.intern(feed.service)
+        feed.user = self.intern(feed.user)
+        feed.media = self.intern(feed.media)
+        return feed
+
+    def stats(self) -> IdentityStats:
+        return IdentityStats(hits=self.hits, misses=self.misses, size=len(self._entities))
@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import itertools
+import multiprocessing
+import queue
+from multiprocessing.context import SpawnProcess
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+from loguru import logger
+
+from pigloo.config import config
+from pigloo.cursors import CursorStore
+from pigloo.dispatcher import TokenBucket
+from pigloo.feed import FEEDS_ADAPTER, Feed, TrackedUser, parse_feeds
+from pigloo.httpcache import HttpCache, create_http_cache
+from pigloo.poller import FeedPoller
+from pigloo.providers.base import Provider
+from pigloo.scheduler import PollScheduler
+from pigloo.sharding import ShardPartition
+from pigloo.storage import Database
+from pigloo.subscriptions import SubscriptionStore
+
+
+def create_providers(
+    session: aiohttp.ClientSession, cache: Optional[HttpCache] = None, budget: Optional[TokenBucket] = None
+) -> dict[str, Provider]:
+    """Creates the providers of every configured service.
+
+    With a `budget`, the requests they send outside of the polls of a scheduler, e.g. media
+    and account lookups, are taken from it as well.
+    """
+    from pigloo.providers.anilist import AniListProvider
+    from pigloo.providers.myanimelist import MyAnimeListProvider
+
+    providers = [AniListProvider(session, cache=cache, budget=budget)]
+    if config.get("MYANIMELIST", "client_id", fallback=""):
+        providers.append(MyAnimeListProvider(session, cache=cache, budget=budget))
+    return {provider.name: provider for provider in providers}
+
+
+def create_scheduler(shares: int = 1) -> Optional[PollScheduler]:
+    """Creates the adaptive poll scheduler configured in [POLLER], if it is enabled.
+
+    The request budget is split evenly between `shares` schedulers polling at the same time,
+    after being split between the processes running the shards of the bot.
+    """
+    if not config.getboolean("POLLER", "adaptive", fallback=False):
+        return None
+
+    partition = ShardPartition.from_config()
+    requests_per_minute = config.getint("POLLER", "requests_per_minute", fallback=60)
+    if partition is not None:
+        requests_per_minute = int(requests_per_minute * partition.share)
+    return PollScheduler(
+        min_interval=config.getfloat("POLLER", "min_interval", fallback=30.0),
+        max_interval=config.getfloat("POLLER", "max_interval", fallback=1800.0),
+        backoff=config.getfloat("POLLER", "backoff", fallback=2.0),
+        requests_per_minute=max(requests_per_minute // shares, 1),
+    )
+
+
+def worker_for(user: TrackedUser, workers: int) -> int:
+    """Index of the worker polling a user, stable across processes and restarts."""
+    digest = hashlib.blake2b(f"{user.service}:{user.id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % workers
+
+
+async def _run_worker(
+    index: int, workers: int, feeds: multiprocessing.Queue, acks: multiprocessing.Queue, stop: multiprocessing.Event
+) -> None:
+    from pigloo.http import create_session
+
+    database = Database(config.get("STORAGE", "database", fallback="pigloo.db"))
+    partition = ShardPartition.from_config()
+    cursors = CursorStore(database, partition)
+    # Polls the users of the guilds of this process only, when sharded
+    subscriptions = SubscriptionStore(database, partition)
+    cache = create_http_cache(database)
+    await cursors.load()
+    await subscriptions.load()
+    await cache.load()
+    session = create_session()
+
+    batches = itertools.count()
+    ack_timeout = config.getfloat("WORKERS", "ack_timeout", fallback=60.0)
+
+    async def sink(polled: list[Feed]) -> None:
+        # The poller saves the cursors once this returns: wait for the feeds to be stored in the outbox
+        batch = next(batches)
+        await asyncio.to_thread(feeds.put, (index, batch, FEEDS_ADAPTER.dump_json(polled)))
+        while True:
+            try:
+                acked, stored = await asyncio.to_thread(acks.get, True, ack_timeout)
+            except queue.Empty:
+                raise TimeoutError(f"Feed batch {batch} was not acknowledged in {ack_timeout}s") from None
+            # Acknowledgements of batches that timed out before are late
+            if acked == batch:
+                break
+        if not stored:
+            raise RuntimeError(f"Feed batch {batch} could not be stored")
+
+    interval = config.getfloat("POLLER", "interval", fallback=60.0)
+    scheduler = create_scheduler(shares=workers)
+    poller = FeedPoller(
+        create_providers(session, cache, scheduler.budget if scheduler is not None else None),
+        cursors,
+        users=lambda: [user for user in subscriptions.users() if worker_for(user, workers) == index],
+        sink=sink,
+        interval=interval,
+        scheduler=scheduler,
+    )
+    poller.start()
+    logger.info(f"Ingestion worker {index} started")
+    try:
+        while not await asyncio.to_thread(stop.wait, interval):
+            # Subscriptions are changed by the gateway process
+            await subscriptions.load()
+    finally:
+        await poller.stop()
+        await session.close()
+        await cache.flush()
+        await database.close()
+        logger.info(f"Ingestion worker {index} stopped")
+
+
+def run_worker(
+    index: int,
+    workers: int,
+    feeds: multiprocessing.Queue,
+    acks: multiprocessing.Queue,
+    stop: multiprocessing.Event,
+    overrides: Optional[dict[str, dict[str, str]]] = None,
+) -> None:
+    """Entry point of an ingestion worker process."""
+    if overrides:
+        config.read_dict(overrides)
+    try:
+        asyncio.run(_run_worker(index, workers, feeds, acks, stop))
+    except KeyboardInterrupt:
+        pass
+
+
+class WorkerPool:
+    """Runs the polling of tracked users in separate processes.
+
+    Fetching provider responses and validating feeds then happens away from the event loop
+    holding the Discord gateway connection. Users are split across the `workers` processes
+    by a hash of their id, and each worker streams the feeds it polls back to this process
+    as JSON through a queue. Workers share the database with this process: it must be a file.
+
+    A worker only saves its cursors once this process acknowledged that the sink processed
+    its feeds, through a queue of its own: feeds lost before being stored are polled again.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        sink: Callable[[list[Feed]], Awaitable[None]],
+        *,
+        max_queued: int = 1000,
+        overrides: Optional[dict[str, dict[str, str]]] = None,
+    ) -> None:
+        self.workers = workers
+        self.sink = sink
+        self.overrides = overrides
+        self._context = multiprocessing.get_context("spawn")
+        self._feeds = self._context.Queue(max_queued)
+        self._stop = self._context.Event()
+        self._acks = [self._context.Queue() for _ in range(workers)]
+        self._processes: list[SpawnProcess] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+
+        self._stop.clear()
+        self._processes = [
+            self._context.Process(
+                target=run_worker,
+                args=(index, self.workers, self._feeds, self._acks[index], self._stop, self.overrides),
+                name=f"pigloo-worker-{index}",
+                daemon=True,
+            )
+            for index in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+        self._task = asyncio.create_task(self._receive(), name="pigloo-worker-pool")
+
+    async def _receive(self) -> None:
+        while True:
+            try:
+                # Times out regularly so that the thread never outlives a cancelled task for long
+                payload = await asyncio.to_thread(self._feeds.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if payload is None:
+                return
+            await self._publish(payload)
+
+    async def _publish(self, message: tuple[int, int, bytes]) -> None:
+        index, batch, payload = message
+        stored = False
+        try:
+            await self.sink(parse_feeds(payload))
+            stored = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Cannot publish feeds from the ingestion workers: {e}")
+        finally:
+            self._acks[index].put((batch, stored))
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Asks the workers to finish their poll cycle and stop, killing those that do not in time."""
+        self._stop.set()
+        for process in self._processes:
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Ingestion worker {process.name} did not stop, terminating it")
+                process.terminate()
+        self._processes = []
+
+        if self.running:
+            # Lets the receiving task publish what the workers queued before they stopped
+            await asyncio.to_thread(self._feeds.put, None)
+            await self._task
+        self._task = None
+
+        # Feeds of workers terminated while waiting for their acknowledgement
+        while True:
+            try:
+                payload = self._feeds.get_nowait()
+            except queue.Empty:
+                break
+            if payload is not None:
+                await self._publish(payload)
@@ -0,0 +1,246 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Iterator, Optional, Sequence
+
+from loguru import logger
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+def _braces(labels: str) -> str:
+    return f"{{{labels}}}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    """Base of the metrics of a registry: a named family of samples, one per label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._children: dict[tuple[str, ...], "Metric"] = {}
+
+    def labels(self, *values: str) -> "Metric":
+        """Child metric of the given label values, created on first use and reused afterwards."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self) -> "Metric":
+        return type(self)(self.name, self.description)
+
+    @abstractmethod
+    def _samples(self, labels: str) -> Iterator[str]:
+        """Sample lines of this metric, given its formatted labels."""
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        if not self.label_names:
+            yield from self._samples("")
+        for values, child in self._children.items():
+            yield from child._samples(_format_labels(self.label_names, values))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, description, labels)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def _samples(self, labels: str) -> Iterator[str]:
+        yield f"{self.name}{_braces(labels)} {_format_value(self.value)}"
+
+
+class Gauge(Metric):
+    """Value that goes up and down, either set explicitly or read from a function when scraped."""
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, description: str, labels: Sequence[str] = (), function: Optional[Callable[[], float]] = None
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.value = 0.0
+        self.function = function
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.function = function
+
+    def _samples(self, labels: str) -> Iterator[str]:
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                logger.warning(f"Cannot read gauge {self.name}: {e}")
+                return
+        yield f"{self.name}{_braces(labels)} {_format_value(value)}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "started_at")
+
+    def __init__(self, histogram: "Histogram") -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> None:
+        self.started_at = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started_at)
+
+
+class Histogram(Metric):
+    """Distribution of observed values, counted in buckets allocated once and for all.
+
+    Observing a value is a binary search and two additions, without any lock: every
+    observation happens on the event loop thread.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # The last count is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.description, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self) -> _Timer:
+        """Context manager observing how long its block takes."""
+        return _Timer(self)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def _samples(self, labels: str) -> Iterator[str]:
+        cumulative = 0
+        prefix = f"{labels}," if labels else ""
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}'
+        yield f"{self.name}_sum{_braces(labels)} {_format_value(self.sum)}"
+        yield f"{self.name}_count{_braces(labels)} {cumulative}"
+
+
+class Registry:
+    """Metrics of the bot, rendered in the Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labels))
+
+    def gauge(
+        self, name: str, description: str, labels: Sequence[str] = (), function: Optional[Callable[[], float]] = None
+    ) -> Gauge:
+        return self._register(Gauge(name, description, labels, function))
+
+    def histogram(
+        self, name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+EMBED_RENDER_SECONDS = REGISTRY.histogram("pigloo_embed_render_seconds", "Time taken to create the embed of a feed")
+SEND_SECONDS = REGISTRY.histogram(
+    "pigloo_send_seconds", "Time taken to send a message to Discord, waiting in the dispatcher included"
+)
+POLL_CYCLE_SECONDS = REGISTRY.histogram("pigloo_poll_cycle_seconds", "Time taken by a poll cycle")
+VALIDATION_SECONDS = REGISTRY.histogram(
+    "pigloo_validation_seconds", "Time taken to validate provider responses and feeds", labels=("source",)
+)
+MESSAGES_SENT = REGISTRY.counter("pigloo_messages_sent_total", "Messages sent to Discord")
+MESSAGES_FAILED = REGISTRY.counter("pigloo_messages_failed_total", "Messages that could not be sent to Discord")
+FEEDS_DUPLICATED = REGISTRY.counter("pigloo_feeds_duplicated_total", "Feeds dropped as already seen")
+RATE_LIMITS = REGISTRY.counter("pigloo_rate_limits_total", "Rate-limited responses received", labels=("api",))
+# Read from the bot when scraped
+QUEUED_REQUESTS = REGISTRY.gauge("pigloo_queued_requests", "Requests waiting in the dispatcher")
+PENDING_FEEDS = REGISTRY.gauge("pigloo_outbox_pending_feeds", "Feeds of the outbox not sent yet")
+TRACKED_USERS = REGISTRY.gauge("pigloo_tracked_users", "Users followed by at least one channel")
+GATEWAY_LATENCY = REGISTRY.gauge("pigloo_gateway_latency_seconds", "Latency of the Discord gateway heartbeat")
+
+
+class MetricsServer:
+    """Serves the metrics of a registry at `/metrics` over HTTP."""
+
+    def __init__(self, registry: Registry = REGISTRY, *, host: str = "127.0.0.1", port: int = 9108) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> None:
+        # Only imported when metrics are enabled, as importing aiohttp's server slows the startup down
+        from aiohttp import web
+
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
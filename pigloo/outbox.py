@@ -0,0 +1,165 @@
+import sqlite3
+import time
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from loguru import logger
+
+from pigloo.debounce import Debouncer
+from pigloo.feed import Feed
+from pigloo.sharding import ShardPartition
+from pigloo.storage import Database
+
+
+# Seconds between two deletions of the expired entries while the bot runs
+PRUNE_INTERVAL = 3600.0
+
+
+class OutboxEntry(NamedTuple):
+    key: str
+    channel_id: int
+    feed: Feed
+
+
+def outbox_key(feed: Feed, channel_id: int) -> str:
+    """Idempotency key of the delivery of a feed to a channel.
+
+    Feed ids are derived from the provider's activity ids, so polling an activity again
+    yields the same key.
+    """
+    return f"{feed.id}:{channel_id}"
+
+
+def _create_table(
+    connection: sqlite3.Connection, condition: str, parameters: list[int], expired_before: float
+) -> list[tuple]:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            key TEXT PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            guild_id INTEGER,
+            feed TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            sent_at REAL
+        ) WITHOUT ROWID
+        """
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (created_at) WHERE sent_at IS NULL")
+    connection.execute("CREATE INDEX IF NOT EXISTS outbox_sent ON outbox (created_at) WHERE sent_at IS NOT NULL")
+    connection.execute(f"DELETE FROM outbox WHERE created_at < ? AND {condition}", [expired_before, *parameters])
+    return connection.execute(
+        f"SELECT key, channel_id, feed FROM outbox WHERE sent_at IS NULL AND {condition} ORDER BY created_at",
+        parameters,
+    ).fetchall()
+
+
+def _insert(connection: sqlite3.Connection, rows: list[tuple]) -> list[str]:
+    inserted = []
+    for row in rows:
+        if connection.execute("INSERT OR IGNORE INTO outbox VALUES (?, ?, ?, ?, ?, NULL)", row).rowcount:
+            inserted.append(row[0])
+    return inserted
+
+
+def _mark_sent(
+    connection: sqlite3.Connection,
+    sent_at: float,
+    keys: list[str],
+    expired_before: Optional[float],
+    condition: str,
+    parameters: list[int],
+) -> int:
+    connection.executemany("UPDATE outbox SET sent_at = ? WHERE key = ?", [(sent_at, key) for key in keys])
+    if expired_before is None:
+        return 0
+    # Undelivered entries are left to the next startup, as they may still be in memory
+    return connection.execute(
+        f"DELETE FROM outbox WHERE sent_at IS NOT NULL AND created_at < ? AND {condition}",
+        [expired_before, *parameters],
+    ).rowcount
+
+
+class Outbox:
+    """Durable queue of the feeds to post in each channel, stored in the bot's SQLite database.
+
+    Feeds are written once, in a single transaction per poll cycle, before the poll cursors
+    are saved: after a crash, undelivered feeds are loaded back instead of being polled again.
+    Deliveries are marked as sent in groups, at most `commit_interval` seconds after they
+    happen, and delivered entries are kept for `retention` seconds so that a feed polled
+    again is not posted twice, then deleted along with a commit at most every hour. A crash
+    between a post and its commit posts it again: delivery is at least once.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        partition: Optional[ShardPartition] = None,
+        *,
+        commit_interval: float = 1.0,
+        retention: float = 7 * 24 * 3600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.database = database
+        self.partition = partition
+        self.commit_interval = commit_interval
+        self.retention = retention
+        self.clock = clock
+        self.pending = 0
+        self._filter = partition.sql_filter("guild_id") if partition is not None else ("1", [])
+        self._sent: list[str] = []
+        self._commit = Debouncer(self.flush, commit_interval, name="pigloo-outbox")
+        self._pruned_at = clock()
+
+    async def load(self) -> list[OutboxEntry]:
+        """Creates the table if needed, drops expired entries and returns the undelivered ones, oldest first."""
+        rows = await self.database.run(_create_table, *self._filter, self.clock() - self.retention)
+        entries = [OutboxEntry(key, channel_id, Feed.model_validate_json(feed)) for key, channel_id, feed in rows]
+        self.pending = len(entries)
+        if entries:
+            logger.info(f"{len(entries)} feeds left undelivered in the outbox")
+        return entries
+
+    async def add(self, deliveries: Iterable[tuple[Feed, int, Optional[int]]]) -> list[OutboxEntry]:
+        """Stores `(feed, channel id, guild id)` deliveries and returns those that were not already stored."""
+        now = self.clock()
+        entries = {}
+        rows = []
+        for feed, channel_id, guild_id in deliveries:
+            key = outbox_key(feed, channel_id)
+            entries[key] = OutboxEntry(key, channel_id, feed)
+            rows.append((key, channel_id, guild_id, feed.model_dump_json(), now))
+        if not rows:
+            return []
+
+        inserted = await self.database.run(_insert, rows)
+        self.pending += len(inserted)
+        return [entries[key] for key in inserted]
+
+    def mark_sent(self, keys: Iterable[str]) -> None:
+        """Records delivered entries, committed along with the others delivered within `commit_interval`."""
+        self._sent.extend(keys)
+        self._commit.schedule()
+
+    async def flush(self) -> None:
+        """Commits the deliveries recorded since the last commit."""
+        if not self._sent:
+            return
+
+        keys, self._sent = self._sent, []
+        now = self.clock()
+        expired_before = now - self.retention if now - self._pruned_at >= PRUNE_INTERVAL else None
+        try:
+            pruned = await self.database.run(_mark_sent, now, keys, expired_before, *self._filter)
+        except Exception as e:
+            logger.error(f"Cannot mark {len(keys)} outbox entries as sent: {e}")
+            self._sent[:0] = keys
+            return
+        self.pending -= len(keys)
+        if expired_before is not None:
+            self._pruned_at = now
+            logger.debug(f"Deleted {pruned} expired outbox entries")
+
+    async def close(self) -> None:
+        """Commits the pending deliveries right away."""
+        self._commit.cancel()
+        await self.flush()
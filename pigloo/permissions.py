@@ -0,0 +1,83 @@
+from collections import defaultdict
+from typing import Optional
+
+import discord
+from loguru import logger
+
+# Permissions needed to post feed embeds in a channel
+REQUIRED = discord.Permissions(send_messages=True, embed_links=True)
+
+
+def missing_permissions(channel: discord.abc.Messageable) -> list[str]:
+    """Names of the required permissions the bot lacks in a channel, according to the gateway cache.
+
+    Direct messages and channels whose guild member of the bot is not cached are assumed usable.
+    """
+    guild: Optional[discord.Guild] = getattr(channel, "guild", None)
+    if guild is None or guild.me is None:
+        return []
+
+    permissions = channel.permissions_for(guild.me)
+    return [name for name, required in REQUIRED if required and not getattr(permissions, name)]
+
+
+class PermissionCache:
+    """Remembers whether the bot can post feeds in each channel, to skip sends that would fail.
+
+    Entries are computed from the gateway cache on first use and forgotten whenever a guild,
+    channel, role or bot member event may change them. Feeds to a channel are suspended while
+    the bot lacks a required permission there, without any request reaching Discord.
+    """
+
+    def __init__(self) -> None:
+        self._allowed: dict[int, bool] = {}
+        self._guilds: dict[int, set[int]] = defaultdict(set)
+        self._suspended: set[int] = set()
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._allowed)
+
+    def can_send(self, channel: discord.abc.Messageable) -> bool:
+        allowed = self._allowed.get(channel.id)
+        if allowed is None:
+            allowed = self._check(channel)
+            self._allowed[channel.id] = allowed
+            guild = getattr(channel, "guild", None)
+            if guild is not None:
+                self._guilds[guild.id].add(channel.id)
+        if not allowed:
+            self.skipped += 1
+        return allowed
+
+    def _check(self, channel: discord.abc.Messageable) -> bool:
+        missing = missing_permissions(channel)
+        if missing and channel.id not in self._suspended:
+            self._suspended.add(channel.id)
+            logger.warning(f"Suspending feeds in channel {channel.id}: missing permissions {', '.join(missing)}")
+        elif not missing and channel.id in self._suspended:
+            self._suspended.discard(channel.id)
+            logger.info(f"Resuming feeds in channel {channel.id}")
+        return not missing
+
+    @property
+    def suspended(self) -> frozenset[int]:
+        """Channels whose feeds are suspended for lack of permissions."""
+        return frozenset(self._suspended)
+
+    def invalidate_channel(self, channel_id: int) -> None:
+        self._allowed.pop(channel_id, None)
+
+    def invalidate_guild(self, guild_id: int) -> None:
+        for channel_id in self._guilds.pop(guild_id, ()):
+            self._allowed.pop(channel_id, None)
+
+    def forget_channel(self, channel_id: int) -> None:
+        """Drops a deleted channel."""
+        self.invalidate_channel(channel_id)
+        self._suspended.discard(channel_id)
+
+    def forget_guild(self, guild_id: int) -> None:
+        """Drops the channels of a guild the bot left."""
+        for channel_id in self._guilds.pop(guild_id, ()):
+            self.forget_channel(channel_id)
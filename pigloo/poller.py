@@ -0,0 +1,139 @@
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable, Optional
+
+from loguru import logger
+
+from pigloo.cursors import Cursor, CursorStore
+from pigloo.feed import Feed, TrackedUser
+from pigloo.identity import IdentityMap
+from pigloo.metrics import POLL_CYCLE_SECONDS
+from pigloo.providers.base import Provider
+from pigloo.scheduler import PollScheduler
+
+
+class FeedPoller:
+    """Periodically polls the activities of every tracked user and hands the feeds to a sink.
+
+    Users are grouped by service so that each provider can batch its own requests. Only the
+    activities newer than each user's cursor are fetched, and cursors are saved once the sink
+    has processed the feeds. When an identity map is given, the feeds share their entities.
+
+    With a scheduler, each user is polled when the scheduler says so instead of every
+    `interval` seconds, which then only bounds how long new subscriptions wait to be seen.
+    """
+
+    def __init__(
+        self,
+        providers: dict[str, Provider],
+        cursors: CursorStore,
+        users: Callable[[], Iterable[TrackedUser]],
+        sink: Callable[[list[Feed]], Awaitable[None]],
+        interval: float,
+        identities: Optional[IdentityMap] = None,
+        scheduler: Optional[PollScheduler] = None,
+    ) -> None:
+        self.providers = providers
+        self.cursors = cursors
+        self.users = users
+        self.sink = sink
+        self.interval = interval
+        self.identities = identities
+        self.scheduler = scheduler
+        self._task: Optional[asyncio.Task] = None
+        self._publishing: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> asyncio.Task:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="pigloo-poller")
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Feeds handed to the sink must not be polled again after a restart
+        if self._publishing is not None:
+            await asyncio.gather(self._publishing, return_exceptions=True)
+            self._publishing = None
+
+    def _cost(self, service: str, users: int) -> int:
+        provider = self.providers.get(service)
+        return provider.cost(users) if provider is not None else 0
+
+    async def poll_once(self, users: Optional[Iterable[TrackedUser]] = None) -> list[Feed]:
+        """Polls the given users, or every tracked user, once and returns the feeds, oldest first."""
+        users_by_service = defaultdict(list)
+        for user in self.users() if users is None else users:
+            users_by_service[user.service].append(user)
+
+        feeds = []
+        cursors = {}
+        for service, users in users_by_service.items():
+            provider = self.providers.get(service)
+            if provider is None:
+                logger.warning(f"No provider for service '{service}', skipping {len(users)} users")
+                continue
+
+            activities = await provider.fetch_activities(users, {user: self.cursors.get(user) for user in users})
+            for user, (user_feeds, cursor) in activities.items():
+                feeds.extend(user_feeds)
+                if cursor is not None:
+                    cursors[user] = cursor
+            if self.scheduler is not None:
+                for user in users:
+                    self.scheduler.record(user, active=bool(user in activities and activities[user].feeds))
+
+        if self.identities is not None:
+            feeds = [self.identities.intern_feed(feed) for feed in feeds]
+            logger.debug(f"Identity map: {self.identities.stats()}")
+        feeds.sort(key=lambda feed: feed.datetime)
+        # Stopping the poller waits for the feeds to be published and the cursors saved
+        self._publishing = asyncio.ensure_future(self._publish(feeds, cursors))
+        await asyncio.shield(self._publishing)
+        return feeds
+
+    async def _publish(self, feeds: list[Feed], cursors: dict[TrackedUser, Cursor]) -> None:
+        if feeds:
+            await self.sink(feeds)
+        await self.cursors.update(cursors)
+
+    async def _poll_due(self) -> list[Feed]:
+        """Polls the users the scheduler says are due, then sleeps until the next ones are."""
+        self.scheduler.sync(self.users())
+        users = self.scheduler.pop_due(self._cost)
+        try:
+            return await self.poll_once(users) if users else []
+        finally:
+            # Users whose poll failed before reaching their provider are rescheduled as idle
+            for user in users:
+                if self.scheduler.is_pending(user):
+                    self.scheduler.record(user, active=False)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                with POLL_CYCLE_SECONDS.time():
+                    feeds = await (self._poll_due() if self.scheduler is not None else self.poll_once())
+                logger.debug(f"Poll cycle fetched {len(feeds)} feeds")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Poll cycle failed: {e}")
+
+            delay = self.interval
+            if self.scheduler is not None:
+                logger.debug(f"Scheduler: {self.scheduler.stats()}")
+                wait = self.scheduler.wait_time()
+                delay = self.interval if wait is None else min(wait, self.interval)
+            await asyncio.sleep(delay)
@@ -0,0 +1,417 @@
+import asyncio
+import re
+from datetime import datetime, timezone
+from itertools import takewhile
+from typing import Annotated, Any, Mapping, Optional, Sequence, TypeVar, Union
+
+import aiohttp
+from loguru import logger
+from pydantic import BaseModel, Field, HttpUrl, ValidationError
+
+from pigloo.cache import TTLCache
+from pigloo.config import config
+from pigloo.cursors import Cursor
+from pigloo.dispatcher import TokenBucket
+from pigloo.feed import Anime, Feed, Manga, Media, Service, TrackedUser, User, stable_uuid, status_for
+from pigloo.httpcache import HttpCache
+from pigloo.metrics import RATE_LIMITS, VALIDATION_SECONDS
+from pigloo.providers.base import UserActivities
+from pigloo.resolver import MediaResolver
+
+SERVICE_NAME = "AniList"
+VALIDATION = VALIDATION_SECONDS.labels(SERVICE_NAME)
+ANILIST_SERVICE = Service(id=stable_uuid(SERVICE_NAME, "service", SERVICE_NAME), name=SERVICE_NAME)
+
+ACTIVITY_FIELDS = """
+      ... on ListActivity {
+        id
+        status
+        progress
+        createdAt
+        user { id name }
+        media { id }
+      }"""
+
+PAGE_TEMPLATE = """
+  u{index}: Page(perPage: $p{index}) {{
+    activities(
+      userId: $u{index}, id_greater: $c{index}, type_in: [ANIME_LIST, MANGA_LIST], sort: [$s{index}]
+    ) {{{fields}
+    }}
+  }}"""
+
+MEDIA_QUERY = """
+query ($ids: [Int], $perPage: Int) {
+  Page(perPage: $perPage) {
+    media(id_in: $ids) {
+      id
+      type
+      format
+      episodes
+      chapters
+      siteUrl
+      title { userPreferred }
+      coverImage { large }
+    }
+  }
+}"""
+
+# Largest page AniList serves
+MAX_PER_PAGE = 50
+
+USER_QUERY = """
+query ($name: String) {
+  User(name: $name) { id name }
+}"""
+
+PROGRESS_PATTERN = re.compile(r"\d+")
+
+ResponseT = TypeVar("ResponseT", "ActivitiesResponse", "MediaResponse", "UserResponse")
+
+
+def build_activities_query(
+    users: Sequence[TrackedUser], cursors: Mapping[TrackedUser, Optional[Cursor]], per_page: int
+) -> tuple[str, dict[str, Any]]:
+    """Builds a single GraphQL query fetching the list activities of every given user.
+
+    Each user gets its own aliased `Page` sub-query (`u0`, `u1`, ...) so that a whole batch
+    of users costs one HTTP request instead of one request per user. Users with a cursor only
+    get the activities newer than it, oldest first; users without one get their newest activity.
+    """
+    variables = {}
+    pages = []
+    for index, user in enumerate(users):
+        cursor = cursors.get(user)
+        variables[f"u{index}"] = int(user.id)
+        variables[f"c{index}"] = cursor.last_id if cursor else None
+        variables[f"p{index}"] = per_page if cursor else 1
+        variables[f"s{index}"] = "ID" if cursor else "ID_DESC"
+        pages.append(PAGE_TEMPLATE.format(index=index, fields=ACTIVITY_FIELDS))
+
+    declarations = ", ".join(
+        f"$u{index}: Int, $c{index}: Int, $p{index}: Int, $s{index}: ActivitySort" for index in range(len(users))
+    )
+    return f"query ({declarations}) {{{''.join(pages)}\n}}", variables
+
+
+class RawTitle(BaseModel):
+    userPreferred: str
+
+
+class RawCoverImage(BaseModel):
+    large: HttpUrl
+
+
+class RawMedia(BaseModel):
+    id: int
+    type: str
+    format: Optional[str] = None
+    episodes: Optional[int] = None
+    chapters: Optional[int] = None
+    siteUrl: HttpUrl
+    title: RawTitle
+    coverImage: RawCoverImage
+
+
+class RawMediaRef(BaseModel):
+    id: int
+
+
+class RawUser(BaseModel):
+    id: int
+    name: str
+
+
+class RawActivity(BaseModel):
+    id: int
+    status: str
+    progress: Optional[str] = None
+    createdAt: int
+    user: RawUser
+    media: Optional[RawMediaRef] = None
+
+
+class RawPage(BaseModel):
+    # Activities that are not list activities come back as empty objects
+    activities: list[Annotated[Union[RawActivity, dict], Field(union_mode="left_to_right")]] = []
+
+
+class RawError(BaseModel):
+    message: str = ""
+
+
+class ActivitiesResponse(BaseModel):
+    data: Optional[dict[str, Optional[RawPage]]] = None
+    errors: list[RawError] = []
+
+
+class RawMediaPage(BaseModel):
+    media: list[RawMedia] = []
+
+
+class MediaResponse(BaseModel):
+    data: Optional[dict[str, Optional[RawMediaPage]]] = None
+    errors: list[RawError] = []
+
+
+class UserResponse(BaseModel):
+    data: Optional[dict[str, Optional[RawUser]]] = None
+    errors: list[RawError] = []
+
+
+def build_cursor(activities: list[RawActivity], cursor: Optional[Cursor]) -> Cursor:
+    """Moves the cursor to the newest of the given raw activities."""
+    newest = max(activities, key=lambda activity: activity.id, default=None)
+    if newest is None:
+        return cursor or Cursor(last_id=0, last_timestamp=datetime.now(tz=timezone.utc))
+
+    return Cursor(last_id=newest.id, last_timestamp=datetime.fromtimestamp(newest.createdAt, tz=timezone.utc))
+
+
+def parse_progress(progress: Optional[str]) -> tuple[Optional[int], Optional[int]]:
+    """Extracts the (first, latest) progress from AniList's progress string (e.g. "3" or "3 - 7")."""
+    numbers = PROGRESS_PATTERN.findall(progress) if progress else None
+    if not numbers:
+        return None, None
+
+    return int(numbers[0]), int(numbers[-1])
+
+
+def parse_media(raw_media: RawMedia) -> Media:
+    """Converts raw AniList media metadata into an `Anime` or a `Manga`."""
+    is_anime = raw_media.type == "ANIME"
+    return (Anime if is_anime else Manga).model_construct(
+        id=stable_uuid(SERVICE_NAME, "media", raw_media.id),
+        name=raw_media.title.userPreferred,
+        service=ANILIST_SERVICE,
+        max_progress=(raw_media.episodes if is_anime else raw_media.chapters) or 0,
+        url=raw_media.siteUrl,
+        image=raw_media.coverImage.large,
+        format=raw_media.format or raw_media.type,
+    )
+
+
+def parse_activity(activity: RawActivity, media: Optional[Media]) -> Optional[Feed]:
+    """Converts a raw AniList `ListActivity` into a `Feed` about the given resolved media.
+
+    The response was already validated as a whole, so the models are built without being
+    validated again. Returns None when the activity cannot be converted, e.g. when the
+    media was removed.
+    """
+    if media is None:
+        logger.warning(f"AniList activity {activity.id} has no media")
+        return
+
+    try:
+        status = status_for(activity.status, media)
+    except ValueError as e:
+        logger.error(f"Cannot convert AniList activity {activity.id} to a feed: {e}")
+        return
+
+    progress_from, progress = parse_progress(activity.progress)
+    user = User.model_construct(
+        id=stable_uuid(SERVICE_NAME, "user", activity.user.id), name=activity.user.name, service=ANILIST_SERVICE
+    )
+    return Feed.model_construct(
+        id=stable_uuid(SERVICE_NAME, "activity", activity.id),
+        user=user,
+        service=ANILIST_SERVICE,
+        media=media,
+        progress=progress,
+        progress_from=progress_from if progress_from != progress else None,
+        datetime=datetime.fromtimestamp(activity.createdAt, tz=timezone.utc),
+        status=status,
+    )
+
+
+class AniListProvider:
+    """Fetches list activities from the AniList GraphQL API.
+
+    Users are queried in batches of `batch_size`, each batch being a single request made
+    through the shared HTTP session. Activities only carry media ids, whose metadata is
+    resolved through `media`, shared by every caller and cached for `media_ttl` seconds.
+    With a `cache`, media metadata and user lookups also survive restarts.
+    """
+
+    name = SERVICE_NAME
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        *,
+        api_url: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        per_page: Optional[int] = None,
+        media_ttl: Optional[float] = None,
+        cache: Optional[HttpCache] = None,
+        budget: Optional[TokenBucket] = None,
+    ) -> None:
+        self.session = session
+        self.cache = cache
+        self.budget = budget
+        self.api_url = api_url or config.get("ANILIST", "api_url", fallback="https://graphql.anilist.co")
+        self.batch_size = batch_size or config.getint("ANILIST", "batch_size", fallback=25)
+        self.per_page = per_page or config.getint("ANILIST", "per_page", fallback=10)
+        media_ttl = media_ttl or config.getfloat("ANILIST", "media_ttl", fallback=3600)
+        media_cache_size = config.getint("ANILIST", "media_cache_size", fallback=4096)
+        self.media: MediaResolver[int, Media] = MediaResolver(
+            self._fetch_media, batch_size=MAX_PER_PAGE, ttl=media_ttl, maxsize=media_cache_size
+        )
+        # Media missing from successful lookups, e.g. because they were removed from AniList
+        self._missing: TTLCache[int, bool] = TTLCache(media_cache_size, media_ttl)
+
+    def cost(self, users: int) -> int:
+        return -(-users // self.batch_size)
+
+    def _charge(self) -> None:
+        # Lookups are not part of the polls paid for by the scheduler
+        if self.budget is not None:
+            self.budget.consume()
+
+    async def _post(
+        self, query: str, variables: dict[str, Any], model: type[ResponseT], endpoint: Optional[str] = None
+    ) -> Optional[ResponseT]:
+        """Runs a GraphQL query and validates the whole raw response body in one pass.
+
+        Queries of an `endpoint` are answered from the HTTP cache when one is set.
+        """
+        payload = {"query": query, "variables": variables}
+        try:
+            if self.cache is not None and endpoint is not None:
+                status, raw, headers = await self.cache.fetch(
+                    self.session, "POST", self.api_url, endpoint=endpoint, json=payload
+                )
+            else:
+                async with self.session.post(self.api_url, json=payload) as response:
+                    status, raw, headers = response.status, await response.read(), response.headers
+            if status == 429:
+                RATE_LIMITS.labels(SERVICE_NAME).inc()
+                logger.warning(f"AniList rate limit reached, retry after {headers.get('Retry-After')}s")
+                return
+            if raw is None:
+                logger.warning(f"AniList returned {status}")
+                return
+            with VALIDATION.time():
+                body = model.model_validate_json(raw)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"AniList request failed: {e}")
+            return
+        except ValidationError as e:
+            logger.error(f"Unexpected AniList response: {e}")
+            return
+
+        for error in body.errors:
+            logger.warning(f"AniList error: {error.message}")
+        return body
+
+    async def _fetch_media(self, ids: list[int]) -> dict[int, Media]:
+        """Fetches the metadata of up to `MAX_PER_PAGE` media in a single `id_in` query.
+
+        With an HTTP cache, each media is stored on its own so that it can be found again
+        whatever the batch it is asked in.
+        """
+        media = {}
+        if self.cache is not None:
+            keys = {self.cache.key(SERVICE_NAME, "media", id): id for id in ids}
+            for key, entry in (await self.cache.get_many(keys)).items():
+                if self.cache.is_fresh(entry):
+                    self.cache.record_hit(key, entry)
+                    media[keys[key]] = parse_media(RawMedia.model_validate_json(entry.body))
+            ids = [id for id in ids if id not in media]
+            for _ in ids:
+                self.cache.record_miss()
+            if not ids:
+                return media
+
+        self._charge()
+        response = await self._post(MEDIA_QUERY, {"ids": ids, "perPage": len(ids)}, MediaResponse)
+        page = (response.data or {}).get("Page") if response else None
+        if page is None:
+            return media
+
+        media.update((raw_media.id, parse_media(raw_media)) for raw_media in page.media)
+        for id in ids:
+            if id not in media:
+                self._missing.put(id, True)
+        if self.cache is not None:
+            await self.cache.put_many(
+                "anilist.media",
+                {
+                    self.cache.key(SERVICE_NAME, "media", raw_media.id): (
+                        raw_media.model_dump_json().encode(),
+                        None,
+                        None,
+                    )
+                    for raw_media in page.media
+                },
+            )
+        return media
+
+    async def fetch_user(self, name: str) -> Optional[TrackedUser]:
+        """Looks up an AniList account from its name."""
+        self._charge()
+        response = await self._post(USER_QUERY, {"name": name}, UserResponse, endpoint="anilist.user")
+        raw_user = (response.data or {}).get("User") if response else None
+        if raw_user is None:
+            return None
+
+        return TrackedUser(service=SERVICE_NAME, id=str(raw_user.id), name=raw_user.name)
+
+    async def fetch_activities(
+        self, users: Sequence[TrackedUser], cursors: Mapping[TrackedUser, Optional[Cursor]]
+    ) -> dict[TrackedUser, UserActivities]:
+        """Fetches the list activities newer than each user's cursor, oldest first.
+
+        Users without a cursor are only seeded with their newest activity so that their
+        history is never posted.
+        """
+        activities = {}
+        updated: dict[TrackedUser, tuple[list[RawActivity], Cursor]] = {}
+        for start in range(0, len(users), self.batch_size):
+            batch = users[start : start + self.batch_size]
+            query, variables = build_activities_query(batch, cursors, self.per_page)
+            response = await self._post(query, variables, ActivitiesResponse)
+            if response is None or response.data is None:
+                continue
+
+            for index, user in enumerate(batch):
+                page = response.data.get(f"u{index}")
+                if page is None:
+                    continue
+
+                cursor = cursors.get(user)
+                raw_activities = [activity for activity in page.activities if isinstance(activity, RawActivity)]
+                if cursor is None:
+                    activities[user] = UserActivities([], build_cursor(raw_activities, None))
+                    continue
+
+                raw_activities.sort(key=lambda activity: activity.id)
+                updated[user] = raw_activities, cursor
+
+        # The media of every batch are resolved together, most of them being already cached
+        media = await self.media.resolve(
+            activity.media.id
+            for raw_activities, _ in updated.values()
+            for activity in raw_activities
+            if activity.media
+        )
+        for user, (raw_activities, cursor) in updated.items():
+            # Stop before the first activity whose media could not be fetched, to retry it next time.
+            # Those whose media AniList does not know are skipped instead, to not hold the cursor forever.
+            resolved = list(
+                takewhile(
+                    lambda activity: (
+                        activity.media is None or activity.media.id in media or self._missing.get(activity.media.id)
+                    ),
+                    raw_activities,
+                )
+            )
+            feeds = (
+                parse_activity(activity, media.get(activity.media.id) if activity.media else None)
+                for activity in resolved
+            )
+            activities[user] = UserActivities(
+                [feed for feed in feeds if feed is not None], build_cursor(resolved, cursor)
+            )
+
+        return activities
@@ -0,0 +1,32 @@
+from typing import Mapping, NamedTuple, Optional, Protocol, Sequence
+
+from pigloo.cursors import Cursor
+from pigloo.feed import Feed, TrackedUser
+
+
+class UserActivities(NamedTuple):
+    """New feeds of a user, oldest first, along with the cursor to save once they are processed."""
+
+    feeds: list[Feed]
+    cursor: Optional[Cursor]
+
+
+class Provider(Protocol):
+    name: str
+
+    def cost(self, users: int) -> int:
+        """Number of requests needed to fetch the activities of that many users at once."""
+        ...
+
+    async def fetch_user(self, name: str) -> Optional[TrackedUser]:
+        """Looks up an account from its name, returning None if it does not exist."""
+        ...
+
+    async def fetch_activities(
+        self, users: Sequence[TrackedUser], cursors: Mapping[TrackedUser, Optional[Cursor]]
+    ) -> dict[TrackedUser, UserActivities]:
+        """Fetches the activities newer than each user's cursor.
+
+        Users without a cursor are only seeded: their newest activity becomes the cursor and no feed is returned.
+        """
+        ...
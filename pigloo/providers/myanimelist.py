@@ -0,0 +1,231 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Mapping, Optional, Sequence
+
+import aiohttp
+from loguru import logger
+from pydantic import AwareDatetime, BaseModel, HttpUrl, ValidationError
+
+from pigloo.config import config
+from pigloo.cursors import Cursor
+from pigloo.dispatcher import TokenBucket
+from pigloo.feed import Anime, Feed, Manga, Service, TrackedUser, User, stable_uuid, status_for
+from pigloo.httpcache import HttpCache
+from pigloo.metrics import RATE_LIMITS, VALIDATION_SECONDS
+from pigloo.providers.base import UserActivities
+
+SERVICE_NAME = "MyAnimeList"
+VALIDATION = VALIDATION_SECONDS.labels(SERVICE_NAME)
+MAL_SERVICE = Service(id=stable_uuid(SERVICE_NAME, "service", SERVICE_NAME), name=SERVICE_NAME)
+
+# List endpoint and media fields for each kind of list
+LISTS = {
+    "anime": ("animelist", "num_episodes,media_type"),
+    "manga": ("mangalist", "num_chapters,media_type"),
+}
+
+
+class RawPicture(BaseModel):
+    medium: Optional[HttpUrl] = None
+    large: Optional[HttpUrl] = None
+
+
+class RawNode(BaseModel):
+    id: int
+    title: str
+    main_picture: Optional[RawPicture] = None
+    media_type: Optional[str] = None
+    num_episodes: Optional[int] = None
+    num_chapters: Optional[int] = None
+
+
+class RawListStatus(BaseModel):
+    status: str
+    num_episodes_watched: Optional[int] = None
+    num_chapters_read: Optional[int] = None
+    is_rewatching: bool = False
+    is_rereading: bool = False
+    updated_at: AwareDatetime
+
+
+class RawEntry(BaseModel):
+    node: RawNode
+    list_status: RawListStatus
+
+
+class ListResponse(BaseModel):
+    data: list[RawEntry] = []
+
+
+def parse_entry(user: TrackedUser, kind: str, entry: RawEntry, default_image: HttpUrl) -> Optional[Feed]:
+    """Converts an updated MyAnimeList list entry into a `Feed`.
+
+    MyAnimeList has no activity feed, so each update of an entry is identified by the entry
+    and its update date. Statuses such as `plan_to_watch` or `on_hold` map to the usual
+    `FeedStatus` subclasses, and entries being rewatched or reread to their own status.
+    """
+    node, list_status = entry.node, entry.list_status
+    is_anime = kind == "anime"
+    picture = node.main_picture
+    media = (Anime if is_anime else Manga).model_construct(
+        id=stable_uuid(SERVICE_NAME, "media", f"{kind}:{node.id}"),
+        name=node.title,
+        service=MAL_SERVICE,
+        max_progress=(node.num_episodes if is_anime else node.num_chapters) or 0,
+        url=HttpUrl(f"https://myanimelist.net/{kind}/{node.id}"),
+        image=(picture.large or picture.medium if picture else None) or default_image,
+        format=(node.media_type or kind).upper(),
+    )
+
+    label = list_status.status
+    if list_status.is_rewatching or list_status.is_rereading:
+        label = "rewatching" if is_anime else "rereading"
+    try:
+        status = status_for(label, media)
+    except ValueError as e:
+        logger.error(f"Cannot convert MyAnimeList entry {kind}/{node.id} of {user.name} to a feed: {e}")
+        return
+
+    progress = list_status.num_episodes_watched if is_anime else list_status.num_chapters_read
+    updated_at = int(list_status.updated_at.timestamp())
+    return Feed.model_construct(
+        id=stable_uuid(SERVICE_NAME, "activity", f"{user.id}:{kind}:{node.id}:{updated_at}"),
+        user=User.model_construct(id=user.uuid, name=user.name, service=MAL_SERVICE),
+        service=MAL_SERVICE,
+        media=media,
+        progress=progress or None,
+        datetime=list_status.updated_at,
+        status=status,
+    )
+
+
+class MyAnimeListProvider:
+    """Fetches the recently updated entries of users' lists from the MyAnimeList API.
+
+    At most `concurrency` requests are in flight at once. Each list is requested with the
+    ETag/Last-Modified of its previous response, so that an unchanged list costs a 304
+    and no parsing. With a `cache`, these validators survive restarts.
+    """
+
+    name = SERVICE_NAME
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        *,
+        api_url: Optional[str] = None,
+        client_id: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        limit: Optional[int] = None,
+        cache: Optional[HttpCache] = None,
+        budget: Optional[TokenBucket] = None,
+    ) -> None:
+        self.session = session
+        self.cache = cache
+        self.budget = budget
+        self.api_url = api_url or config.get("MYANIMELIST", "api_url", fallback="https://api.myanimelist.net/v2")
+        self.client_id = client_id or config.get("MYANIMELIST", "client_id", fallback="")
+        self.limit = limit or config.getint("MYANIMELIST", "limit", fallback=10)
+        self.default_image = HttpUrl(
+            config.get("MYANIMELIST", "icon_url", fallback="https://cdn.myanimelist.net/images/favicon.ico")
+        )
+        self.not_modified = 0
+        self._semaphore = asyncio.Semaphore(concurrency or config.getint("MYANIMELIST", "concurrency", fallback=4))
+        self._validators: dict[str, tuple[Optional[str], Optional[str]]] = {}
+
+    def cost(self, users: int) -> int:
+        return users * len(LISTS)
+
+    async def _get_list(self, user_name: str, kind: str, limit: int) -> tuple[int, Optional[ListResponse]]:
+        """Fetches a user's list, most recently updated first.
+
+        Returns the response status and the validated body, which is None unless the status is 200.
+        """
+        endpoint, fields = LISTS[kind]
+        url = f"{self.api_url}/users/{user_name}/{endpoint}"
+        params = {"fields": f"list_status,{fields}", "sort": "list_updated_at", "limit": str(limit), "nsfw": "true"}
+        key = f"{url}?limit={limit}"
+        headers = {"X-MAL-CLIENT-ID": self.client_id}
+        try:
+            async with self._semaphore:
+                if self.cache is not None:
+                    status, raw, _ = await self.cache.fetch(
+                        self.session, "GET", url, endpoint="myanimelist.list", key=key, params=params, headers=headers
+                    )
+                else:
+                    status, raw = await self._get_with_validators(url, key, params, headers)
+            if status == 304:
+                self.not_modified += 1
+                return status, None
+            if status == 429:
+                RATE_LIMITS.labels(SERVICE_NAME).inc()
+            if status != 200 or raw is None:
+                logger.warning(f"MyAnimeList {endpoint} of {user_name} returned {status}")
+                return status, None
+
+            with VALIDATION.time():
+                return status, ListResponse.model_validate_json(raw)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"MyAnimeList request failed: {e}")
+        except ValidationError as e:
+            logger.error(f"Unexpected MyAnimeList response: {e}")
+        return 0, None
+
+    async def _get_with_validators(
+        self, url: str, key: str, params: dict[str, str], headers: dict[str, str]
+    ) -> tuple[int, Optional[bytes]]:
+        """Sends a conditional request with the ETag/Last-Modified of the previous response, kept in memory."""
+        etag, last_modified = self._validators.get(key, (None, None))
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        async with self.session.get(url, params=params, headers=headers) as response:
+            if response.status != 200:
+                return response.status, None
+            body = await response.read()
+            self._validators[key] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return response.status, body
+
+    async def fetch_user(self, name: str) -> Optional[TrackedUser]:
+        """Looks up a MyAnimeList account from its name. Accounts are identified by their name."""
+        # Lookups are not part of the polls paid for by the scheduler
+        if self.budget is not None:
+            self.budget.consume()
+        status, _ = await self._get_list(name, "anime", limit=1)
+        if status not in (200, 304):
+            return None
+
+        return TrackedUser(service=SERVICE_NAME, id=name, name=name)
+
+    async def _fetch_user_activities(self, user: TrackedUser, cursor: Optional[Cursor]) -> Optional[UserActivities]:
+        responses = await asyncio.gather(*(self._get_list(user.id, kind, self.limit) for kind in LISTS))
+        if any(status not in (200, 304) for status, _ in responses):
+            # Retry the whole user on the next cycle rather than moving its cursor past a missing list
+            return None
+
+        entries = [(kind, entry) for kind, (_, body) in zip(LISTS, responses) if body for entry in body.data]
+        newest = max((entry.list_status.updated_at for _, entry in entries), default=None)
+        if cursor is None:
+            newest = newest or datetime.now(tz=timezone.utc)
+            return UserActivities([], Cursor(last_id=int(newest.timestamp()), last_timestamp=newest))
+
+        updated = sorted(
+            ((kind, entry) for kind, entry in entries if entry.list_status.updated_at > cursor.last_timestamp),
+            key=lambda item: item[1].list_status.updated_at,
+        )
+        feeds = (parse_entry(user, kind, entry, self.default_image) for kind, entry in updated)
+        if newest is not None and newest > cursor.last_timestamp:
+            cursor = Cursor(last_id=int(newest.timestamp()), last_timestamp=newest)
+        return UserActivities([feed for feed in feeds if feed is not None], cursor)
+
+    async def fetch_activities(
+        self, users: Sequence[TrackedUser], cursors: Mapping[TrackedUser, Optional[Cursor]]
+    ) -> dict[TrackedUser, UserActivities]:
+        """Fetches the list entries updated since each user's cursor, oldest first.
+
+        Users without a cursor are only seeded with the date of their latest update.
+        """
+        results = await asyncio.gather(*(self._fetch_user_activities(user, cursors.get(user)) for user in users))
+        return {user: result for user, result in zip(users, results) if result is not None}
@@ -0,0 +1,112 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, NamedTuple, Optional, TypeVar
+
+from loguru import logger
+
+from pigloo.cache import TTLCache
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class ResolverStats(NamedTuple):
+    hits: int
+    misses: int
+    requests: int
+    in_flight: int
+
+
+class MediaResolver(Generic[K, V]):
+    """Resolves media ids to their metadata with as few requests as possible.
+
+    Ids asked for by concurrent callers are gathered during the same event loop iteration
+    (or `delay` seconds) and fetched together, `batch_size` ids per request. A caller asking
+    for an id that is already being fetched waits for that request instead of sending its
+    own. Resolved metadata is kept for `ttl` seconds.
+
+    `fetch` receives a batch of ids and returns the metadata of those it found. Ids it does
+    not return resolve to nothing and are asked again by the next caller.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[list[K]], Awaitable[dict[K, V]]],
+        *,
+        batch_size: int = 50,
+        ttl: float = 3600,
+        maxsize: int = 4096,
+        delay: float = 0,
+    ) -> None:
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.delay = delay
+        self.requests = 0
+        self._cache: TTLCache[K, V] = TTLCache(maxsize, ttl)
+        self._in_flight: dict[K, asyncio.Future] = {}
+        self._pending: list[K] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def resolve(self, ids: Iterable[K]) -> dict[K, V]:
+        """Returns the metadata of the given ids, leaving out those that could not be resolved."""
+        resolved: dict[K, V] = {}
+        waiting: dict[K, asyncio.Future] = {}
+        for id in dict.fromkeys(ids):
+            value = self._cache.get(id)
+            if value is not None:
+                resolved[id] = value
+                continue
+
+            future = self._in_flight.get(id)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self._in_flight[id] = future
+                self._pending.append(id)
+            waiting[id] = future
+
+        if not waiting:
+            return resolved
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="pigloo-media-resolver")
+        # Shielded so that a cancelled caller does not cancel the lookup shared with others
+        values = await asyncio.gather(*(asyncio.shield(future) for future in waiting.values()))
+        resolved.update((id, value) for id, value in zip(waiting, values) if value is not None)
+        return resolved
+
+    async def _run(self) -> None:
+        try:
+            # Let the other callers of this loop iteration add their ids to the batch
+            await asyncio.sleep(self.delay)
+            while self._pending:
+                ids, self._pending = self._pending, []
+                batches = [ids[start : start + self.batch_size] for start in range(0, len(ids), self.batch_size)]
+                await asyncio.gather(*(self._fetch_batch(batch) for batch in batches))
+        except asyncio.CancelledError:
+            for future in self._in_flight.values():
+                future.cancel()
+            self._in_flight.clear()
+            self._pending.clear()
+            raise
+        finally:
+            self._task = None
+
+    async def _fetch_batch(self, ids: list[K]) -> None:
+        self.requests += 1
+        try:
+            values = await self.fetch(ids)
+        except Exception as e:
+            logger.error(f"Cannot resolve {len(ids)} media: {e}")
+            values = {}
+
+        for id in ids:
+            value = values.get(id)
+            if value is not None:
+                self._cache.put(id, value)
+            future = self._in_flight.pop(id)
+            if not future.done():
+                future.set_result(value)
+
+    def stats(self) -> ResolverStats:
+        return ResolverStats(
+            hits=self._cache.hits, misses=self._cache.misses, requests=self.requests, in_flight=len(self._in_flight)
+        )
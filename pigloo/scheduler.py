@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import time
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from pigloo.dispatcher import TokenBucket
+from pigloo.feed import TrackedUser
+
+
+class SchedulerStats(NamedTuple):
+    users: int
+    due: int
+    median_interval: float
+    tokens: float
+
+
+class PollScheduler:
+    """Decides when each tracked user is polled, based on how active they are.
+
+    Users are kept in a heap ordered by their next poll date. A user starts at
+    `min_interval`, goes back to it whenever they post a new activity, and waits `backoff`
+    times longer after each poll that found nothing, up to `max_interval`. Polls are paid
+    from a budget of `requests_per_minute`: due users that do not fit in it wait for the
+    next refill, oldest due first. The other requests sent to the providers are taken from
+    the same `budget` once sent, and delay the next polls.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_interval: float,
+        max_interval: float,
+        backoff: float = 2.0,
+        requests_per_minute: int = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.clock = clock
+        self.budget = TokenBucket(requests_per_minute, 60.0, clock=clock)
+        self._heap: list[tuple[float, int, TrackedUser]] = []
+        self._sequence = itertools.count()
+        self._due: dict[TrackedUser, float] = {}
+        self._intervals: dict[TrackedUser, float] = {}
+        # Requests needed by the first due user left out for lack of budget
+        self._needed = 1
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def _schedule(self, user: TrackedUser, due: float) -> None:
+        # Previous heap entries of the user are left behind and skipped once popped
+        self._due[user] = due
+        heapq.heappush(self._heap, (due, next(self._sequence), user))
+
+    def _peek(self) -> Optional[tuple[float, TrackedUser]]:
+        while self._heap:
+            due, _, user = self._heap[0]
+            if self._due.get(user) == due:
+                return due, user
+            heapq.heappop(self._heap)
+        return None
+
+    def sync(self, users: Iterable[TrackedUser]) -> None:
+        """Schedules new users right away and forgets those that are no longer tracked."""
+        now = self.clock()
+        tracked = set(users)
+        for user in tracked.difference(self._intervals):
+            self._intervals[user] = self.min_interval
+            self._schedule(user, now)
+        for user in set(self._intervals).difference(tracked):
+            del self._intervals[user]
+            self._due.pop(user, None)
+
+    def pop_due(self, cost: Callable[[str, int], int]) -> list[TrackedUser]:
+        """Takes the users due for a poll, as many as the request budget allows.
+
+        `cost(service, count)` returns the number of requests needed to poll `count` users of
+        a service together. Taken users are not scheduled again until `record` is called.
+        """
+        now = self.clock()
+        self._needed = 1
+        taken: list[TrackedUser] = []
+        counts: dict[str, int] = {}
+        spent = 0
+        while (head := self._peek()) is not None and head[0] <= now:
+            user = head[1]
+            count = counts.get(user.service, 0)
+            extra = cost(user.service, count + 1) - cost(user.service, count)
+            if self.budget.delay(spent + extra) > 0:
+                self._needed = extra
+                break
+
+            heapq.heappop(self._heap)
+            del self._due[user]
+            counts[user.service] = count + 1
+            spent += extra
+            taken.append(user)
+
+        if spent:
+            self.budget.consume(spent)
+        return taken
+
+    def record(self, user: TrackedUser, active: bool) -> None:
+        """Schedules the next poll of a user depending on whether the last one found new activities."""
+        if user not in self._intervals:
+            return
+
+        interval = self.min_interval if active else min(self._intervals[user] * self.backoff, self.max_interval)
+        self._intervals[user] = interval
+        self._schedule(user, self.clock() + interval)
+
+    def wait_time(self) -> Optional[float]:
+        """Seconds until a user can be polled, or None when nobody is scheduled."""
+        head = self._peek()
+        if head is None:
+            return None
+
+        return max(head[0] - self.clock(), self.budget.delay(self._needed))
+
+    def is_pending(self, user: TrackedUser) -> bool:
+        """Whether a tracked user was taken by `pop_due` and not rescheduled yet."""
+        return user in self._intervals and user not in self._due
+
+    def stats(self) -> SchedulerStats:
+        now = self.clock()
+        intervals = sorted(self._intervals.values())
+        return SchedulerStats(
+            users=len(intervals),
+            due=sum(1 for due in self._due.values() if due <= now),
+            median_interval=intervals[len(intervals) // 2] if intervals else 0.0,
+            tokens=self.budget.tokens,
+        )
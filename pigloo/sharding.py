@@ -0,0 +1,76 @@
+from typing import Any, Optional, Sequence
+
+from pigloo.config import config
+
+
+def shard_for(guild_id: Optional[int], shard_count: int) -> int:
+    """Shard whose gateway connection receives the events of a guild, as computed by Discord.
+
+    Direct messages always go through shard 0.
+    """
+    if guild_id is None:
+        return 0
+    return (guild_id >> 22) % shard_count
+
+
+class ShardPartition:
+    """Guilds handled by this process when the bot runs on several gateway shards.
+
+    Without explicit `shard_ids`, the process runs every shard and owns every guild.
+    """
+
+    def __init__(self, shard_ids: Optional[Sequence[int]] = None, shard_count: Optional[int] = None) -> None:
+        if shard_ids is not None and shard_count is None:
+            raise ValueError("shard_count is required along with shard_ids")
+        self.shard_ids = sorted(shard_ids) if shard_ids is not None else None
+        self.shard_count = shard_count
+
+    @classmethod
+    def from_config(cls) -> Optional["ShardPartition"]:
+        """Reads the [SHARDING] section, returning None unless sharding is enabled."""
+        if not config.getboolean("SHARDING", "enabled", fallback=False):
+            return None
+
+        shard_count = config.get("SHARDING", "shard_count", fallback="")
+        shard_ids = config.get("SHARDING", "shard_ids", fallback="")
+        return cls(
+            shard_ids=[int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids.strip() else None,
+            shard_count=int(shard_count) if shard_count.strip() else None,
+        )
+
+    @property
+    def partial(self) -> bool:
+        """Whether other processes run some of the shards."""
+        return self.shard_ids is not None and len(self.shard_ids) < self.shard_count
+
+    @property
+    def scope(self) -> str:
+        """Name of the shards of this process, empty when it runs every shard."""
+        if not self.partial:
+            return ""
+        return f"{','.join(map(str, self.shard_ids))}/{self.shard_count}"
+
+    @property
+    def share(self) -> float:
+        """Fraction of the shards run by this process."""
+        if not self.partial:
+            return 1.0
+        return len(self.shard_ids) / self.shard_count
+
+    def sql_filter(self, column: str) -> tuple[str, list[int]]:
+        """SQL condition, and its parameters, selecting the rows whose guild `column` is owned."""
+        if not self.partial:
+            return "1", []
+
+        placeholders = ", ".join("?" * len(self.shard_ids))
+        condition = f"COALESCE(({column} >> 22) % ?, 0) IN ({placeholders})"
+        return condition, [self.shard_count, *self.shard_ids]
+
+    def client_options(self) -> dict[str, Any]:
+        """Keyword arguments given to `AutoShardedBot`. Missing ones are detected by discord.py."""
+        options = {}
+        if self.shard_count is not None:
+            options["shard_count"] = self.shard_count
+        if self.shard_ids is not None:
+            options["shard_ids"] = self.shard_ids
+        return options
@@ -0,0 +1,51 @@
+import pkgutil
+import time
+from importlib import import_module
+from typing import Optional
+
+from loguru import logger
+
+# Taken when the bot module starts importing its dependencies
+IMPORTED_AT = time.perf_counter()
+
+
+def discover_cogs(package: str = "pigloo.cogs") -> list[str]:
+    """Names of the extension modules of a package, sorted so that cogs always load in the same order.
+
+    Modules are found from the package itself, whatever the working directory.
+    """
+    path = import_module(package).__path__
+    return sorted(f"{package}.{module.name}" for module in pkgutil.iter_modules(path) if not module.ispkg)
+
+
+class StartupProfile:
+    """Records how long each startup phase takes, from the first import of the bot to `on_ready`.
+
+    Does nothing unless enabled, so that marking phases costs nothing in production.
+    """
+
+    def __init__(self, enabled: bool, started_at: float = IMPORTED_AT) -> None:
+        self.enabled = enabled
+        self.started_at = started_at
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """Records the end of a phase."""
+        if self.enabled:
+            self.phases.append((phase, time.perf_counter()))
+
+    def report(self) -> Optional[str]:
+        if not self.enabled or not self.phases:
+            return None
+
+        lines = []
+        previous = self.started_at
+        for phase, ended_at in self.phases:
+            lines.append(f"{phase}: {ended_at - previous:.3f}s (at {ended_at - self.started_at:.3f}s)")
+            previous = ended_at
+        return "\n".join(lines)
+
+    def log(self) -> None:
+        report = self.report()
+        if report is not None:
+            logger.info(f"Startup profile:\n{report}")
@@ -0,0 +1,47 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class Database:
+    """SQLite database whose statements all run on one dedicated thread.
+
+    The connection is opened lazily in WAL mode and never leaves its thread, so the
+    stores built on top of it can be awaited without blocking the event loop.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pigloo-db")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            logger.info(f"Opening database {self.path}")
+            self._connection = sqlite3.connect(self.path)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def _call(self, fn: Callable[..., T], args: tuple) -> T:
+        connection = self._connect()
+        with connection:
+            return fn(connection, *args)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Runs `fn(connection, *args)` in a transaction on the database thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, args)
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,180 @@
+import sqlite3
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+from loguru import logger
+from pydantic import BaseModel, ConfigDict
+
+from pigloo.feed import Feed, TrackedUser
+from pigloo.sharding import ShardPartition
+from pigloo.storage import Database
+
+
+class Subscription(BaseModel):
+    """A Discord channel following a tracked user."""
+
+    model_config = ConfigDict(frozen=True)
+
+    channel_id: int
+    guild_id: Optional[int]
+    user: TrackedUser
+
+
+def _create_table(connection: sqlite3.Connection, condition: str, parameters: list[int]) -> list[tuple]:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            channel_id INTEGER NOT NULL,
+            guild_id INTEGER,
+            service TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            PRIMARY KEY (channel_id, service, user_id)
+        ) WITHOUT ROWID
+        """
+    )
+    return connection.execute(
+        f"SELECT channel_id, guild_id, service, user_id, user_name FROM subscriptions WHERE {condition}", parameters
+    ).fetchall()
+
+
+def _create_digest_table(connection: sqlite3.Connection, condition: str, parameters: list[int]) -> list[tuple]:
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS digest_channels (
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER
+        )
+        """
+    )
+    return connection.execute(f"SELECT channel_id FROM digest_channels WHERE {condition}", parameters).fetchall()
+
+
+def _set_digest(connection: sqlite3.Connection, channel_id: int, guild_id: Optional[int], enabled: bool) -> None:
+    if enabled:
+        connection.execute(
+            "INSERT OR REPLACE INTO digest_channels (channel_id, guild_id) VALUES (?, ?)", (channel_id, guild_id)
+        )
+    else:
+        connection.execute("DELETE FROM digest_channels WHERE channel_id = ?", (channel_id,))
+
+
+def _insert(connection: sqlite3.Connection, subscription: Subscription) -> None:
+    user = subscription.user
+    connection.execute(
+        """
+        INSERT OR REPLACE INTO subscriptions (channel_id, guild_id, service, user_id, user_name)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (subscription.channel_id, subscription.guild_id, user.service, user.id, user.name),
+    )
+
+
+def _delete(connection: sqlite3.Connection, channel_id: int, user: TrackedUser) -> None:
+    connection.execute(
+        "DELETE FROM subscriptions WHERE channel_id = ? AND service = ? AND user_id = ?",
+        (channel_id, user.service, user.id),
+    )
+
+
+class SubscriptionStore:
+    """Persists which channels follow which tracked users.
+
+    Subscriptions are loaded in bulk at startup into two in-memory indexes kept up to date
+    on every change: one from (service, user UUID) to the subscribed channels, used to route
+    each feed with a single lookup, and one from channel to its tracked users. When the bot
+    runs on several processes, each one only loads the subscriptions of its own guilds.
+    """
+
+    def __init__(self, database: Database, partition: Optional[ShardPartition] = None) -> None:
+        self.database = database
+        self.partition = partition or ShardPartition()
+        self._channels: dict[tuple[str, uuid.UUID], set[int]] = defaultdict(set)
+        self._users: dict[tuple[str, uuid.UUID], TrackedUser] = {}
+        self._subscriptions: dict[int, dict[TrackedUser, Subscription]] = defaultdict(dict)
+        self._digests: set[int] = set()
+
+    async def load(self) -> None:
+        rows = await self.database.run(_create_table, *self.partition.sql_filter("guild_id"))
+        digests = await self.database.run(_create_digest_table, *self.partition.sql_filter("guild_id"))
+        self._digests = {channel_id for (channel_id,) in digests}
+        self._channels.clear()
+        self._users.clear()
+        self._subscriptions.clear()
+        for channel_id, guild_id, service, user_id, user_name in rows:
+            user = TrackedUser(service=service, id=user_id, name=user_name)
+            self._index(Subscription(channel_id=channel_id, guild_id=guild_id, user=user))
+        logger.info(f"Loaded {len(rows)} subscriptions for {len(self._users)} tracked users")
+
+    def _index(self, subscription: Subscription) -> None:
+        user = subscription.user
+        key = (user.service, user.uuid)
+        self._channels[key].add(subscription.channel_id)
+        self._users[key] = user
+        self._subscriptions[subscription.channel_id][user] = subscription
+
+    def _unindex(self, channel_id: int, user: TrackedUser) -> None:
+        key = (user.service, user.uuid)
+        channels = self._channels[key]
+        channels.discard(channel_id)
+        if not channels:
+            del self._channels[key]
+            del self._users[key]
+
+        subscriptions = self._subscriptions[channel_id]
+        del subscriptions[user]
+        if not subscriptions:
+            del self._subscriptions[channel_id]
+
+    def channels_for(self, feed: Feed) -> set[int]:
+        """Returns the channels subscribed to the author of the given feed."""
+        return self._channels.get((feed.service.name, feed.user.id), set())
+
+    def users(self) -> list[TrackedUser]:
+        """Returns every user followed by at least one channel."""
+        return list(self._users.values())
+
+    def subscriptions(self, channel_id: int) -> list[Subscription]:
+        return list(self._subscriptions.get(channel_id, {}).values())
+
+    def find(self, channel_id: int, service: str, name: str) -> Optional[TrackedUser]:
+        """Finds a user followed by the given channel from its name, case-insensitively."""
+        name = name.casefold()
+        for user in self._subscriptions.get(channel_id, {}):
+            if user.service == service and user.name.casefold() == name:
+                return user
+        return None
+
+    def is_digest(self, channel_id: int) -> bool:
+        """Whether a channel gets a periodic summary of its feeds instead of a message per feed."""
+        return channel_id in self._digests
+
+    async def set_digest(self, channel_id: int, guild_id: Optional[int], enabled: bool) -> None:
+        if enabled == self.is_digest(channel_id):
+            return
+
+        await self.database.run(_set_digest, channel_id, guild_id, enabled)
+        if enabled:
+            self._digests.add(channel_id)
+        else:
+            self._digests.discard(channel_id)
+
+    async def add(self, channel_id: int, guild_id: Optional[int], user: TrackedUser) -> bool:
+        """Subscribes a channel to a user. Returns False if it was already subscribed."""
+        if user in self._subscriptions.get(channel_id, {}):
+            return False
+
+        subscription = Subscription(channel_id=channel_id, guild_id=guild_id, user=user)
+        await self.database.run(_insert, subscription)
+        self._index(subscription)
+        return True
+
+    async def remove(self, channel_id: int, user: TrackedUser) -> bool:
+        """Unsubscribes a channel from a user. Returns False if it was not subscribed."""
+        if user not in self._subscriptions.get(channel_id, {}):
+            return False
+
+        await self.database.run(_delete, channel_id, user)
+        self._unindex(channel_id, user)
+        return True
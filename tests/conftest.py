@@ -1,12 +1,141 @@
 import glob
 import os
+import uuid
+from datetime import datetime, timezone
 
+import aiohttp
 import discord
 import discord.ext.test as dpytest
 import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from discord.client import _LoopSentinel
 
 import pigloo.bot
+from pigloo.config import config
+from pigloo.cursors import Cursor
+from pigloo.feed import Anime, Feed, FeedStatus, Service, TrackedUser
+from pigloo.storage import Database
+
+# Keep the bot's persistent stores out of the working directory during tests
+config.read_dict({"STORAGE": {"database": ":memory:"}, "DEDUP": {"snapshot": ""}, "DISPATCH": {"coalesce_hold": "0"}})
+
+
+ANILIST = Service(id=uuid.uuid4(), name="AniList")
+
+
+def make_feed(user: TrackedUser) -> Feed:
+    return Feed(
+        id=uuid.uuid4(),
+        user={"id": user.uuid, "name": user.name, "service": ANILIST},
+        service=ANILIST,
+        media=Anime(
+            id=uuid.uuid4(),
+            name="Test Anime",
+            service=ANILIST,
+            max_progress=12,
+            url="https://anilist.co/anime/1",
+            image="https://img.anili.st/media/anime/1.jpg",
+            format="TV",
+        ),
+        progress=5,
+        datetime=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        status=FeedStatus(label="Watching"),
+    )
+
+
+def make_activity(activity_id: int, user_id: int, status: str, progress, media_type: str = "ANIME") -> dict:
+    return {
+        "id": activity_id,
+        "status": status,
+        "progress": progress,
+        "createdAt": 1704067200 + activity_id,
+        "user": {"id": user_id, "name": f"user{user_id}"},
+        "media": {
+            "id": 100 + activity_id,
+            "type": media_type,
+            "format": "TV" if media_type == "ANIME" else "MANGA",
+            "episodes": 12 if media_type == "ANIME" else None,
+            "chapters": None if media_type == "ANIME" else 24,
+            "siteUrl": f"https://anilist.co/{media_type.lower()}/{100 + activity_id}",
+            "title": {"userPreferred": f"Media {activity_id}"},
+            "coverImage": {"large": f"https://img.anili.st/media/{100 + activity_id}.jpg"},
+        },
+    }
+
+
+ACTIVITIES = {
+    1: [make_activity(11, 1, "watched episode", "3 - 5"), make_activity(10, 1, "completed", None)],
+    2: [make_activity(20, 2, "plans to read", None, media_type="MANGA")],
+    3: [],
+}
+MEDIA = {activity["media"]["id"]: activity["media"] for activities in ACTIVITIES.values() for activity in activities}
+
+
+class FakeAniList:
+    """Local stand-in for the AniList GraphQL endpoint, answering aliased activity queries and media lookups."""
+
+    def __init__(self) -> None:
+        self.requests = []
+        self.media_requests = []
+        self.media_down = False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        variables = payload["variables"]
+        if "ids" in variables:
+            self.media_requests.append(variables["ids"])
+            if self.media_down:
+                return web.json_response({"data": None, "errors": [{"message": "Internal Server Error"}]}, status=500)
+            media = [MEDIA[id] for id in variables["ids"] if id in MEDIA]
+            return web.json_response({"data": {"Page": {"media": media}}})
+
+        self.requests.append(payload)
+        data = {}
+        for alias in (name for name in variables if name.startswith("u")):
+            index = alias[1:]
+            cursor = variables[f"c{index}"]
+            activities = [a for a in ACTIVITIES.get(variables[alias], []) if cursor is None or a["id"] > cursor]
+            activities.sort(key=lambda a: a["id"], reverse=variables[f"s{index}"] == "ID_DESC")
+            data[alias] = {"activities": activities[: variables[f"p{index}"]]}
+        return web.json_response({"data": data})
+
+
+@pytest_asyncio.fixture
+async def anilist():
+    fake = FakeAniList()
+    app = web.Application()
+    app.router.add_post("/", fake.handle)
+    server = TestServer(app)
+    await server.start_server()
+    fake.url = str(server.make_url("/"))
+
+    yield fake
+
+    await server.close()
+
+
+@pytest_asyncio.fixture
+async def session():
+    async with aiohttp.ClientSession() as s:
+        yield s
+
+
+def tracked(user_id: int) -> TrackedUser:
+    return TrackedUser(service="AniList", id=str(user_id), name=f"user{user_id}")
+
+
+def cursor(last_id: int) -> Cursor:
+    return Cursor(last_id=last_id, last_timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+
+@pytest_asyncio.fixture
+async def database(tmp_path):
+    db = Database(str(tmp_path / "pigloo.db"))
+
+    yield db
+
+    await db.close()
 
 
 @pytest_asyncio.fixture
@@ -31,6 +160,9 @@ async def bot(request):
 
     # Teardown
     await dpytest.empty_queue()  # empty the global message queue as test teardown
+    await b.session.close()
+    await b.outbox.close()
+    await b.database.close()
 
 
 def pytest_sessionfinish(session, exitstatus):
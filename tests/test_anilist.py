@@ -0,0 +1,202 @@
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+
+from pigloo.cursors import CursorStore
+from pigloo.dispatcher import TokenBucket
+from pigloo.feed import (
+    Anime,
+    CompletedStatus,
+    Manga,
+    PlanToReadStatus,
+    WatchingStatus,
+    stable_uuid,
+)
+from pigloo.poller import FeedPoller
+from pigloo.providers.anilist import AniListProvider, build_activities_query, parse_progress
+from pigloo.storage import Database
+from tests.conftest import MEDIA, cursor, tracked
+
+
+@pytest_asyncio.fixture
+async def cursors():
+    database = Database(":memory:")
+    store = CursorStore(database)
+    await store.load()
+
+    yield store
+
+    await database.close()
+
+
+def test_build_activities_query_aliases_every_user():
+    user1, user2 = tracked(1), tracked(2)
+    query, variables = build_activities_query([user1, user2], {user2: cursor(7)}, per_page=5)
+
+    assert variables == {
+        "u0": 1, "c0": None, "p0": 1, "s0": "ID_DESC",
+        "u1": 2, "c1": 7, "p1": 5, "s1": "ID",
+    }  # fmt: skip
+    assert "query ($u0: Int, $c0: Int, $p0: Int, $s0: ActivitySort, $u1: Int" in query
+    assert "u0: Page(perPage: $p0)" in query
+    assert "userId: $u1, id_greater: $c1" in query
+
+
+@pytest.mark.parametrize(
+    "progress, expected", [("3", (3, 3)), ("3 - 7", (3, 7)), (None, (None, None)), ("", (None, None))]
+)
+def test_parse_progress(progress, expected):
+    assert parse_progress(progress) == expected
+
+
+@pytest.mark.asyncio
+async def test_fetch_activities_batches_users(anilist, session):
+    provider = AniListProvider(session, api_url=anilist.url, batch_size=2)
+    users = [tracked(1), tracked(2), tracked(3)]
+
+    activities = await provider.fetch_activities(users, {user: cursor(0) for user in users})
+
+    assert len(anilist.requests) == 2
+    assert [len(activities[user].feeds) for user in users] == [2, 1, 0]
+    assert [activities[user].cursor.last_id for user in users] == [11, 20, 0]
+
+    completed, watching = activities[users[0]].feeds
+    assert watching.id == stable_uuid("AniList", "activity", 11)
+    assert watching.user.id == stable_uuid("AniList", "user", 1)
+    assert isinstance(watching.media, Anime)
+    assert isinstance(watching.status, WatchingStatus)
+    assert watching.progress == 5
+    assert watching.progress_from == 3
+    assert watching.datetime == datetime.fromtimestamp(1704067211, tz=timezone.utc)
+    assert isinstance(completed.status, CompletedStatus)
+
+    (planned,) = activities[users[1]].feeds
+    assert isinstance(planned.media, Manga)
+    assert planned.media.max_progress == 24
+    assert isinstance(planned.status, PlanToReadStatus)
+
+
+@pytest.mark.asyncio
+async def test_fetch_activities_only_newer_than_cursor(anilist, session):
+    provider = AniListProvider(session, api_url=anilist.url)
+    user = tracked(1)
+
+    activities = await provider.fetch_activities([user], {user: cursor(10)})
+
+    assert [feed.id for feed in activities[user].feeds] == [stable_uuid("AniList", "activity", 11)]
+    assert activities[user].cursor.last_id == 11
+
+
+@pytest.mark.asyncio
+async def test_fetch_activities_seeds_new_users(anilist, session):
+    provider = AniListProvider(session, api_url=anilist.url)
+    user = tracked(1)
+
+    activities = await provider.fetch_activities([user], {})
+
+    assert activities[user].feeds == []
+    assert activities[user].cursor.last_id == 11
+
+
+@pytest.mark.asyncio
+async def test_fetch_activities_server_error(session):
+    provider = AniListProvider(session, api_url="http://127.0.0.1:9/")
+
+    assert await provider.fetch_activities([tracked(1)], {}) == {}
+
+
+@pytest.mark.asyncio
+async def test_poller_sends_feeds_oldest_first(anilist, session, cursors):
+    received = []
+
+    async def sink(feeds):
+        received.extend(feeds)
+
+    users = [tracked(1), tracked(2)]
+    provider = AniListProvider(session, api_url=anilist.url)
+    poller = FeedPoller({"AniList": provider}, cursors, users=lambda: users, sink=sink, interval=60)
+    await cursors.update({user: cursor(0) for user in users})
+
+    feeds = await poller.poll_once()
+
+    assert feeds == received
+    assert [feed.id for feed in received] == [stable_uuid("AniList", "activity", i) for i in (10, 11, 20)]
+    assert len(anilist.requests) == 1
+    assert [cursors.get(user).last_id for user in users] == [11, 20]
+
+    # Nothing new since the cursors moved
+    assert await poller.poll_once() == []
+
+
+@pytest.mark.asyncio
+async def test_poller_keeps_cursors_when_sink_fails(anilist, session, cursors):
+    async def sink(feeds):
+        raise RuntimeError("Discord is down")
+
+    user = tracked(1)
+    provider = AniListProvider(session, api_url=anilist.url)
+    poller = FeedPoller({"AniList": provider}, cursors, users=lambda: [user], sink=sink, interval=60)
+    await cursors.update({user: cursor(0)})
+
+    with pytest.raises(RuntimeError):
+        await poller.poll_once()
+
+    assert cursors.get(user).last_id == 0
+
+
+@pytest.mark.asyncio
+async def test_media_are_resolved_once(anilist, session):
+    provider = AniListProvider(session, api_url=anilist.url)
+    user = tracked(1)
+
+    # Act
+    await provider.fetch_activities([user], {user: cursor(0)})
+    activities = await provider.fetch_activities([user], {user: cursor(0)})
+
+    # Assert
+    assert anilist.media_requests == [[110, 111]]
+    assert activities[user].feeds[0].media.name == "Media 10"
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_taken_from_the_budget(anilist, session):
+    budget = TokenBucket(10, 60)
+    provider = AniListProvider(session, api_url=anilist.url, budget=budget)
+    user = tracked(1)
+
+    # Act
+    await provider.fetch_activities([user], {user: cursor(0)})
+    await provider.fetch_activities([user], {user: cursor(0)})
+
+    # Assert
+    assert anilist.media_requests == [[110, 111]]
+    assert 8.9 < budget.tokens < 9.1
+
+
+@pytest.mark.asyncio
+async def test_unresolved_media_keep_the_cursor(anilist, session):
+    provider = AniListProvider(session, api_url=anilist.url)
+    user = tracked(1)
+    anilist.media_down = True
+
+    # Act
+    activities = await provider.fetch_activities([user], {user: cursor(0)})
+
+    # Assert
+    assert activities[user].feeds == []
+    assert activities[user].cursor.last_id == 0
+
+
+@pytest.mark.asyncio
+async def test_activities_of_missing_media_are_skipped(anilist, session, monkeypatch):
+    provider = AniListProvider(session, api_url=anilist.url)
+    user = tracked(1)
+    monkeypatch.delitem(MEDIA, 111)
+
+    # Act
+    activities = await provider.fetch_activities([user], {user: cursor(0)})
+
+    # Assert
+    assert [feed.id for feed in activities[user].feeds] == [stable_uuid("AniList", "activity", 10)]
+    assert activities[user].cursor.last_id == 11
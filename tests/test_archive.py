@@ -0,0 +1,224 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+
+from pigloo.archive import ActivityArchive, cursor_after
+from pigloo.bot import PiglooBot
+from pigloo.cogs.commands import HistoryView
+from pigloo.feed import CompletedStatus, Feed, TrackedUser
+from pigloo.storage import Database
+from tests.conftest import make_feed
+
+ALICE = TrackedUser(service="AniList", id="1", name="Alice")
+BOB = TrackedUser(service="AniList", id="2", name="Bob")
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_feeds(user: TrackedUser, count: int, media=None) -> list[Feed]:
+    feed = make_feed(user)
+    return [
+        feed.model_copy(
+            update={
+                "id": uuid.uuid4(),
+                "media": media or feed.media,
+                "progress": index + 1,
+                # Pairs of feeds share their date, ordered by id
+                "datetime": START + timedelta(hours=index // 2),
+            }
+        )
+        for index in range(count)
+    ]
+
+
+@pytest_asyncio.fixture
+async def archive(tmp_path):
+    db = Database(str(tmp_path / "pigloo.db"))
+    archive = ActivityArchive(db, flush_interval=60)
+    await archive.load()
+
+    yield archive
+
+    await archive.close()
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_history_pages_do_not_overlap(archive):
+    # Arrange
+    feeds = make_feeds(ALICE, 25)
+    archive.add(feeds)
+    archive.add(make_feeds(BOB, 5))
+
+    # Act
+    pages = []
+    cursor = None
+    while page := await archive.user_history(str(ALICE.uuid), cursor, limit=10):
+        pages.append(page)
+        cursor = cursor_after(page[-1])
+
+    # Assert
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ids = [activity.id for page in pages for activity in page]
+    assert sorted(ids) == sorted(str(feed.id) for feed in feeds)
+    assert [activity.datetime for page in pages for activity in page] == sorted(
+        (feed.datetime for feed in feeds), reverse=True
+    )
+    assert pages[0][0].progress == "25 of 12 episodes"
+
+
+@pytest.mark.asyncio
+async def test_media_history_is_limited_to_the_given_users(archive):
+    # Arrange
+    carol = TrackedUser(service="AniList", id="3", name="Carol")
+    alice = make_feeds(ALICE, 3)
+    media = alice[0].media
+    archive.add(alice)
+    archive.add(make_feeds(BOB, 2, media=media))
+    archive.add(make_feeds(carol, 4, media=media))
+    users = [str(ALICE.uuid), str(BOB.uuid)]
+
+    # Act
+    media_id = await archive.find_media(users, "test ani")
+    history = await archive.media_history(media_id, users)
+
+    # Assert
+    assert media_id == str(media.id)
+    assert sorted(activity.user_name for activity in history) == ["Alice"] * 3 + ["Bob"] * 2
+    assert await archive.find_media(users, "anime") == media_id
+    assert await archive.find_media(users, "nime") is None
+    assert await archive.find_media(users, "unknown") is None
+    assert await archive.find_media(users, '"test" OR %_') is None
+    assert await archive.find_media([str(uuid.uuid4())], "test ani") is None
+
+
+@pytest.mark.asyncio
+async def test_renamed_media_are_found_by_their_latest_name(archive):
+    # Arrange
+    users = [str(ALICE.uuid)]
+    feeds = make_feeds(ALICE, 2)
+    archive.add(feeds[:1])
+    await archive.flush()
+    renamed = feeds[1].model_copy(update={"media": feeds[1].media.model_copy(update={"name": "Renamed Show"})})
+
+    # Act
+    archive.add([renamed])
+    found = await archive.find_media(users, "renamed")
+    forgotten = await archive.find_media(users, "test ani")
+
+    # Assert
+    assert found == str(renamed.media.id)
+    assert forgotten is None
+
+
+@pytest.mark.asyncio
+async def test_stats_count_recent_updates(archive):
+    # Arrange
+    feeds = make_feeds(ALICE, 6)
+    feeds[-1] = feeds[-1].model_copy(update={"status": CompletedStatus()})
+    other = make_feeds(ALICE, 2)
+    archive.add(feeds + other)
+
+    # Act
+    stats = await archive.stats(str(ALICE.uuid), START + timedelta(hours=1))
+
+    # Assert
+    assert stats.updates == 4
+    assert stats.media == 1
+    assert stats.statuses == [("Watching", 3), ("Completed", 1)]
+    assert [count for _, _, count in stats.top_media] == [4]
+
+
+@pytest.mark.asyncio
+async def test_queries_only_read_indexes(archive):
+    # Arrange
+    def plans(connection):
+        queries = [
+            (
+                "SELECT id, datetime, user_name, service, media_name, media_url, status, progress FROM activity "
+                "WHERE user_id = ? AND (datetime, id) < (?, ?) ORDER BY datetime DESC, id DESC LIMIT 10",
+                ("u", 1, "x"),
+            ),
+            (
+                "SELECT id, datetime, user_name, service, media_name, media_url, status, progress FROM activity "
+                "WHERE media_id = ? AND user_id IN (SELECT value FROM json_each(?)) "
+                "AND (datetime, id) < (?, ?) ORDER BY datetime DESC, id DESC LIMIT 10",
+                ("m", '["u"]', 1, "x"),
+            ),
+            (
+                "SELECT activity.media_id FROM media_search "
+                "JOIN media_names ON media_names.rowid = media_search.rowid "
+                "JOIN activity ON activity.media_id = media_names.media_id "
+                "WHERE media_search MATCH ? AND activity.user_id IN (SELECT value FROM json_each(?)) "
+                "ORDER BY activity.datetime DESC LIMIT 1",
+                ('"x"*', '["u"]'),
+            ),
+        ]
+        return [" ".join(row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {q}", p)) for q, p in queries]
+
+    # Act
+    user_plan, media_plan, search_plan = await archive.database.run(plans)
+
+    # Assert
+    assert "PRIMARY KEY (user_id=? AND (datetime,id)<(?,?))" in user_plan
+    assert "COVERING INDEX activity_media" in media_plan
+    assert "TEMP B-TREE" not in user_plan + media_plan
+    assert "VIRTUAL TABLE INDEX" in search_plan
+    assert "COVERING INDEX activity_media (media_id=?)" in search_plan
+    assert "SCAN activity" not in search_plan
+
+
+@pytest.mark.asyncio
+async def test_feeds_are_inserted_in_batches(tmp_path):
+    # Arrange
+    db = Database(str(tmp_path / "pigloo.db"))
+    archive = ActivityArchive(db, flush_interval=60, batch_size=10)
+    await archive.load()
+
+    # Act
+    archive.add(make_feeds(ALICE, 5))
+    buffered = len(archive._rows)
+    archive.add(make_feeds(ALICE, 5))
+    buffered_after_batch = len(archive._rows)
+    await archive.close()
+    count = await db.run(lambda connection: connection.execute("SELECT count(*) FROM activity").fetchone()[0])
+    await db.close()
+
+    # Assert
+    assert buffered == 5
+    assert buffered_after_batch == 0
+    assert count == 10
+
+
+@pytest.mark.asyncio
+async def test_history_view_disables_older_on_the_last_page(archive):
+    # Arrange
+    archive.add(make_feeds(ALICE, 7))
+    view = HistoryView(lambda before, limit: archive.user_history(str(ALICE.uuid), before, limit), "History", 5)
+
+    # Act
+    first = await view.next_page()
+    more = not view.older.disabled
+    second = await view.next_page()
+
+    # Assert
+    assert more
+    assert first.description.count("\n") == 4
+    assert second.description.count("\n") == 1
+    assert view.older.disabled
+
+
+@pytest.mark.asyncio
+async def test_published_feeds_are_archived(bot: PiglooBot):
+    # Arrange
+    feeds = make_feeds(ALICE, 3)
+
+    # Act
+    await bot.publish_feeds(feeds)
+    history = await bot.archive.user_history(str(ALICE.uuid))
+
+    # Assert
+    assert [activity.id for activity in history] == [
+        str(feed.id) for feed in sorted(feeds, key=lambda feed: (feed.datetime, str(feed.id)), reverse=True)
+    ]
@@ -0,0 +1,132 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pigloo.coalesce import FeedCoalescer, coalesce_feeds
+from pigloo.embed import EmbedRenderer
+from pigloo.feed import Anime, Feed, FeedStatus, Manga, Service, User
+from pigloo.outbox import OutboxEntry
+
+SERVICE = Service(id=uuid.uuid4(), name="AniList")
+ALICE = User(id=uuid.uuid4(), name="alice", service=SERVICE)
+BOB = User(id=uuid.uuid4(), name="bob", service=SERVICE)
+SHOW = Anime(
+    id=uuid.uuid4(),
+    name="Test Anime",
+    service=SERVICE,
+    max_progress=12,
+    url="https://anilist.co/anime/1",
+    image="https://img.anili.st/media/anime/1.jpg",
+    format="TV",
+)
+OTHER_SHOW = SHOW.model_copy(update={"id": uuid.uuid4(), "name": "Other Anime"})
+WINDOW = timedelta(hours=1)
+
+
+def make_feed(user: User, media: Anime, progress: int, minute: int, label: str = "watched episode") -> Feed:
+    return Feed(
+        id=uuid.uuid4(),
+        user=user,
+        service=SERVICE,
+        media=media,
+        progress=progress,
+        datetime=datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minute),
+        status=FeedStatus(label=label),
+    )
+
+
+def test_episode_burst_becomes_one_feed():
+    feeds = [make_feed(ALICE, SHOW, progress, minute=progress * 20) for progress in range(3, 8)]
+
+    # Act
+    (merged,) = coalesce_feeds(feeds, WINDOW)
+
+    # Assert
+    assert merged.id == feeds[-1].id
+    assert (merged.progress_from, merged.progress) == (3, 7)
+    assert EmbedRenderer().render(merged).description.endswith("```Watching | 3–7 of 12 episodes```")
+
+
+def test_only_consecutive_updates_are_merged():
+    feeds = [
+        make_feed(ALICE, SHOW, 1, minute=0),
+        make_feed(BOB, SHOW, 1, minute=1),  # Another user does not break Alice's burst
+        make_feed(ALICE, SHOW, 2, minute=2),
+        make_feed(ALICE, OTHER_SHOW, 1, minute=3),
+        make_feed(ALICE, SHOW, 3, minute=4),
+        make_feed(ALICE, SHOW, 12, minute=5, label="completed"),
+        make_feed(ALICE, SHOW, 12, minute=200, label="completed"),
+    ]
+
+    # Act
+    merged = coalesce_feeds(feeds, WINDOW)
+
+    # Assert
+    assert [(feed.user.name, feed.media.name, feed.progress_from, feed.progress) for feed in merged] == [
+        ("bob", "Test Anime", None, 1),
+        ("alice", "Test Anime", 1, 2),
+        ("alice", "Other Anime", None, 1),
+        ("alice", "Test Anime", None, 3),
+        ("alice", "Test Anime", None, 12),
+        ("alice", "Test Anime", None, 12),
+    ]
+
+
+def entry(feed: Feed, channel_id: int = 1) -> OutboxEntry:
+    return OutboxEntry(f"{feed.id}:{channel_id}", channel_id, feed)
+
+
+@pytest.mark.asyncio
+async def test_updates_polled_separately_are_merged_during_the_hold():
+    delivered = []
+    superseded = []
+    coalescer = FeedCoalescer(0.05, WINDOW, delivered.extend, superseded.extend)
+    first, second, third = (make_feed(ALICE, SHOW, progress, minute=progress * 20) for progress in range(3, 6))
+    other = make_feed(BOB, SHOW, 1, minute=0)
+
+    # Act
+    coalescer.add([entry(first), entry(other)])
+    coalescer.add([entry(second)])
+    coalescer.add([entry(third), entry(third, channel_id=2)])
+    held = list(delivered)
+    await asyncio.sleep(0.1)
+
+    # Assert
+    assert held == []
+    assert [(e.channel_id, e.feed.user.name, e.feed.progress_from, e.feed.progress) for e in delivered] == [
+        (1, "alice", 3, 5),
+        (1, "bob", None, 1),
+        (2, "alice", None, 5),
+    ]
+    assert delivered[0].key == entry(third).key
+    assert superseded == [entry(first).key, entry(second).key]
+    assert coalescer.merged == 2
+
+
+@pytest.mark.asyncio
+async def test_flush_releases_held_updates_in_order():
+    delivered = []
+    coalescer = FeedCoalescer(60, WINDOW, delivered.extend, lambda keys: None)
+    feeds = [make_feed(ALICE, SHOW, 1, minute=0), make_feed(ALICE, OTHER_SHOW, 1, minute=1)]
+
+    # Act
+    coalescer.add([entry(feed) for feed in feeds])
+    coalescer.flush()
+
+    # Assert
+    assert [e.feed for e in delivered] == feeds
+
+
+@pytest.mark.parametrize(
+    "media, progress, start, expected",
+    [
+        (SHOW, 7, 3, "3–7 of 12 episodes"),
+        (SHOW, 7, 7, "7 of 12 episodes"),
+        (SHOW, 7, None, "7 of 12 episodes"),
+        (Manga(**SHOW.model_dump(exclude={"kind"})), 9, 4, "4–9 of 12 chapters"),
+    ],
+)
+def test_build_progress_str_with_range(media, progress, start, expected):
+    assert media.build_progress_str(progress, start) == expected
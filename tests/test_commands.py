@@ -0,0 +1,88 @@
+from typing import Optional
+
+import pytest
+
+from pigloo.bot import PiglooBot
+from pigloo.feed import TrackedUser
+
+ALICE = TrackedUser(service="AniList", id="1", name="Alice")
+
+
+class FakeResponse:
+    def __init__(self, log: list) -> None:
+        self.log = log
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def defer(self, *, ephemeral: bool = False, **kwargs) -> None:
+        self.log.append(("defer", ephemeral))
+        self.done = True
+
+    async def send_message(self, content: Optional[str] = None, **kwargs) -> None:
+        self.log.append(("response", content))
+        self.done = True
+
+
+class FakeFollowup:
+    def __init__(self, log: list) -> None:
+        self.log = log
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> None:
+        self.log.append(("followup", content))
+
+
+class FakeInteraction:
+    def __init__(self, channel_id: int, guild_id: int) -> None:
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.log = []
+        self.response = FakeResponse(self.log)
+        self.followup = FakeFollowup(self.log)
+
+
+class FakeProvider:
+    def __init__(self, log: list) -> None:
+        self.log = log
+
+    async def fetch_user(self, username: str) -> Optional[TrackedUser]:
+        self.log.append(("fetch", username))
+        return ALICE if username == ALICE.name else None
+
+
+async def register(bot: PiglooBot, username: str, digest: Optional[bool] = None) -> list:
+    channel = bot.guilds[0].channels[0]
+    inter = FakeInteraction(channel.id, channel.guild.id)
+    bot.providers = {"AniList": FakeProvider(inter.log)}
+    cog = bot.get_cog("PiglooCog")
+    await cog.register.callback(cog, inter, username, "AniList", digest)
+    return inter.log
+
+
+@pytest.mark.asyncio
+async def test_register_defers_before_looking_the_user_up(bot: PiglooBot):
+    # Act
+    log = await register(bot, "Alice")
+
+    # Assert
+    assert log[:2] == [("defer", True), ("fetch", "Alice")]
+    assert log[2][0] == "followup" and log[2][1].startswith("Registering Alice's AniList")
+
+
+@pytest.mark.asyncio
+async def test_register_reports_a_mode_change_of_a_registered_user(bot: PiglooBot):
+    # Arrange
+    await register(bot, "Alice")
+
+    # Act
+    changed = await register(bot, "Alice", digest=True)
+    unchanged = await register(bot, "Alice", digest=True)
+
+    # Assert
+    assert changed[-1] == (
+        "followup",
+        "Alice is already registered in this channel. This channel now gets a periodic digest of its updates.",
+    )
+    assert unchanged[-1] == ("followup", "Alice is already registered in this channel.")
+    assert bot.subscriptions.is_digest(bot.guilds[0].channels[0].id)
@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from pigloo.cursors import Cursor, CursorStore
+from pigloo.feed import TrackedUser
+from pigloo.sharding import ShardPartition
+from pigloo.storage import Database
+
+
+@pytest.mark.asyncio
+async def test_cursors_survive_restart(tmp_path):
+    path = str(tmp_path / "pigloo.db")
+    user = TrackedUser(service="AniList", id="1", name="testuser")
+    cursor = Cursor(last_id=42, last_timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+    # Arrange
+    database = Database(path)
+    store = CursorStore(database)
+    await store.load()
+    assert store.get(user) is None
+
+    # Act
+    await store.update({user: cursor})
+    await database.close()
+
+    restarted = Database(path)
+    restored = CursorStore(restarted)
+    await restored.load()
+
+    # Assert
+    assert restored.get(user) == cursor
+    assert await restarted.run(lambda connection: connection.execute("PRAGMA journal_mode").fetchone()) == ("wal",)
+    await restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_processes_running_other_shards_keep_their_own_cursors(tmp_path):
+    database = Database(str(tmp_path / "pigloo.db"))
+    user = TrackedUser(service="AniList", id="1", name="testuser")
+    shared = Cursor(last_id=1, last_timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    advanced = Cursor(last_id=2, last_timestamp=datetime(2024, 1, 2, tzinfo=timezone.utc))
+
+    # Arrange
+    unsharded = CursorStore(database)
+    await unsharded.load()
+    await unsharded.update({user: shared})
+    first = CursorStore(database, ShardPartition(shard_ids=[0], shard_count=2))
+    await first.load()
+
+    # Act
+    await first.update({user: advanced})
+    second = CursorStore(database, ShardPartition(shard_ids=[1], shard_count=2))
+    await second.load()
+    restarted = CursorStore(database, ShardPartition(shard_ids=[0], shard_count=2))
+    await restarted.load()
+
+    # Assert
+    assert first.get(user) == advanced
+    assert second.get(user) == shared
+    assert restarted.get(user) == advanced
+    await database.close()
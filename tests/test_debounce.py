@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from pigloo.debounce import Debouncer
+
+
+@pytest.mark.asyncio
+async def test_calls_within_the_delay_run_once():
+    # Arrange
+    runs = []
+
+    async def run():
+        runs.append(len(runs))
+
+    debouncer = Debouncer(run, delay=0.01, name="test")
+
+    # Act
+    for _ in range(3):
+        debouncer.schedule()
+    await asyncio.sleep(0.05)
+    debouncer.schedule()
+    await asyncio.sleep(0.05)
+
+    # Assert
+    assert runs == [0, 1]
+    assert not debouncer.scheduled
+
+
+@pytest.mark.asyncio
+async def test_cancel_reports_a_scheduled_run():
+    # Arrange
+    runs = []
+
+    async def run():
+        runs.append(True)
+
+    debouncer = Debouncer(run, delay=60, name="test")
+    debouncer.schedule()
+
+    # Act
+    cancelled = debouncer.cancel()
+    cancelled_again = debouncer.cancel()
+
+    # Assert
+    assert cancelled and not cancelled_again
+    assert runs == []
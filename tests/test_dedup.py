@@ -0,0 +1,187 @@
+import sqlite3
+import uuid
+
+import discord.ext.test as dpytest
+import pytest
+
+from pigloo.bot import PiglooBot
+from pigloo.dedup import FeedDeduplicator, RotatingBloomFilter, _hash
+from pigloo.feed import TrackedUser
+from tests.conftest import make_feed
+
+ALICE = TrackedUser(service="AniList", id="1", name="Alice")
+
+
+def remember(dedup: FeedDeduplicator, feeds: list) -> list:
+    fresh, keys = dedup.filter(feeds)
+    dedup.remember(keys)
+    return fresh
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_duplicates_are_dropped_by_id_and_by_fingerprint():
+    # Arrange
+    dedup = FeedDeduplicator(RotatingBloomFilter(capacity=1000, error_rate=1e-6, window=3600), recent=16)
+    feed = make_feed(ALICE)
+    other = make_feed(ALICE)
+    same_id = other.model_copy(update={"id": feed.id})
+    same_update = feed.model_copy(update={"id": uuid.uuid4()})
+
+    # Act
+    first = remember(dedup, [feed])
+    second, _ = dedup.filter([feed, same_update, same_id])
+
+    # Assert
+    assert first == [feed]
+    assert second == []
+    assert dedup.duplicates == 3
+
+
+def test_bloom_filter_remembers_keys_the_lru_forgot():
+    # Arrange
+    dedup = FeedDeduplicator(RotatingBloomFilter(capacity=1000, error_rate=1e-6, window=3600), recent=2)
+    feeds = [make_feed(ALICE) for _ in range(10)]
+    remember(dedup, feeds)
+
+    # Act
+    fresh, _ = dedup.filter(feeds)
+
+    # Assert
+    assert fresh == []
+
+
+def test_filter_forgets_keys_after_two_windows():
+    # Arrange
+    clock = FakeClock()
+    bloom = RotatingBloomFilter(capacity=1000, error_rate=1e-6, window=60, clock=clock)
+    key = _hash(b"key")
+    bloom.add(key)
+
+    # Act
+    clock.now += 61
+    bloom.add(_hash(b"other"))
+    remembered = key in bloom
+    clock.now += 61
+    bloom.add(_hash(b"another"))
+
+    # Assert
+    assert remembered
+    assert key not in bloom
+
+
+def test_memory_is_fixed_and_false_positives_are_bounded():
+    # Arrange
+    bloom = RotatingBloomFilter(capacity=1000, error_rate=0.01, window=3600)
+    sizes = [len(generation._array) for generation in bloom.generations]
+
+    # Act
+    for index in range(10000):
+        bloom.add(_hash(f"seen{index}".encode()))
+    false_positives = sum(_hash(f"unseen{index}".encode()) in bloom for index in range(10000))
+
+    # Assert
+    assert [len(generation._array) for generation in bloom.generations] == sizes
+    # Two full generations are looked up, each with a 1% error rate
+    assert false_positives < 10000 * 0.03
+
+
+def test_snapshot_survives_restarts(tmp_path):
+    # Arrange
+    path = str(tmp_path / "pigloo.bloom")
+    bloom = RotatingBloomFilter(capacity=1000, error_rate=1e-6, window=3600)
+    bloom.add(_hash(b"key"))
+    bloom.save(path)
+
+    # Act
+    restored = RotatingBloomFilter(capacity=1000, error_rate=1e-6, window=3600)
+    loaded = restored.load(path)
+    other_settings = RotatingBloomFilter(capacity=2000, error_rate=1e-6, window=3600)
+
+    # Assert
+    assert loaded
+    assert _hash(b"key") in restored
+    assert _hash(b"other") not in restored
+    assert not other_settings.load(path)
+    assert not restored.load(str(tmp_path / "missing.bloom"))
+
+
+@pytest.mark.asyncio
+async def test_deduplicator_saves_on_close(tmp_path):
+    # Arrange
+    path = str(tmp_path / "pigloo.bloom")
+    dedup = FeedDeduplicator(RotatingBloomFilter(capacity=1000, error_rate=1e-6, window=3600), snapshot=path)
+    feed = make_feed(ALICE)
+    remember(dedup, [feed])
+
+    # Act
+    await dedup.close()
+    restarted = FeedDeduplicator(RotatingBloomFilter(capacity=1000, error_rate=1e-6, window=3600), snapshot=path)
+    await restarted.load()
+
+    # Assert
+    assert restarted.filter([feed]) == ([], [])
+
+
+@pytest.mark.asyncio
+async def test_feeds_polled_again_are_sent_once(bot: PiglooBot):
+    # Arrange
+    channel = bot.guilds[0].channels[0]
+    await bot.subscriptions.add(channel.id, channel.guild.id, ALICE)
+    feed = make_feed(ALICE)
+
+    # Act
+    await bot.publish_feeds([feed])
+    await bot.publish_feeds([feed.model_copy(update={"id": uuid.uuid4()})])
+    await bot.batcher.flush()
+
+    # Assert
+    assert dpytest.verify().message().embed(bot.renderer.render(feed))
+    assert dpytest.verify().message().nothing()
+
+
+def test_feeds_are_only_remembered_once_stored():
+    # Arrange
+    dedup = FeedDeduplicator(RotatingBloomFilter(capacity=1000, error_rate=1e-6, window=3600))
+    feed = make_feed(ALICE)
+
+    # Act
+    first, _ = dedup.filter([feed, feed])
+    again, keys = dedup.filter([feed])
+    dedup.remember(keys)
+    stored, _ = dedup.filter([feed])
+
+    # Assert
+    assert first == [feed]
+    assert again == [feed]
+    assert stored == []
+
+
+@pytest.mark.asyncio
+async def test_feeds_that_failed_to_be_stored_are_sent_when_polled_again(bot: PiglooBot, monkeypatch):
+    # Arrange
+    channel = bot.guilds[0].channels[0]
+    await bot.subscriptions.add(channel.id, channel.guild.id, ALICE)
+    feed = make_feed(ALICE)
+    add = bot.outbox.add
+
+    async def locked(deliveries):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(bot.outbox, "add", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        await bot.publish_feeds([feed])
+    monkeypatch.setattr(bot.outbox, "add", add)
+
+    # Act
+    await bot.publish_feeds([feed])
+    await bot.batcher.flush()
+
+    # Assert
+    assert dpytest.verify().message().embed(bot.renderer.render(feed))
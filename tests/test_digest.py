@@ -0,0 +1,107 @@
+import uuid
+from datetime import timedelta
+
+import discord.ext.test as dpytest
+import pytest
+
+from pigloo.bot import PiglooBot
+from pigloo.digest import MAX_EMBED_CHARACTERS, MAX_FIELD_VALUE, MAX_FIELDS, build_digest, pack_messages
+from pigloo.feed import Anime, TrackedUser
+from pigloo.subscriptions import SubscriptionStore
+from tests.conftest import ANILIST, make_feed
+
+ALICE = TrackedUser(service="AniList", id="1", name="Alice")
+BOB = TrackedUser(service="AniList", id="2", name="Bob")
+
+
+def make_anime(index: int) -> Anime:
+    return Anime(
+        id=uuid.uuid4(),
+        name=f"Anime with a rather long title number {index}",
+        service=ANILIST,
+        max_progress=12,
+        url=f"https://anilist.co/anime/{index}",
+        image=f"https://img.anili.st/media/anime/{index}.jpg",
+        format="TV",
+    )
+
+
+def test_digest_groups_updates_by_user_and_media():
+    # Arrange
+    first = make_feed(ALICE)
+    second = first.model_copy(update={"id": uuid.uuid4(), "progress": 8, "datetime": first.datetime + timedelta(1)})
+    feeds = [first, make_feed(BOB), second]
+
+    # Act
+    embeds = build_digest(feeds, "3 updates")
+
+    # Assert
+    assert len(embeds) == 1
+    assert [(field.name, field.value) for field in embeds[0].fields] == [
+        ("Alice's AniList", "[Test Anime](https://anilist.co/anime/1) - Watching 5–8 of 12 episodes (2 updates)"),
+        ("Bob's AniList", "[Test Anime](https://anilist.co/anime/1) - Watching 5 of 12 episodes"),
+    ]
+
+
+def test_digest_is_split_within_discord_limits():
+    # Arrange
+    feeds = [
+        make_feed(TrackedUser(service="AniList", id=str(user), name=f"user{user}")).model_copy(
+            update={"media": make_anime(media)}
+        )
+        for user in range(40)
+        for media in range(30)
+    ]
+
+    # Act
+    embeds = build_digest(feeds, "1200 updates")
+    messages = pack_messages(embeds)
+
+    # Assert
+    assert len(embeds) > 1
+    assert all(len(embed.fields) <= MAX_FIELDS and len(embed) <= MAX_EMBED_CHARACTERS for embed in embeds)
+    assert all(len(field.value) <= MAX_FIELD_VALUE for embed in embeds for field in embed.fields)
+    assert sum(field.value.count("\n") + 1 for embed in embeds for field in embed.fields) == 1200
+    assert all(sum(len(embed) for embed in message) <= MAX_EMBED_CHARACTERS for message in messages)
+    assert sum(len(message) for message in messages) == len(embeds)
+
+
+@pytest.mark.asyncio
+async def test_digest_mode_is_persisted(database):
+    # Arrange
+    store = SubscriptionStore(database)
+    await store.load()
+
+    # Act
+    await store.set_digest(1, None, True)
+    await store.set_digest(2, None, True)
+    await store.set_digest(2, None, False)
+    reloaded = SubscriptionStore(database)
+    await reloaded.load()
+
+    # Assert
+    assert reloaded.is_digest(1)
+    assert not reloaded.is_digest(2)
+
+
+@pytest.mark.asyncio
+async def test_digest_channels_get_one_summary(bot: PiglooBot):
+    # Arrange
+    channel = bot.guilds[0].channels[0]
+    await bot.subscriptions.add(channel.id, channel.guild.id, ALICE)
+    await bot.subscriptions.add(channel.id, channel.guild.id, BOB)
+    await bot.subscriptions.set_digest(channel.id, channel.guild.id, True)
+
+    # Act
+    await bot.publish_feeds([make_feed(ALICE), make_feed(BOB)])
+    await bot.batcher.flush()
+    assert dpytest.verify().message().nothing()
+    await bot.digests.flush()
+    await bot.outbox.flush()
+
+    # Assert
+    message = dpytest.get_message()
+    assert message.embeds[0].title == "2 updates"
+    assert [field.name for field in message.embeds[0].fields] == ["Alice's AniList", "Bob's AniList"]
+    assert dpytest.verify().message().nothing()
+    assert bot.outbox.pending == 0
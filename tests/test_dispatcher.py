@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import discord
+import discord.ext.test as dpytest
+import pytest
+
+from pigloo.bot import PiglooBot
+from pigloo.dispatcher import Dispatcher, TokenBucket, message_route
+from pigloo.embed import send_embeds
+
+
+def recorder(log: list, name: str, gate: asyncio.Event = None):
+    async def send():
+        if gate is not None:
+            await gate.wait()
+        log.append(name)
+        return name
+
+    return send
+
+
+@pytest.mark.asyncio
+async def test_requests_of_a_channel_are_sent_in_order():
+    dispatcher = Dispatcher(concurrency=1)
+    sent = []
+    gate = asyncio.Event()
+
+    # Act
+    first = dispatcher.submit(1, recorder(sent, "first", gate))
+    await asyncio.sleep(0)
+    dispatcher.submit(1, recorder(sent, "second"))
+    dispatcher.submit(1, recorder(sent, "third"))
+    assert dispatcher.queue_depth(1) == 2
+    gate.set()
+    await dispatcher.drain()
+
+    # Assert
+    assert await first == "first"
+    assert sent == ["first", "second", "third"]
+    assert dispatcher.stats().sent == 3
+    assert dispatcher.queue_depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_requests_do_not_wait_for_their_bucket():
+    dispatcher = Dispatcher(concurrency=1, bucket_capacity=1, bucket_period=5)
+    route = message_route(1)
+    sent = []
+    await dispatcher.submit(1, recorder(sent, "feed"), route=route)
+    throttled = dispatcher.submit(1, recorder(sent, "throttled"), route=route)
+    await asyncio.sleep(0.01)
+
+    # Act
+    start = time.monotonic()
+    throttled.cancel()
+    await asyncio.wait_for(dispatcher.drain(), timeout=1)
+
+    # Assert
+    assert time.monotonic() - start < 0.5
+    assert sent == ["feed"]
+    assert dispatcher.queue_depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_blocked_channel_does_not_delay_others():
+    dispatcher = Dispatcher(concurrency=2)
+    sent = []
+    gate = asyncio.Event()
+
+    # Act
+    blocked = dispatcher.submit(1, recorder(sent, "blocked", gate))
+    await asyncio.wait_for(dispatcher.submit(2, recorder(sent, "other")), timeout=1)
+
+    # Assert
+    assert sent == ["other"]
+    assert dispatcher.stats().in_flight == 1
+    gate.set()
+    assert await blocked == "blocked"
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    dispatcher = Dispatcher(concurrency=2)
+    running = 0
+    peak = 0
+
+    async def send():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    # Act
+    await asyncio.gather(*(dispatcher.submit(channel_id, send) for channel_id in range(6)))
+
+    # Assert
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_route_bucket_spaces_requests():
+    dispatcher = Dispatcher(concurrency=4, bucket_capacity=2, bucket_period=0.2)
+    sent = []
+    route = message_route(1)
+
+    # Act
+    start = time.monotonic()
+    await asyncio.gather(*(dispatcher.submit(1, recorder(sent, str(i)), route=route) for i in range(3)))
+    elapsed = time.monotonic() - start
+
+    # Assert
+    assert sent == ["0", "1", "2"]
+    assert elapsed >= 0.09
+    assert dispatcher.stats().max_wait >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_failures_are_returned_to_the_caller():
+    dispatcher = Dispatcher(concurrency=1)
+
+    async def send():
+        raise discord.DiscordException("Broken")
+
+    # Act
+    with pytest.raises(discord.DiscordException):
+        await dispatcher.submit(1, send)
+
+    # Assert
+    assert dispatcher.stats().failed == 1
+
+
+@pytest.mark.asyncio
+async def test_send_embeds_through_dispatcher(bot: PiglooBot):
+    channel = bot.guilds[0].channels[0]
+    embeds = [discord.Embed(title=f"Embed {i}") for i in range(12)]
+
+    # Act
+    await send_embeds(embeds, channel, dispatcher=bot.dispatcher)
+
+    # Assert
+    assert len(dpytest.get_message().embeds) == 10
+    assert len(dpytest.get_message().embeds) == 2
+    assert bot.dispatcher.stats().sent == 2
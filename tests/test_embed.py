@@ -1,3 +1,4 @@
+import asyncio
 import uuid
 from datetime import datetime, timezone
 
@@ -8,7 +9,7 @@ from logot import Logot, logged
 
 from pigloo.bot import PiglooBot
 from pigloo.config import config
-from pigloo.embed import create_embed_from_feed, send_embed
+from pigloo.embed import EmbedBatcher, EmbedRenderer, create_embed_from_feed, send_embed, send_embeds
 from pigloo.feed import Anime, Feed, FeedStatus, Manga, Service, User
 
 
@@ -85,6 +86,78 @@ async def test_send_embed_with_missing_rights(bot: PiglooBot, logot: Logot):
     logot.assert_logged(logged.error(f"Impossible to send a message on '{channel.id}': 403 %s"))
 
 
+@pytest.mark.asyncio
+async def test_send_embeds_groups_ten_per_message(bot: PiglooBot, logot: Logot):
+    # Arrange
+    channel = bot.guilds[0].channels[0]
+    embeds = [discord.Embed(title=f"Embed {i}") for i in range(23)]
+
+    # Act
+    await send_embeds(embeds, channel)
+
+    # Assert
+    messages = [dpytest.get_message() for _ in range(3)]
+    assert [len(message.embeds) for message in messages] == [10, 10, 3]
+    assert [embed.title for message in messages for embed in message.embeds] == [embed.title for embed in embeds]
+    logot.assert_logged(logged.info(f"Message with 3 embeds sent in channel: {channel.id}"))
+
+
+@pytest.mark.asyncio
+async def test_batcher_coalesces_embeds_per_channel(bot: PiglooBot):
+    # Arrange
+    channel = bot.guilds[0].channels[0]
+    batcher = EmbedBatcher(window=60)
+
+    # Act
+    for i in range(3):
+        batcher.add(discord.Embed(title=f"Embed {i}"), channel)
+    await batcher.flush()
+
+    # Assert
+    message = dpytest.get_message()
+    assert [embed.title for embed in message.embeds] == ["Embed 0", "Embed 1", "Embed 2"]
+    assert dpytest.verify().message().nothing()
+
+
+@pytest.mark.asyncio
+async def test_batcher_sends_full_messages_without_waiting(bot: PiglooBot):
+    # Arrange
+    channel = bot.guilds[0].channels[0]
+    batcher = EmbedBatcher(window=60)
+
+    # Act
+    for i in range(10):
+        batcher.add(discord.Embed(title=f"Embed {i}"), channel)
+    await asyncio.wait_for(asyncio.shield(batcher._tasks[channel.id]), timeout=5)
+
+    # Assert
+    assert len(dpytest.get_message().embeds) == 10
+
+
+@pytest.mark.asyncio
+async def test_batcher_failure_only_affects_its_batch(bot: PiglooBot, logot: Logot):
+    # Arrange
+    sent = []
+
+    async def send(embeds, channel):
+        if embeds[0].title == "Broken":
+            raise discord.DiscordException("Broken batch")
+        sent.append([embed.title for embed in embeds])
+
+    channel = bot.guilds[0].channels[0]
+    batcher = EmbedBatcher(window=60, send=send)
+
+    # Act
+    batcher.add(discord.Embed(title="Broken"), channel)
+    await batcher.flush()
+    batcher.add(discord.Embed(title="Working"), channel)
+    await batcher.flush()
+
+    # Assert
+    assert sent == [["Working"]]
+    logot.assert_logged(logged.error(f"Impossible to send 1 embeds on '{channel.id}': Broken batch"))
+
+
 @pytest.mark.parametrize(
     "feed, expected_description, expected_author_name, expected_author_url",
     [
@@ -167,6 +240,74 @@ def test_create_embed_from_feed(feed, expected_description, expected_author_name
     assert embed.author.name == expected_author_name
     assert embed.author.url == expected_author_url
     assert embed.thumbnail.url == str(feed.media.image)
+    assert embed.colour.value == feed.status.color
+
+
+def test_renderer_reuses_media_and_author_fragments():
+    # Arrange
+    service = Service(id=uuid.uuid4(), name="AniList")
+    user = User(id=uuid.uuid4(), name="testuser", service=service)
+    media = Anime(
+        id=uuid.uuid4(),
+        name="Test Anime",
+        service=service,
+        max_progress=12,
+        url="https://anilist.co/anime/1",
+        image="https://img.anili.st/media/anime/1.jpg",
+        format="TV",
+    )
+    feeds = [
+        Feed(
+            id=uuid.uuid4(),
+            user=user,
+            service=service,
+            media=media,
+            progress=progress,
+            datetime=datetime(2024, 1, 1, tzinfo=timezone.utc),
+            status=FeedStatus(label="Watching"),
+        )
+        for progress in (1, 2)
+    ]
+    renderer = EmbedRenderer()
+
+    # Act
+    first, second = (renderer.render(feed) for feed in feeds)
+
+    # Assert
+    assert first.description.endswith("```Watching | 1 of 12 episodes```")
+    assert second.description.endswith("```Watching | 2 of 12 episodes```")
+    assert second.author.name == "testuser's AniList"
+    assert second.footer.text == config.get("BOT", "name")
+    assert renderer._media.hits == renderer._authors.hits == 1
+
+
+def test_footer_shows_the_icon_of_the_feed_service():
+    # Arrange
+    service = Service(id=uuid.uuid4(), name="MyAnimeList")
+    feed = Feed(
+        id=uuid.uuid4(),
+        user=User(id=uuid.uuid4(), name="testuser", service=service),
+        service=service,
+        media=Anime(
+            id=uuid.uuid4(),
+            name="Test Anime",
+            service=service,
+            max_progress=12,
+            url="https://myanimelist.net/anime/1",
+            image="https://cdn.myanimelist.net/images/anime/1.jpg",
+            format="TV",
+        ),
+        progress=1,
+        datetime=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        status=FeedStatus(label="Watching"),
+    )
+
+    # Act
+    embed = EmbedRenderer().render(feed)
+
+    # Assert
+    assert embed.author.url == f"{config.get('MYANIMELIST', 'profile_url')}testuser"
+    assert embed.footer.icon_url == embed.author.icon_url == config.get("MYANIMELIST", "icon_url")
 
 
 @pytest.mark.parametrize(
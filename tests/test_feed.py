@@ -0,0 +1,74 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from pydantic import ValidationError
+
+from pigloo.feed import (
+    FEEDS_ADAPTER,
+    Anime,
+    CompletedStatus,
+    Feed,
+    FeedStatus,
+    Manga,
+    PlanToReadStatus,
+    Service,
+    User,
+    WatchingStatus,
+    parse_feeds,
+    status_for,
+)
+
+SERVICE = Service(id=uuid.uuid4(), name="AniList")
+
+
+def make_feed(media_cls: type, label: str) -> Feed:
+    return Feed(
+        id=uuid.uuid4(),
+        user=User(id=uuid.uuid4(), name="testuser", service=SERVICE),
+        service=SERVICE,
+        media=media_cls(
+            id=uuid.uuid4(),
+            name="Test Media",
+            service=SERVICE,
+            max_progress=12,
+            url="https://anilist.co/anime/1",
+            image="https://img.anili.st/media/anime/1.jpg",
+            format="TV",
+        ),
+        progress=3,
+        datetime=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        status=FeedStatus(label=label),
+    )
+
+
+def test_statuses_are_shared_singletons():
+    first = make_feed(Anime, "watched episode")
+    second = make_feed(Anime, "Watching")
+
+    assert isinstance(first.status, WatchingStatus)
+    assert first.status is second.status
+    manga = make_feed(Manga, "plans to read")
+    assert manga.status is status_for("PLAN_TO_READ", manga.media)
+    with pytest.raises(ValidationError):
+        first.status.label = "Dropped"
+
+
+@pytest.mark.parametrize("label", ["", "unknown status"])
+def test_unknown_labels_are_rejected(label):
+    with pytest.raises(ValidationError):
+        make_feed(Anime, label)
+
+
+def test_parse_feeds_in_one_pass():
+    feeds = [make_feed(Anime, "Watching"), make_feed(Manga, "plans to read"), make_feed(Anime, "completed")]
+
+    # Act
+    parsed = parse_feeds(FEEDS_ADAPTER.dump_json(feeds))
+
+    # Assert
+    assert parsed == feeds
+    assert [type(feed.media) for feed in parsed] == [Anime, Manga, Anime]
+    assert isinstance(parsed[1].status, PlanToReadStatus)
+    assert parsed[2].status is feeds[2].status
+    assert isinstance(parsed[2].status, CompletedStatus)
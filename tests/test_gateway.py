@@ -0,0 +1,63 @@
+import discord
+import pytest
+
+from pigloo.config import config
+from pigloo.gateway import gateway_options, peak_rss
+
+
+@pytest.fixture
+def gateway_config():
+    saved = dict(config["GATEWAY"]) if config.has_section("GATEWAY") else None
+    config.remove_section("GATEWAY")
+    config.add_section("GATEWAY")
+
+    yield config["GATEWAY"]
+
+    config.remove_section("GATEWAY")
+    if saved is not None:
+        config.read_dict({"GATEWAY": saved})
+
+
+def test_full_profile_keeps_the_default_caches():
+    options = gateway_options("full")
+
+    assert options["intents"].members
+    assert options["intents"].message_content
+    assert set(options) == {"intents"}
+
+
+def test_lean_profile_disables_the_member_and_message_caches(gateway_config):
+    # Act
+    options = gateway_options("lean")
+    client = discord.Client(**options)
+
+    # Assert
+    assert options["intents"].guilds
+    assert not options["intents"].members
+    assert not options["intents"].presences
+    assert options["intents"].guild_messages
+    assert not client._connection._chunk_guilds
+    assert client._connection.member_cache_flags.value == 0
+    assert client._connection.max_messages is None
+
+
+def test_lean_profile_options(gateway_config):
+    # Arrange
+    gateway_config["max_messages"] = "50"
+    gateway_config["prefix_commands"] = "false"
+
+    # Act
+    options = gateway_options("lean")
+
+    # Assert
+    assert options["max_messages"] == 50
+    assert options["intents"] == discord.Intents(guilds=True)
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        gateway_options("tiny")
+
+
+def test_peak_rss():
+    assert peak_rss() > 1024 * 1024
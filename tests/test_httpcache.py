@@ -0,0 +1,169 @@
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from pigloo.httpcache import HttpCache
+from pigloo.providers.anilist import AniListProvider
+from tests.conftest import FakeAniList
+
+
+class FakeOrigin:
+    """Serves versioned documents with an ETag, or only a Last-Modified date, answering 304 when it matches."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.version = 1
+        self.etags = True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        etag = f'"v{self.version}"'
+        last_modified = f"Mon, 0{self.version} Jan 2024 00:00:00 GMT"
+        if self.etags and request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        if not self.etags and request.headers.get("If-Modified-Since") == last_modified:
+            return web.Response(status=304)
+        headers = {"ETag": etag} if self.etags else {"Last-Modified": last_modified}
+        return web.Response(body=f"{request.match_info['name']} v{self.version}".encode(), headers=headers)
+
+
+@pytest_asyncio.fixture
+async def origin():
+    fake = FakeOrigin()
+    app = web.Application()
+    app.router.add_get("/{name}", fake.handle)
+    server = TestServer(app)
+    await server.start_server()
+    fake.url = str(server.make_url("")).rstrip("/")
+
+    yield fake
+
+    await server.close()
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_fresh_responses_are_served_from_cache(origin, session, database):
+    cache = HttpCache(database, ttls={"doc": 60})
+    await cache.load()
+
+    # Act
+    first = await cache.fetch(session, "GET", f"{origin.url}/a", endpoint="doc")
+    second = await cache.fetch(session, "GET", f"{origin.url}/a", endpoint="doc")
+
+    # Assert
+    assert (first.status, first.body) == (200, b"a v1")
+    assert (second.status, second.body) == (304, b"a v1")
+    assert origin.requests == 1
+    assert cache.stats().hit_rate == 0.5
+    assert cache.stats().bytes_saved == 4
+
+
+@pytest.mark.asyncio
+async def test_stale_responses_are_revalidated(origin, session, database):
+    clock = Clock()
+    cache = HttpCache(database, ttls={"doc": 60}, clock=clock)
+    await cache.load()
+    await cache.fetch(session, "GET", f"{origin.url}/a", endpoint="doc")
+
+    # Act
+    clock.now += 120
+    unchanged = await cache.fetch(session, "GET", f"{origin.url}/a", endpoint="doc")
+    clock.now += 120
+    origin.version = 2
+    changed = await cache.fetch(session, "GET", f"{origin.url}/a", endpoint="doc")
+
+    # Assert
+    assert (unchanged.status, unchanged.body) == (304, b"a v1")
+    assert (changed.status, changed.body) == (200, b"a v2")
+    assert origin.requests == 3
+    assert cache.stats().revalidated == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_responses_are_revalidated_by_date(origin, session, database):
+    clock = Clock()
+    origin.etags = False
+    cache = HttpCache(database, ttls={"doc": 60}, clock=clock)
+    await cache.load()
+    await cache.fetch(session, "GET", f"{origin.url}/a", endpoint="doc")
+
+    # Act
+    clock.now += 120
+    restarted = HttpCache(database, ttls={"doc": 60}, clock=clock)
+    await restarted.load()
+    unchanged = await restarted.fetch(session, "GET", f"{origin.url}/a", endpoint="doc")
+
+    # Assert
+    assert (unchanged.status, unchanged.body) == (304, b"a v1")
+    assert origin.requests == 2
+    assert restarted.stats().revalidated == 1
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entries_are_evicted(database):
+    clock = Clock()
+    cache = HttpCache(database, max_size=10, clock=clock)
+    await cache.load()
+    await cache.put("doc", "a", b"aaaa")
+    clock.now += 1
+    await cache.put("doc", "b", b"bbbb")
+    clock.now += 1
+    cache.record_hit("a", (await cache.get_many(["a"]))["a"])
+
+    # Act
+    clock.now += 1
+    await cache.put("doc", "c", b"cccc")
+
+    # Assert
+    assert cache.size == 8
+    restarted = HttpCache(database)
+    await restarted.load()
+    assert sorted(await restarted.get_many(["a", "b", "c"])) == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_warm_start_preloads_hot_entries(database):
+    cache = HttpCache(database)
+    await cache.load()
+    await cache.put_many("doc", {str(i): (b"body", None, None) for i in range(5)})
+
+    # Act
+    restarted = HttpCache(database)
+    preloaded = await restarted.load(warm=3)
+
+    # Assert
+    assert preloaded == 3
+    assert restarted.size == 20
+
+
+@pytest.mark.asyncio
+async def test_media_survive_restarts(session, database):
+    anilist = FakeAniList()
+    app = web.Application()
+    app.router.add_post("/", anilist.handle)
+    server = TestServer(app)
+    await server.start_server()
+    url = str(server.make_url("/"))
+    cache = HttpCache(database, ttls={"anilist.media": 60})
+    await cache.load()
+    await AniListProvider(session, api_url=url, cache=cache)._fetch_media([110, 111])
+
+    # Act
+    restarted = HttpCache(database, ttls={"anilist.media": 60})
+    await restarted.load(warm=10)
+    media = await AniListProvider(session, api_url=url, cache=restarted)._fetch_media([110, 111, 120])
+
+    # Assert
+    assert anilist.media_requests == [[110, 111], [120]]
+    assert media[110].name == "Media 10"
+    assert restarted.stats().hits == 2
+    await server.close()
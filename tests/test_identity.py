@@ -0,0 +1,69 @@
+import uuid
+from datetime import datetime, timezone
+
+from pigloo.feed import Anime, Feed, FeedStatus, Service, User
+from pigloo.identity import IdentityMap
+
+SERVICE_ID = uuid.uuid4()
+USER_ID = uuid.uuid4()
+MEDIA_ID = uuid.uuid4()
+
+
+def make_feed(user_name: str = "testuser") -> Feed:
+    # Every call builds fresh copies of the same entities, like a provider response does
+    service = Service(id=SERVICE_ID, name="AniList")
+    return Feed(
+        id=uuid.uuid4(),
+        user=User(id=USER_ID, name=user_name, service=service),
+        service=service,
+        media=Anime(
+            id=MEDIA_ID,
+            name="Test Anime",
+            service=service,
+            max_progress=12,
+            url="https://anilist.co/anime/1",
+            image="https://img.anili.st/media/anime/1.jpg",
+            format="TV",
+        ),
+        progress=1,
+        datetime=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        status=FeedStatus(label="Watching"),
+    )
+
+
+def test_identical_entities_are_shared():
+    identities = IdentityMap(maxsize=100)
+
+    # Act
+    first, second = (identities.intern_feed(make_feed()) for _ in range(2))
+
+    # Assert
+    assert first.media is second.media
+    assert first.user is second.user
+    assert first.service is second.service
+    assert identities.stats() == (3, 3, 3)
+
+
+def test_changed_entities_replace_the_shared_one():
+    identities = IdentityMap(maxsize=100)
+    identities.intern_feed(make_feed())
+
+    # Act
+    renamed = identities.intern_feed(make_feed(user_name="renamed"))
+
+    # Assert
+    assert identities.intern_feed(make_feed(user_name="renamed")).user is renamed.user
+    assert renamed.user.name == "renamed"
+
+
+def test_identity_map_is_bounded():
+    identities = IdentityMap(maxsize=2)
+    service = Service(id=SERVICE_ID, name="AniList")
+
+    # Act
+    users = [identities.intern(User(id=uuid.uuid4(), name=f"user{i}", service=service)) for i in range(5)]
+
+    # Assert
+    assert len(identities) == 2
+    assert identities.intern(users[-1].model_copy()) is users[-1]
+    assert identities.intern(users[0].model_copy()) is not users[0]
@@ -0,0 +1,140 @@
+import asyncio
+from collections import Counter
+from configparser import ConfigParser
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from pigloo.cursors import CursorStore
+from pigloo.feed import TrackedUser, stable_uuid
+from pigloo.ingest import WorkerPool, create_scheduler, worker_for
+from pigloo.storage import Database
+from pigloo.subscriptions import SubscriptionStore
+from tests.conftest import FakeAniList, cursor, tracked
+
+
+def test_users_are_spread_across_workers():
+    users = [TrackedUser(service="AniList", id=str(i), name=f"user{i}") for i in range(1000)]
+
+    # Act
+    workers = Counter(worker_for(user, 4) for user in users)
+
+    # Assert
+    assert sorted(workers) == [0, 1, 2, 3]
+    assert min(workers.values()) > 200
+    assert all(worker_for(user, 4) == worker_for(user.model_copy(), 4) for user in users[:10])
+
+
+def test_budget_is_split_between_shard_processes_and_workers(monkeypatch):
+    parser = ConfigParser()
+    parser.read_dict(
+        {
+            "POLLER": {"adaptive": "true", "requests_per_minute": "120"},
+            "SHARDING": {"enabled": "true", "shard_ids": "0", "shard_count": "3"},
+        }
+    )
+    monkeypatch.setattr("pigloo.ingest.config", parser)
+    monkeypatch.setattr("pigloo.sharding.config", parser)
+
+    # Act
+    scheduler = create_scheduler(shares=2)
+
+    # Assert
+    assert scheduler.budget.capacity == 20
+
+
+@pytest.mark.asyncio
+async def test_workers_stream_feeds_to_the_gateway(tmp_path):
+    anilist = FakeAniList()
+    app = web.Application()
+    app.router.add_post("/", anilist.handle)
+    server = TestServer(app)
+    await server.start_server()
+    path = str(tmp_path / "pigloo.db")
+    database = Database(path)
+    subscriptions, cursors = SubscriptionStore(database), CursorStore(database)
+    await subscriptions.load()
+    await cursors.load()
+    users = [tracked(1), tracked(2)]
+    for user in users:
+        await subscriptions.add(1, None, user)
+    await cursors.update({user: cursor(0) for user in users})
+    await database.close()
+
+    received = []
+    done = asyncio.Event()
+
+    async def sink(feeds):
+        received.extend(feeds)
+        if len(received) >= 3:
+            done.set()
+
+    overrides = {
+        "STORAGE": {"database": path},
+        "ANILIST": {"api_url": str(server.make_url("/"))},
+        "POLLER": {"adaptive": "false", "interval": "0.5"},
+    }
+    pool = WorkerPool(2, sink, overrides=overrides)
+
+    # Act
+    pool.start()
+    try:
+        await asyncio.wait_for(done.wait(), timeout=60)
+    finally:
+        await pool.stop()
+        await server.close()
+
+    # Assert
+    assert sorted(feed.id for feed in received) == sorted(stable_uuid("AniList", "activity", i) for i in (10, 11, 20))
+    database = Database(path)
+    cursors = CursorStore(database)
+    await cursors.load()
+    await database.close()
+    assert [cursors.get(user).last_id for user in users] == [11, 20]
+
+
+@pytest.mark.asyncio
+async def test_workers_keep_their_cursors_when_feeds_are_not_stored(tmp_path):
+    anilist = FakeAniList()
+    app = web.Application()
+    app.router.add_post("/", anilist.handle)
+    server = TestServer(app)
+    await server.start_server()
+    path = str(tmp_path / "pigloo.db")
+    database = Database(path)
+    subscriptions, cursors = SubscriptionStore(database), CursorStore(database)
+    await subscriptions.load()
+    await cursors.load()
+    user = tracked(1)
+    await subscriptions.add(1, None, user)
+    await cursors.update({user: cursor(0)})
+    await database.close()
+
+    failed = asyncio.Event()
+
+    async def sink(feeds):
+        failed.set()
+        raise RuntimeError("database is locked")
+
+    overrides = {
+        "STORAGE": {"database": path},
+        "ANILIST": {"api_url": str(server.make_url("/"))},
+        "POLLER": {"adaptive": "false", "interval": "0.5"},
+    }
+    pool = WorkerPool(1, sink, overrides=overrides)
+
+    # Act
+    pool.start()
+    try:
+        await asyncio.wait_for(failed.wait(), timeout=60)
+    finally:
+        await pool.stop()
+        await server.close()
+
+    # Assert
+    database = Database(path)
+    cursors = CursorStore(database)
+    await cursors.load()
+    await database.close()
+    assert cursors.get(user).last_id == 0
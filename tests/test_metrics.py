@@ -0,0 +1,98 @@
+import aiohttp
+import discord
+import pytest
+
+from pigloo.bot import PiglooBot
+from pigloo.embed import send_embed
+from pigloo.metrics import MESSAGES_SENT, QUEUED_REQUESTS, MetricsServer, Registry
+
+
+def test_histogram_counts_values_in_their_bucket():
+    # Arrange
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    # Act
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+
+    # Assert
+    assert histogram.counts == [2, 1, 1]
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 5.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_labelled_metrics():
+    # Arrange
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests", labels=("api",))
+
+    # Act
+    counter.labels("discord").inc()
+    counter.labels("discord").inc()
+    counter.labels("AniList").inc(3)
+
+    # Assert
+    assert registry.render() == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{api="discord"} 2\n'
+        'requests_total{api="AniList"} 3\n'
+    )
+    with pytest.raises(ValueError):
+        counter.labels("discord", "extra")
+
+
+def test_gauge_reads_its_function():
+    registry = Registry()
+    registry.gauge("queue_depth", "Queue depth", function=lambda: 7)
+
+    assert registry.render().endswith("queue_depth 7\n")
+
+
+def test_metrics_cannot_be_registered_twice():
+    registry = Registry()
+    registry.counter("requests_total", "Requests")
+
+    with pytest.raises(ValueError):
+        registry.counter("requests_total", "Requests")
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_served_over_http(unused_tcp_port):
+    # Arrange
+    registry = Registry()
+    registry.counter("requests_total", "Requests").inc()
+    server = MetricsServer(registry, port=unused_tcp_port)
+    await server.start()
+
+    # Act
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{unused_tcp_port}/metrics") as response:
+                body = await response.text()
+    finally:
+        await server.stop()
+
+    # Assert
+    assert response.status == 200
+    assert "requests_total 1" in body
+
+
+@pytest.mark.asyncio
+async def test_sends_are_instrumented(bot: PiglooBot):
+    # Arrange
+    channel = bot.guilds[0].channels[0]
+    sent = MESSAGES_SENT.value
+
+    # Act
+    await send_embed(discord.Embed(title="Metrics"), channel, bot.dispatcher)
+
+    # Assert
+    assert MESSAGES_SENT.value == sent + 1
+    assert f"pigloo_queued_requests {bot.dispatcher.queue_depth()}" in "\n".join(QUEUED_REQUESTS.render())
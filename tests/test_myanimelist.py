@@ -0,0 +1,234 @@
+import asyncio
+from datetime import datetime, timezone
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from pigloo.cursors import Cursor
+from pigloo.feed import (
+    Anime,
+    Manga,
+    PausedStatus,
+    PlanToWatchStatus,
+    RereadingStatus,
+    TrackedUser,
+    WatchingStatus,
+    stable_uuid,
+)
+from pigloo.httpcache import HttpCache
+from pigloo.providers.myanimelist import MyAnimeListProvider
+from pigloo.storage import Database
+
+
+def make_entry(media_id: int, status: str, progress: int, updated_at: str, **flags) -> dict:
+    return {
+        "node": {
+            "id": media_id,
+            "title": f"Media {media_id}",
+            "main_picture": {"medium": f"https://cdn.myanimelist.net/images/{media_id}.jpg"},
+            "media_type": "tv",
+            "num_episodes": 12,
+            "num_chapters": 24,
+        },
+        "list_status": {
+            "status": status,
+            "num_episodes_watched": progress,
+            "num_chapters_read": progress,
+            "updated_at": updated_at,
+            **flags,
+        },
+    }
+
+
+LISTS = {
+    ("alice", "animelist"): [
+        make_entry(2, "on_hold", 4, "2024-01-03T00:00:00+00:00"),
+        make_entry(1, "watching", 3, "2024-01-02T00:00:00+00:00"),
+        make_entry(3, "plan_to_watch", 0, "2023-12-01T00:00:00+00:00"),
+    ],
+    ("alice", "mangalist"): [
+        make_entry(5, "completed", 24, "2024-01-04T00:00:00+00:00", is_rereading=True),
+    ],
+    ("bob", "animelist"): [],
+    ("bob", "mangalist"): [],
+}
+
+
+class FakeMyAnimeList:
+    """Local stand-in for the MyAnimeList user list endpoints, honouring `If-None-Match`."""
+
+    def __init__(self) -> None:
+        self.requests = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        user, endpoint = request.match_info["user"], request.match_info["endpoint"]
+        self.requests.append((user, endpoint, dict(request.headers)))
+        if (user, endpoint) not in LISTS:
+            return web.json_response({"error": "not_found"}, status=404)
+
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        etag = f'"{user}-{endpoint}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        data = LISTS[(user, endpoint)][: int(request.query["limit"])]
+        return web.json_response({"data": data}, headers={"ETag": etag})
+
+
+@pytest_asyncio.fixture
+async def mal():
+    fake = FakeMyAnimeList()
+    app = web.Application()
+    app.router.add_get("/users/{user}/{endpoint}", fake.handle)
+    server = TestServer(app)
+    await server.start_server()
+    fake.url = str(server.make_url("")).rstrip("/")
+
+    yield fake
+
+    await server.close()
+
+
+@pytest_asyncio.fixture
+async def session():
+    async with aiohttp.ClientSession() as s:
+        yield s
+
+
+def tracked(name: str) -> TrackedUser:
+    return TrackedUser(service="MyAnimeList", id=name, name=name)
+
+
+def cursor(day: int) -> Cursor:
+    last_timestamp = datetime(2024, 1, day, tzinfo=timezone.utc)
+    return Cursor(last_id=int(last_timestamp.timestamp()), last_timestamp=last_timestamp)
+
+
+@pytest.mark.asyncio
+async def test_fetch_activities_maps_list_statuses(mal, session):
+    provider = MyAnimeListProvider(session, api_url=mal.url, client_id="client")
+    user = tracked("alice")
+
+    # Act
+    activities = await provider.fetch_activities([user], {user: cursor(1)})
+
+    # Assert
+    watching, paused, reread = activities[user].feeds
+    assert isinstance(watching.media, Anime)
+    assert isinstance(watching.status, WatchingStatus)
+    assert watching.progress == 3
+    assert watching.media.id == stable_uuid("MyAnimeList", "media", "anime:1")
+    assert str(watching.media.url) == "https://myanimelist.net/anime/1"
+    assert watching.user.id == user.uuid
+    assert isinstance(paused.status, PausedStatus)
+    assert isinstance(reread.media, Manga)
+    assert isinstance(reread.status, RereadingStatus)
+    assert activities[user].cursor == cursor(4)
+    assert all(headers["X-MAL-CLIENT-ID"] == "client" for _, _, headers in mal.requests)
+
+
+@pytest.mark.asyncio
+async def test_fetch_activities_seeds_new_users(mal, session):
+    provider = MyAnimeListProvider(session, api_url=mal.url)
+    users = [tracked("alice"), tracked("bob")]
+
+    # Act
+    activities = await provider.fetch_activities(users, {})
+
+    # Assert
+    assert [activities[user].feeds for user in users] == [[], []]
+    assert activities[users[0]].cursor == cursor(4)
+    assert activities[users[1]].cursor is not None
+
+
+@pytest.mark.asyncio
+async def test_unchanged_lists_are_not_parsed_again(mal, session):
+    provider = MyAnimeListProvider(session, api_url=mal.url)
+    user = tracked("alice")
+    first = await provider.fetch_activities([user], {user: cursor(1)})
+
+    # Act
+    second = await provider.fetch_activities([user], {user: first[user].cursor})
+
+    # Assert
+    assert provider.not_modified == 2
+    assert second[user].feeds == []
+    assert second[user].cursor == first[user].cursor
+    assert {headers["If-None-Match"] for _, _, headers in mal.requests[-2:]} == {
+        '"alice-animelist"',
+        '"alice-mangalist"',
+    }
+
+
+@pytest.mark.asyncio
+async def test_plan_to_watch_entries(mal, session):
+    provider = MyAnimeListProvider(session, api_url=mal.url)
+    user = tracked("alice")
+
+    # Act
+    activities = await provider.fetch_activities(
+        [user], {user: Cursor(last_id=0, last_timestamp=datetime(2023, 11, 1, tzinfo=timezone.utc))}
+    )
+
+    # Assert
+    planned = activities[user].feeds[0]
+    assert isinstance(planned.status, PlanToWatchStatus)
+    assert planned.progress is None
+
+
+@pytest.mark.asyncio
+async def test_requests_are_bounded(mal, session):
+    provider = MyAnimeListProvider(session, api_url=mal.url, concurrency=1)
+
+    # Act
+    await provider.fetch_activities([tracked("alice"), tracked("bob")], {})
+
+    # Assert
+    assert len(mal.requests) == 4
+    assert mal.peak == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_user(mal, session):
+    provider = MyAnimeListProvider(session, api_url=mal.url)
+
+    assert await provider.fetch_user("alice") == tracked("alice")
+    # Already known lists answer 304
+    assert await provider.fetch_user("alice") == tracked("alice")
+    assert await provider.fetch_user("nobody") is None
+
+
+@pytest.mark.asyncio
+async def test_missing_list_keeps_the_cursor(mal, session):
+    provider = MyAnimeListProvider(session, api_url=mal.url)
+
+    assert await provider.fetch_activities([tracked("nobody")], {}) == {}
+
+
+@pytest.mark.asyncio
+async def test_validators_survive_restarts(mal, session, tmp_path):
+    database = Database(str(tmp_path / "cache.db"))
+    cache = HttpCache(database, ttls={"myanimelist.list": 0})
+    await cache.load()
+    user = tracked("alice")
+    await MyAnimeListProvider(session, api_url=mal.url, cache=cache).fetch_activities([user], {})
+
+    # Act
+    restarted = HttpCache(database, ttls={"myanimelist.list": 0})
+    await restarted.load()
+    provider = MyAnimeListProvider(session, api_url=mal.url, cache=restarted)
+    activities = await provider.fetch_activities([user], {user: cursor(4)})
+
+    # Assert
+    assert provider.not_modified == 2
+    assert activities[user].feeds == []
+    assert restarted.stats().revalidated == 2
+    await database.close()
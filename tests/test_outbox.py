@@ -0,0 +1,126 @@
+import discord.ext.test as dpytest
+import pytest
+
+from pigloo.bot import PiglooBot
+from pigloo.embed import EmbedBatcher
+from pigloo.feed import TrackedUser
+from pigloo.outbox import PRUNE_INTERVAL, Outbox
+from tests.conftest import make_feed
+
+ALICE = TrackedUser(service="AniList", id="1", name="Alice")
+
+
+@pytest.mark.asyncio
+async def test_feeds_are_stored_once(database):
+    # Arrange
+    outbox = Outbox(database)
+    await outbox.load()
+    feed = make_feed(ALICE)
+
+    # Act
+    first = await outbox.add([(feed, 1, None), (feed, 2, None)])
+    second = await outbox.add([(feed, 1, None)])
+
+    # Assert
+    assert [entry.channel_id for entry in first] == [1, 2]
+    assert second == []
+    assert outbox.pending == 2
+
+
+@pytest.mark.asyncio
+async def test_undelivered_feeds_survive_a_restart(database):
+    # Arrange
+    outbox = Outbox(database)
+    await outbox.load()
+    feeds = [make_feed(ALICE), make_feed(ALICE)]
+    entries = await outbox.add([(feed, 1, None) for feed in feeds])
+
+    # Act
+    outbox.mark_sent([entries[0].key])
+    await outbox.close()
+    pending = await Outbox(database).load()
+
+    # Assert
+    assert [entry.feed for entry in pending] == [feeds[1]]
+
+
+@pytest.mark.asyncio
+async def test_expired_feeds_are_dropped(database):
+    # Arrange
+    now = 1_000_000.0
+    outbox = Outbox(database, retention=60, clock=lambda: now)
+    await outbox.load()
+    feed = make_feed(ALICE)
+    await outbox.add([(feed, 1, None)])
+
+    # Act
+    now += 61
+    pending = await outbox.load()
+
+    # Assert
+    assert pending == []
+    assert await outbox.add([(feed, 1, None)]) != []
+
+
+@pytest.mark.asyncio
+async def test_sent_feeds_are_pruned_while_running(database):
+    # Arrange
+    now = 1_000_000.0
+    outbox = Outbox(database, retention=60, clock=lambda: now)
+    await outbox.load()
+    sent, undelivered, recent = make_feed(ALICE), make_feed(ALICE), make_feed(ALICE)
+    entries = await outbox.add([(sent, 1, None), (undelivered, 1, None)])
+    outbox.mark_sent([entries[0].key])
+    await outbox.flush()
+
+    # Act
+    now += PRUNE_INTERVAL
+    fresh = await outbox.add([(recent, 1, None)])
+    outbox.mark_sent([fresh[0].key])
+    await outbox.flush()
+    keys = await database.run(lambda connection: connection.execute("SELECT key FROM outbox").fetchall())
+
+    # Assert
+    assert sorted(key for (key,) in keys) == sorted([entries[1].key, fresh[0].key])
+    assert outbox.pending == 1
+
+
+@pytest.mark.asyncio
+async def test_batcher_reports_sent_keys_only():
+    # Arrange
+    sent_keys = []
+
+    async def send(embeds, channel):
+        return [index != 1 for index in range(len(embeds))]
+
+    class Channel:
+        id = 1
+
+    batcher = EmbedBatcher(window=60, send=send, on_sent=sent_keys.extend)
+    for key in ("a", "b", None):
+        batcher.add(object(), Channel(), key=key)
+
+    # Act
+    await batcher.flush()
+
+    # Assert
+    assert sent_keys == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_published_feeds_are_sent_once_and_marked(bot: PiglooBot):
+    # Arrange
+    channel = bot.guilds[0].channels[0]
+    await bot.subscriptions.add(channel.id, channel.guild.id, ALICE)
+    feed = make_feed(ALICE)
+
+    # Act
+    await bot.publish_feeds([feed])
+    await bot.publish_feeds([feed])
+    await bot.batcher.flush()
+    await bot.outbox.flush()
+
+    # Assert
+    dpytest.get_message()
+    assert dpytest.verify().message().nothing()
+    assert bot.outbox.pending == 0
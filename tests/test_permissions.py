@@ -0,0 +1,79 @@
+import discord.ext.test as dpytest
+import pytest
+
+from pigloo.bot import PiglooBot
+from pigloo.feed import TrackedUser
+from pigloo.permissions import missing_permissions
+from tests.conftest import make_feed
+
+ALICE = TrackedUser(service="AniList", id="1", name="Alice")
+
+
+@pytest.mark.asyncio
+async def test_missing_permissions(bot: PiglooBot):
+    # Arrange
+    guild = bot.guilds[0]
+    channel = guild.channels[0]
+
+    # Act
+    await dpytest.set_permission_overrides(guild.default_role, channel, embed_links=False)
+
+    # Assert
+    assert missing_permissions(channel) == ["embed_links"]
+
+
+@pytest.mark.asyncio
+async def test_feeds_are_suspended_without_permissions(bot: PiglooBot):
+    # Arrange
+    guild = bot.guilds[0]
+    channel = guild.channels[0]
+    await bot.subscriptions.add(channel.id, guild.id, ALICE)
+    await dpytest.set_permission_overrides(guild.default_role, channel, send_messages=False)
+    await dpytest.run_all_events()
+
+    # Act
+    await bot.publish_feeds([make_feed(ALICE)])
+    await bot.batcher.flush()
+
+    # Assert
+    assert dpytest.verify().message().nothing()
+    assert bot.dispatcher.stats().failed == 0
+    assert bot.permissions.suspended == {channel.id}
+    assert bot.permissions.skipped == 1
+
+
+@pytest.mark.asyncio
+async def test_feeds_resume_when_permissions_are_granted(bot: PiglooBot):
+    # Arrange
+    guild = bot.guilds[0]
+    channel = guild.channels[0]
+    await bot.subscriptions.add(channel.id, guild.id, ALICE)
+    await dpytest.set_permission_overrides(guild.default_role, channel, send_messages=False)
+    await dpytest.run_all_events()
+    await bot.publish_feeds([make_feed(ALICE)])
+
+    # Act
+    await dpytest.set_permission_overrides(guild.default_role, channel, None)
+    await dpytest.run_all_events()
+    await bot.publish_feeds([make_feed(ALICE)])
+    await bot.batcher.flush()
+
+    # Assert
+    message = dpytest.get_message()
+    assert message.embeds[0].author.name == "Alice's AniList"
+    assert bot.permissions.suspended == set()
+
+
+@pytest.mark.asyncio
+async def test_role_updates_invalidate_the_guild(bot: PiglooBot):
+    # Arrange
+    guild = bot.guilds[0]
+    channel = guild.channels[0]
+    assert bot.permissions.can_send(channel)
+
+    # Act
+    bot.dispatch("guild_role_update", guild.default_role, guild.default_role)
+    await dpytest.run_all_events()
+
+    # Assert
+    assert len(bot.permissions) == 0
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from pigloo.cache import TTLCache
+from pigloo.resolver import MediaResolver
+
+
+class FakeSource:
+    """Media metadata source recording the batches it is asked for."""
+
+    def __init__(self, known=range(100), fail: bool = False) -> None:
+        self.known = set(known)
+        self.fail = fail
+        self.batches = []
+
+    async def fetch(self, ids: list[int]) -> dict[int, str]:
+        self.batches.append(sorted(ids))
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("AniList is down")
+        return {id: f"Media {id}" for id in ids if id in self.known}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_requests():
+    source = FakeSource()
+    resolver = MediaResolver(source.fetch)
+
+    # Act
+    first, second, third = await asyncio.gather(
+        resolver.resolve([1, 2]), resolver.resolve([2, 3]), resolver.resolve([1, 1])
+    )
+
+    # Assert
+    assert source.batches == [[1, 2, 3]]
+    assert first == {1: "Media 1", 2: "Media 2"}
+    assert second == {2: "Media 2", 3: "Media 3"}
+    assert third == {1: "Media 1"}
+    assert resolver.stats().in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_late_callers_join_the_in_flight_request():
+    source = FakeSource()
+    resolver = MediaResolver(source.fetch)
+    first = asyncio.create_task(resolver.resolve([1]))
+    await asyncio.sleep(0.005)
+
+    # Act
+    second = await resolver.resolve([1])
+
+    # Assert
+    assert second == await first == {1: "Media 1"}
+    assert source.batches == [[1]]
+
+
+@pytest.mark.asyncio
+async def test_ids_are_split_in_batches_and_cached():
+    source = FakeSource()
+    resolver = MediaResolver(source.fetch, batch_size=2)
+
+    # Act
+    await resolver.resolve(range(5))
+    resolved = await resolver.resolve(range(5))
+
+    # Assert
+    assert source.batches == [[0, 1], [2, 3], [4]]
+    assert len(resolved) == 5
+    assert resolver.stats().requests == 3
+    assert resolver.stats().hits == 5
+
+
+@pytest.mark.asyncio
+async def test_unresolved_ids_are_asked_again():
+    source = FakeSource(known=[1], fail=True)
+    resolver = MediaResolver(source.fetch)
+
+    assert await resolver.resolve([1, 2]) == {}
+    source.fail = False
+    assert await resolver.resolve([1, 2]) == {1: "Media 1"}
+    assert await resolver.resolve([1, 2]) == {1: "Media 1"}
+    assert source.batches == [[1, 2], [1, 2], [2]]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    source = FakeSource()
+    resolver = MediaResolver(source.fetch)
+    first = asyncio.create_task(resolver.resolve([1]))
+    second = asyncio.create_task(resolver.resolve([1]))
+    await asyncio.sleep(0)
+
+    # Act
+    first.cancel()
+
+    # Assert
+    assert await second == {1: "Media 1"}
+
+
+def test_ttl_cache_expires_entries():
+    now = 0.0
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # Act
+    now = 5.0
+    cache.put("c", 3)
+    now = 12.0
+
+    # Assert
+    assert "a" not in cache
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 1
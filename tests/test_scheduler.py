@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from pigloo.feed import TrackedUser
+from pigloo.poller import FeedPoller
+from pigloo.providers.base import UserActivities
+from pigloo.scheduler import PollScheduler
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def tracked(name: str, service: str = "AniList") -> TrackedUser:
+    return TrackedUser(service=service, id=name, name=name)
+
+
+def one_request_per_user(service: str, count: int) -> int:
+    return count
+
+
+def make_scheduler(clock: Clock, requests_per_minute: int = 60) -> PollScheduler:
+    return PollScheduler(
+        min_interval=30, max_interval=240, backoff=2, requests_per_minute=requests_per_minute, clock=clock
+    )
+
+
+def test_idle_users_back_off_and_active_users_come_back():
+    clock = Clock()
+    scheduler = make_scheduler(clock)
+    user = tracked("alice")
+    scheduler.sync([user])
+    intervals = []
+
+    # Act
+    for active in (False, False, False, False, False, True):
+        assert scheduler.pop_due(one_request_per_user) == [user]
+        scheduler.record(user, active)
+        intervals.append(scheduler.wait_time())
+        clock.now += scheduler.wait_time()
+
+    # Assert
+    assert intervals == [60, 120, 240, 240, 240, 30]
+
+
+def test_budget_is_never_exceeded():
+    clock = Clock()
+    scheduler = make_scheduler(clock, requests_per_minute=4)
+    users = [tracked(f"user{i}") for i in range(6)]
+    scheduler.sync(users)
+
+    # Act
+    first = scheduler.pop_due(one_request_per_user)
+    second = scheduler.pop_due(one_request_per_user)
+    wait = scheduler.wait_time()
+    clock.now += wait
+    third = scheduler.pop_due(one_request_per_user)
+
+    # Assert
+    assert len(first) == 4
+    assert second == []
+    assert wait == pytest.approx(15)
+    assert len(third) == 1
+
+
+def test_batched_requests_are_charged_once():
+    clock = Clock()
+    scheduler = make_scheduler(clock, requests_per_minute=2)
+    users = [tracked(f"user{i}") for i in range(50)]
+    scheduler.sync(users)
+    clock.now += 1
+    scheduler.sync(users + [tracked("mal", "MyAnimeList")])
+
+    def cost(service: str, count: int) -> int:
+        return -(-count // 25) if service == "AniList" else 2 * count
+
+    # Act
+    taken = scheduler.pop_due(cost)
+
+    # Assert
+    assert len(taken) == 50
+    assert all(user.service == "AniList" for user in taken)
+
+
+def test_untracked_users_are_forgotten():
+    clock = Clock()
+    scheduler = make_scheduler(clock)
+    alice, bob = tracked("alice"), tracked("bob")
+    scheduler.sync([alice, bob])
+
+    # Act
+    scheduler.sync([bob])
+
+    # Assert
+    assert scheduler.pop_due(one_request_per_user) == [bob]
+    assert len(scheduler) == 1
+    assert scheduler.wait_time() is None
+
+
+class IdleProvider:
+    name = "AniList"
+
+    def __init__(self, active: set[TrackedUser]) -> None:
+        self.active = active
+        self.polled = []
+
+    def cost(self, users: int) -> int:
+        return users
+
+    async def fetch_activities(self, users, cursors):
+        self.polled.append(list(users))
+        return {user: UserActivities([], None) for user in users}
+
+
+class FakeCursors:
+    def get(self, user):
+        return None
+
+    async def update(self, cursors):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_poller_polls_due_users_only():
+    clock = Clock()
+    scheduler = make_scheduler(clock)
+    users = [tracked("alice"), tracked("bob")]
+    provider = IdleProvider(set())
+
+    async def sink(feeds):
+        pass
+
+    poller = FeedPoller({"AniList": provider}, FakeCursors(), lambda: users, sink, interval=60, scheduler=scheduler)
+
+    # Act
+    await poller._poll_due()
+    await poller._poll_due()
+    clock.now += 60
+    await poller._poll_due()
+
+    # Assert
+    assert [set(polled) for polled in provider.polled] == [set(users)] * 2
+    assert scheduler.stats().median_interval == 120
+
+
+@pytest.mark.asyncio
+async def test_poller_task_is_cancelled_cleanly():
+    scheduler = make_scheduler(Clock())
+    poller = FeedPoller({}, FakeCursors(), lambda: [], lambda feeds: None, interval=60, scheduler=scheduler)
+    task = poller.start()
+    await asyncio.sleep(0)
+
+    # Act
+    task.cancel()
+    await poller.stop()
+
+    # Assert
+    assert not poller.running
+    assert task.cancelled()
@@ -0,0 +1,42 @@
+import pytest
+
+from pigloo.sharding import ShardPartition, shard_for
+from pigloo.subscriptions import SubscriptionStore
+from tests.conftest import tracked
+
+# Guild ids landing on shards 0, 1 and 2 out of 3
+GUILDS = [0 << 22, 1 << 22, 5 << 22]
+
+
+def test_shard_for():
+    assert [shard_for(guild_id, 3) for guild_id in GUILDS] == [0, 1, 2]
+    assert shard_for(None, 3) == 0
+
+
+def test_partition_options():
+    assert ShardPartition().client_options() == {}
+    assert not ShardPartition(shard_count=4).partial
+    assert ShardPartition(shard_ids=[3, 1], shard_count=4).client_options() == {"shard_count": 4, "shard_ids": [1, 3]}
+    assert ShardPartition(shard_ids=[3, 1], shard_count=4).share == 0.5
+    assert ShardPartition(shard_count=4).share == 1.0
+    with pytest.raises(ValueError):
+        ShardPartition(shard_ids=[0])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "shard_ids, expected", [(None, {1, 2, 3, 4}), ([0], {1, 4}), ([1, 2], {2, 3}), ([0, 1, 2], {1, 2, 3, 4})]
+)
+async def test_each_process_loads_its_own_guilds(database, shard_ids, expected):
+    store = SubscriptionStore(database)
+    await store.load()
+    for channel_id, guild_id in enumerate(GUILDS, start=1):
+        await store.add(channel_id, guild_id, tracked(channel_id))
+    await store.add(4, None, tracked(4))
+
+    # Act
+    partitioned = SubscriptionStore(database, ShardPartition(shard_ids=shard_ids, shard_count=3))
+    await partitioned.load()
+
+    # Assert
+    assert {int(user.id) for user in partitioned.users()} == expected
@@ -0,0 +1,23 @@
+from pigloo.startup import StartupProfile, discover_cogs
+
+
+def test_cogs_are_found_from_any_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert discover_cogs() == ["pigloo.cogs.commands", "pigloo.cogs.sync"]
+
+
+def test_startup_profile_reports_each_phase():
+    profile = StartupProfile(enabled=True, started_at=0)
+    profile.phases = [("imports", 0.5), ("cogs", 0.75)]
+
+    assert profile.report() == "imports: 0.500s (at 0.500s)\ncogs: 0.250s (at 0.750s)"
+
+
+def test_disabled_startup_profile_records_nothing():
+    profile = StartupProfile(enabled=False)
+
+    profile.mark("imports")
+
+    assert profile.phases == []
+    assert profile.report() is None
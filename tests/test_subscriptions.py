@@ -0,0 +1,79 @@
+import discord.ext.test as dpytest
+import pytest
+
+from pigloo.bot import PiglooBot
+from pigloo.feed import TrackedUser
+from pigloo.subscriptions import SubscriptionStore
+from tests.conftest import make_feed
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_route_feeds(database):
+    alice = TrackedUser(service="AniList", id="1", name="Alice")
+    bob = TrackedUser(service="AniList", id="2", name="Bob")
+    store = SubscriptionStore(database)
+    await store.load()
+
+    # Act
+    assert await store.add(10, 1, alice)
+    assert await store.add(11, 1, alice)
+    assert await store.add(11, 1, bob)
+    assert not await store.add(11, 1, bob)
+
+    # Assert
+    assert store.channels_for(make_feed(alice)) == {10, 11}
+    assert store.channels_for(make_feed(bob)) == {11}
+    assert sorted(user.name for user in store.users()) == ["Alice", "Bob"]
+    assert store.find(11, "AniList", "bob") == bob
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_updates_indexes(database):
+    alice = TrackedUser(service="AniList", id="1", name="Alice")
+    store = SubscriptionStore(database)
+    await store.load()
+    await store.add(10, 1, alice)
+
+    # Act
+    assert await store.remove(10, alice)
+    assert not await store.remove(10, alice)
+
+    # Assert
+    assert store.channels_for(make_feed(alice)) == set()
+    assert store.users() == []
+    assert store.subscriptions(10) == []
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_loaded_at_startup(database):
+    alice = TrackedUser(service="AniList", id="1", name="Alice")
+    store = SubscriptionStore(database)
+    await store.load()
+    await store.add(10, 1, alice)
+    await store.add(11, None, alice)
+
+    # Act
+    restarted = SubscriptionStore(database)
+    await restarted.load()
+
+    # Assert
+    assert restarted.channels_for(make_feed(alice)) == {10, 11}
+    assert restarted.users() == [alice]
+    assert [subscription.guild_id for subscription in restarted.subscriptions(11)] == [None]
+
+
+@pytest.mark.asyncio
+async def test_publish_feeds_to_subscribed_channels(bot: PiglooBot):
+    alice = TrackedUser(service="AniList", id="1", name="Alice")
+    bob = TrackedUser(service="AniList", id="2", name="Bob")
+    channel = bot.guilds[0].channels[0]
+    await bot.subscriptions.add(channel.id, channel.guild.id, alice)
+
+    # Act
+    await bot.publish_feeds([make_feed(alice), make_feed(bob)])
+    await bot.batcher.flush()
+
+    # Assert
+    message = dpytest.get_message()
+    assert message.embeds[0].author.name == "Alice's AniList"
+    assert dpytest.verify().message().nothing()
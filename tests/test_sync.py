@@ -0,0 +1,83 @@
+import asyncio
+
+import discord
+import pytest
+from discord import app_commands
+
+from pigloo.bot import PiglooBot
+from pigloo.commandsync import tree_hash
+
+
+class FakeContext:
+    def __init__(self, bot: PiglooBot) -> None:
+        self.bot = bot
+        self.guild = discord.Object(id=1)
+        self.messages = []
+
+    async def send(self, content: str) -> None:
+        self.messages.append(content)
+
+
+@pytest.fixture
+def synced(bot: PiglooBot, monkeypatch):
+    calls = {"scopes": [], "running": 0, "peak": 0}
+
+    async def sync(*, guild=None):
+        calls["running"] += 1
+        calls["peak"] = max(calls["peak"], calls["running"])
+        await asyncio.sleep(0.01)
+        calls["running"] -= 1
+        calls["scopes"].append(guild.id if guild else None)
+        return []
+
+    monkeypatch.setattr(bot.tree, "sync", sync)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_unchanged_global_tree_is_skipped(bot: PiglooBot, synced):
+    cog = bot.get_cog("SyncCog")
+    ctx = FakeContext(bot)
+
+    # Act
+    await cog._sync_no_guilds(ctx)
+    await cog._sync_no_guilds(ctx)
+    await cog._sync_no_guilds(ctx, "!")
+
+    # Assert
+    assert synced["scopes"] == [None, None]
+    assert ctx.messages[1] == "Commands unchanged, skipped syncing globally."
+
+
+@pytest.mark.asyncio
+async def test_guilds_are_synced_concurrently(bot: PiglooBot, synced):
+    cog = bot.get_cog("SyncCog")
+    cog.concurrency = 2
+    ctx = FakeContext(bot)
+    guilds = [discord.Object(id=guild_id) for guild_id in range(10, 16)]
+
+    # Act
+    await cog._sync_multiple_guilds(ctx, guilds, force=False)
+    await cog._sync_multiple_guilds(ctx, guilds, force=False)
+
+    # Assert
+    assert sorted(synced["scopes"]) == list(range(10, 16))
+    assert synced["peak"] == 2
+    assert ctx.messages[0].startswith("Synced the tree to 6/6.\n- 10: synced in ")
+    assert ctx.messages[1].startswith("Synced the tree to 0/6.\n- 10: unchanged")
+
+
+@pytest.mark.asyncio
+async def test_tree_hash_follows_commands(bot: PiglooBot):
+    before = tree_hash(bot.tree)
+
+    @app_commands.command()
+    async def extra(inter: discord.Interaction):
+        """Extra command."""
+
+    # Act
+    bot.tree.add_command(extra)
+
+    # Assert
+    assert tree_hash(bot.tree) != before
+    assert tree_hash(bot.tree, discord.Object(id=1)) == tree_hash(bot.tree, discord.Object(id=2))